@@ -0,0 +1,222 @@
+"""
+Histórico de ventas por función y analítica de ritmo (data/sales_history.npz).
+- Columnar: una columna por función (Function.key) y una fila por instante
+  en que cambió alguna vendidas/capacidad; matrices int32 tiempo × función
+  con MISSING donde la función no estaba publicada.
+- compute() saca para todas las funciones a la vez, sin bucles por fila:
+  ocupación, ritmo de venta (entradas/día en la última VELOCITY_WINDOW),
+  días hasta agotar a ese ritmo y ocupación prevista el día de la función.
+- Todo se calcula respecto a la hora de la ejecución redondeada a
+  REF_STEP (o al último cambio, si es posterior): si las ventas se paran el
+  ritmo baja y la previsión envejece, pero entre dos pasos schedule.json sale
+  idéntico y el cron no hace commits vacíos cada media hora.
+Vive en la caché de Actions, como run_history.
+"""
+from __future__ import annotations
+
+import math
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from core import Function
+
+HISTORY_PATH = Path("data") / "sales_history.npz"
+MISSING = -1
+
+VELOCITY_WINDOW = timedelta(days=7)
+# Una función vista hace una hora con 10 vendidas no va a 240/día.
+MIN_ELAPSED = timedelta(days=1)
+# Las funciones pasadas se quedan un tiempo para poder comparar.
+KEEP_PAST = timedelta(days=30)
+
+DAY_S = 86400.0
+# Resolución del instante de referencia de compute().
+REF_STEP = timedelta(hours=6)
+
+# Columnas que build_payload añade a cada fila después de HEADERS.
+ANALYTICS_HEADERS = ["Ocupacion", "Ritmo", "DiasAgotar", "OcupacionPrevista"]
+
+
+class SalesHistory:
+    def __init__(
+        self,
+        keys: np.ndarray,
+        starts: np.ndarray,
+        times: np.ndarray,
+        vendidas: np.ndarray,
+        capacidad: np.ndarray,
+    ):
+        self.keys = keys            # (F,) str
+        self.starts = starts        # (F,) int64, inicio de la función (epoch s)
+        self.times = times          # (T,) int64, instante de cada fila (epoch s)
+        self.vendidas = vendidas    # (T, F) int32
+        self.capacidad = capacidad  # (T, F) int32
+        self._index = {k: i for i, k in enumerate(keys.tolist())}
+        self._dirty = False
+
+    @classmethod
+    def empty(cls) -> SalesHistory:
+        return cls(
+            np.empty(0, dtype=str),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty((0, 0), dtype=np.int32),
+            np.empty((0, 0), dtype=np.int32),
+        )
+
+    @classmethod
+    def load(cls, path: Path = HISTORY_PATH) -> SalesHistory:
+        try:
+            with np.load(path) as z:
+                return cls(z["keys"], z["starts"], z["times"], z["vendidas"], z["capacidad"])
+        except Exception:
+            return cls.empty()
+
+    def save(self, path: Path = HISTORY_PATH) -> None:
+        if not self._dirty:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # np.savez añade ".npz" si el nombre no lo lleva: se pasa el fichero abierto.
+        tmp = path.with_name(f".{path.name}.tmp")
+        with tmp.open("wb") as fh:
+            np.savez_compressed(
+                fh,
+                keys=self.keys,
+                starts=self.starts,
+                times=self.times,
+                vendidas=self.vendidas,
+                capacidad=self.capacidad,
+            )
+        tmp.replace(path)
+        self._dirty = False
+        print(f"✔ Actualizado {path} ({len(self.times)} instantes × {len(self.keys)} funciones)")
+
+    def _add_columns(self, funcs: dict[str, Function]) -> None:
+        new = [k for k in funcs if k not in self._index]
+        if not new:
+            return
+
+        pad = np.full((len(self.times), len(new)), MISSING, dtype=np.int32)
+        self.keys = np.concatenate([self.keys, np.array(new)])
+        self.starts = np.concatenate([self.starts, [int(funcs[k].inicio.timestamp()) for k in new]]).astype(np.int64)
+        self.vendidas = np.hstack([self.vendidas, pad])
+        self.capacidad = np.hstack([self.capacidad, pad])
+        self._index = {k: i for i, k in enumerate(self.keys.tolist())}
+
+    def record(self, at: datetime, funcs: dict[str, Function]) -> bool:
+        """Añade una fila con las ventas actuales si algo cambió desde la
+        última. funcs: {Function.key(sala): Function}."""
+        self._add_columns(funcs)
+
+        vendidas = np.full(len(self.keys), MISSING, dtype=np.int32)
+        capacidad = np.full(len(self.keys), MISSING, dtype=np.int32)
+        for key, f in funcs.items():
+            i = self._index[key]
+            if f.vendidas is not None:
+                vendidas[i] = f.vendidas
+            if f.capacidad is not None:
+                capacidad[i] = f.capacidad
+
+        if len(self.times) and np.array_equal(vendidas, self.vendidas[-1]) and np.array_equal(capacidad, self.capacidad[-1]):
+            return False
+
+        self.times = np.append(self.times, np.int64(at.timestamp()))
+        self.vendidas = np.vstack([self.vendidas, vendidas])
+        self.capacidad = np.vstack([self.capacidad, capacidad])
+        self._prune(at)
+        self._dirty = True
+        return True
+
+    def _prune(self, now: datetime) -> None:
+        keep = self.starts >= int((now - KEEP_PAST).timestamp())
+        if keep.all():
+            return
+        self.keys, self.starts = self.keys[keep], self.starts[keep]
+        self.vendidas, self.capacidad = self.vendidas[:, keep], self.capacidad[:, keep]
+        self._index = {k: i for i, k in enumerate(self.keys.tolist())}
+
+    def series(self, key: str) -> tuple[np.ndarray, np.ndarray]:
+        """(instantes, vendidas) de una función, solo donde hay dato."""
+        i = self._index.get(key)
+        if i is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        col = self.vendidas[:, i]
+        ok = col >= 0
+        return self.times[ok], col[ok]
+
+    def reference_time(self, now: datetime | None = None) -> int:
+        """Instante (epoch s) respecto al que se mide: now bajado a REF_STEP,
+        nunca antes del último cambio. Sin now, el último cambio."""
+        last = int(self.times[-1])
+        if now is None:
+            return last
+        step = int(REF_STEP.total_seconds())
+        return max(last, int(now.timestamp()) // step * step)
+
+    def compute(self, now: datetime | None = None) -> dict[str, np.ndarray]:
+        """Métricas de todas las funciones de la última fila, en bloque."""
+        n = len(self.keys)
+        if not len(self.times) or not n:
+            return {name: np.full(n, np.nan) for name in ("fill", "velocity", "days_to_sellout", "projected_fill")}
+
+        t_ref = self.reference_time(now)
+        cols = np.arange(n)
+        last = self.vendidas[-1].astype(np.float64)
+        cap = self.capacidad[-1].astype(np.float64)
+        present = last >= 0
+        has_cap = present & (cap > 0)
+
+        # Fila vigente al principio de la ventana, o la primera con dato si
+        # la función apareció después.
+        seen = self.vendidas >= 0
+        first = np.where(seen.any(axis=0), seen.argmax(axis=0), len(self.times) - 1)
+        window_row = np.searchsorted(self.times, t_ref - VELOCITY_WINDOW.total_seconds(), side="right") - 1
+        base_row = np.maximum(first, max(window_row, 0))
+        base = self.vendidas[base_row, cols].astype(np.float64)
+
+        elapsed = np.maximum((t_ref - self.times[base_row]) / DAY_S, MIN_ELAPSED.total_seconds() / DAY_S)
+        velocity = np.where(present & (base >= 0), np.maximum(last - base, 0) / elapsed, np.nan)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fill = np.where(has_cap, last / cap, np.nan)
+            remaining = np.maximum(cap - last, 0)
+            days_to_sellout = np.where(
+                has_cap & (remaining == 0),
+                0.0,
+                np.where(has_cap & (velocity > 0), remaining / velocity, np.nan),
+            )
+            days_to_start = np.maximum((self.starts - t_ref) / DAY_S, 0)
+            projected = np.where(has_cap, np.minimum(cap, last + np.nan_to_num(velocity) * days_to_start) / cap, np.nan)
+
+        return {
+            "fill": fill,
+            "velocity": velocity,
+            "days_to_sellout": days_to_sellout,
+            "projected_fill": projected,
+        }
+
+    def analytics_rows(self, keys: list[str], now: datetime | None = None) -> list[list]:
+        """Valores de ANALYTICS_HEADERS para cada clave (None si no hay dato)."""
+        m = self.compute(now)
+        idx = np.array([self._index.get(k, -1) for k in keys], dtype=np.int64)
+        found = idx >= 0
+        safe = np.where(found, idx, 0)
+
+        def column(values: np.ndarray, scale: float, digits: int) -> list:
+            v = np.where(found, values[safe] if len(values) else np.nan, np.nan) * scale
+            return [None if math.isnan(x) else round(x, digits) if digits else round(x) for x in v.tolist()]
+
+        return [
+            list(row)
+            for row in zip(
+                column(m["fill"], 100, 0),
+                column(m["velocity"], 1, 1),
+                column(m["days_to_sellout"], 1, 1),
+                column(m["projected_fill"], 100, 0),
+            )
+        ]
+
+
+HISTORY = SalesHistory.load()
@@ -0,0 +1,435 @@
+let payload = { eventos: {} };
+let eventos = {};
+let active = null;
+
+const tabsEl = document.getElementById("tabs");
+const listEl = document.getElementById("list");
+
+// Vista ya pintada de cada pestaña: cambiar de pestaña solo re-engancha su
+// nodo, y al llegar datos nuevos se reutilizan las tarjetas que no cambian.
+const views = new Map();
+
+const POLL_MIN_MS = 60 * 1000;
+const POLL_MAX_MS = 15 * 60 * 1000;
+const SEEN_KEY = "cartelera-seen";
+
+let etag = null;
+let pollDelay = POLL_MIN_MS;
+let pollTimer = null;
+
+// Vendidas de cada función la última vez que se miró su pestaña; lo que
+// suba desde entonces se resalta como venta nueva.
+const seen = loadSeen();
+
+function setPayload(data) {
+  payload = data || { eventos: {} };
+  eventos = payload.eventos || {};
+
+  if (!(active in eventos)) {
+    active = Object.keys(eventos)[0] || null;
+  }
+
+  for (const sala of views.keys()) {
+    if (!(sala in eventos)) views.delete(sala);
+  }
+
+  const today = new Date().toISOString().slice(0, 10);
+  for (const key of Object.keys(seen)) {
+    const [sala, fechaISO] = key.split("|");
+    if (!(sala in eventos) || fechaISO < today) delete seen[key];
+  }
+
+  document.getElementById("meta").textContent =
+    new Date(payload.generated_at).toLocaleString("es-ES", {
+      hour: "2-digit",
+      minute: "2-digit"
+    });
+
+  renderTabs();
+  render();
+}
+
+function renderTabs() {
+  tabsEl.textContent = "";
+
+  for (const sala of Object.keys(eventos)) {
+    const ev = eventos[sala];
+    const total = ev.proximas?.table?.rows?.length || 0;
+
+    const b = document.createElement("button");
+    b.textContent = `${sala} (${total})`;
+    b.dataset.tab = sala;
+    b.className = "tab" + (sala === active ? " active" : "");
+    b.onclick = () => {
+      if (active === sala) return;
+      markSeen(active);
+      active = sala;
+      updateTabs();
+      render();
+    };
+
+    tabsEl.appendChild(b);
+  }
+}
+
+function updateTabs() {
+  document.querySelectorAll(".tab").forEach(t => {
+    t.classList.toggle("active", t.dataset.tab === active);
+  });
+}
+
+const DAYS = ["Dom", "Lun", "Mar", "Mié", "Jue", "Vie", "Sáb"];
+
+function dayName(fechaISO) {
+  return DAYS[new Date(fechaISO + "T00:00:00").getDay()];
+}
+
+function colIndex(headers, name, fallback) {
+  const idx = headers.indexOf(name);
+  return idx >= 0 ? idx : fallback;
+}
+
+function fmtInt(x) {
+  if (x === null || x === undefined || x === "") return null;
+  const n = Number(x);
+  return Number.isFinite(n) ? n : null;
+}
+
+function chipClassFrom(vendidas, stock) {
+  const v = vendidas ?? 0;
+  const s = stock ?? 999999;
+
+  if (s === 0) return "sold";
+  if (s <= 3) return "gold";
+  if (v >= 1) return "green";
+  return "gray";
+}
+
+function sourceLabel(source) {
+  if (source === "onebox") return "Onebox";
+  if (source === "dinaticket") return "Dina";
+  if (source === "kultur") return "Kultur";
+  return "Entradas";
+}
+
+function stockValue(r) {
+  const vendidas = r.vendidas ?? "—";
+  const cap = r.cap ?? "—";
+  const stock = r.stock ?? "—";
+
+  if (r.stock === 0) return `${vendidas}/${cap} · agotado`;
+
+  return `${vendidas}/${cap} · quedan ${stock}`;
+}
+
+function parseRows(table) {
+  const headers = table.headers || [];
+
+  const idxFechaLabel = colIndex(headers, "Fecha", 0);
+  const idxHora = colIndex(headers, "Hora", 1);
+  const idxVendidas = colIndex(headers, "Vendidas", 2);
+  const idxFechaISO = colIndex(headers, "FechaISO", 3);
+  const idxCapacidad = colIndex(headers, "Capacidad", 4);
+  const idxStock = colIndex(headers, "Stock", 5);
+  const idxBuyUrl = colIndex(headers, "BuyUrl", 6);
+  const idxSource = colIndex(headers, "Source", 7);
+  const idxDia = colIndex(headers, "Dia", -1);
+  const idxRitmo = colIndex(headers, "Ritmo", -1);
+  const idxDiasAgotar = colIndex(headers, "DiasAgotar", -1);
+  const idxPrevista = colIndex(headers, "OcupacionPrevista", -1);
+
+  return (table.rows || []).map(r => {
+    const row = {
+      fecha_label: r[idxFechaLabel],
+      hora: r[idxHora],
+      vendidas: fmtInt(r[idxVendidas]),
+      fecha_iso: r[idxFechaISO],
+      cap: fmtInt(r[idxCapacidad]),
+      stock: fmtInt(r[idxStock]),
+      buyUrl: r[idxBuyUrl] || null,
+      source: r[idxSource] || null,
+      dia: idxDia >= 0 ? r[idxDia] : null,
+      ritmo: idxRitmo >= 0 ? fmtInt(r[idxRitmo]) : null,
+      diasAgotar: idxDiasAgotar >= 0 ? fmtInt(r[idxDiasAgotar]) : null,
+      prevista: idxPrevista >= 0 ? fmtInt(r[idxPrevista]) : null
+    };
+
+    row.key = `${row.fecha_iso}|${row.hora}|${row.source}`;
+    return row;
+  });
+}
+
+// Payloads anteriores no traen "months": se agrupa aquí (filas ya ordenadas).
+function monthsFromRows(rows) {
+  const months = [];
+
+  rows.forEach((r, i) => {
+    const key = (r.fecha_iso || "").slice(0, 7);
+    const last = months[months.length - 1];
+
+    if (last && last.key === key) {
+      last.count++;
+      return;
+    }
+
+    const label = new Date(r.fecha_iso + "T00:00:00").toLocaleDateString("es-ES", {
+      month: "long",
+      year: "numeric"
+    });
+
+    months.push({ key, label, start: i, count: 1 });
+  });
+
+  return months;
+}
+
+const CARD_TEMPLATE = (() => {
+  const card = document.createElement("div");
+  card.className = "item";
+  card.innerHTML =
+    '<div class="row-top"><div class="date"> <span></span></div><div class="delta"></div></div>' +
+    '<div class="time"></div>' +
+    '<div class="chips"><div class="chip"><div class="chip-left">' +
+    '<div class="chip-title"></div><div class="chip-value"></div>' +
+    '</div></div></div>' +
+    '<div class="pace"></div>';
+  return card;
+})();
+
+function createCard() {
+  const el = CARD_TEMPLATE.cloneNode(true);
+  const date = el.querySelector(".date");
+
+  return {
+    el,
+    sig: null,
+    dateText: date.firstChild,
+    dow: date.lastChild,
+    delta: el.querySelector(".delta"),
+    time: el.querySelector(".time"),
+    chip: el.querySelector(".chip"),
+    title: el.querySelector(".chip-title"),
+    value: el.querySelector(".chip-value"),
+    pace: el.querySelector(".pace")
+  };
+}
+
+// Ritmo de venta de los últimos días (analytics.py); vacío sin histórico.
+function paceValue(r) {
+  if (!r.ritmo) return "";
+
+  const ritmo = r.ritmo.toLocaleString("es-ES", { maximumFractionDigits: 1 });
+  const parts = [`${ritmo}/día`];
+
+  // Si a este ritmo no se llena antes de la función, la ocupación prevista.
+  if (r.prevista !== null && r.prevista < 100) {
+    parts.push(`prevista ${r.prevista}%`);
+  } else if (r.stock !== 0 && r.diasAgotar) {
+    parts.push(`se agota en ~${Math.ceil(r.diasAgotar)} d`);
+  }
+
+  return parts.join(" · ");
+}
+
+function fillCard(card, r, delta) {
+  card.el.classList.toggle("fresh", delta > 0);
+  card.delta.textContent = delta > 0 ? `+${delta}` : "";
+  card.dateText.nodeValue = `${r.fecha_label} `;
+  card.dow.textContent = `(${r.dia || dayName(r.fecha_iso)})`;
+  card.time.textContent = `${r.hora} h`;
+  card.chip.className = `chip ${chipClassFrom(r.vendidas, r.stock)}`;
+  card.title.textContent = sourceLabel(r.source);
+  card.value.textContent = stockValue(r);
+  card.pace.textContent = paceValue(r);
+}
+
+function rowSignature(r, delta) {
+  return `${r.fecha_label}|${r.dia}|${r.vendidas}|${r.cap}|${r.stock}|${r.ritmo}|${r.diasAgotar}|${r.prevista}|${delta}`;
+}
+
+function loadSeen() {
+  try {
+    return JSON.parse(localStorage.getItem(SEEN_KEY)) || {};
+  } catch (e) {
+    return {};
+  }
+}
+
+function saveSeen() {
+  try {
+    localStorage.setItem(SEEN_KEY, JSON.stringify(seen));
+  } catch (e) {
+    // Modo privado o cuota llena: solo se pierde el resaltado.
+  }
+}
+
+function salesDelta(sala, r) {
+  const key = `${sala}|${r.key}`;
+  const vendidas = r.vendidas ?? 0;
+
+  if (!(key in seen)) {
+    seen[key] = vendidas;
+    return 0;
+  }
+
+  return vendidas - seen[key];
+}
+
+function markSeen(sala) {
+  const view = views.get(sala);
+  if (!view) return;
+
+  for (const [key, card] of view.cards) {
+    seen[`${sala}|${key}`] = card.vendidas ?? 0;
+  }
+
+  // Al volver a la pestaña se recalcula el resaltado.
+  view.proximas = undefined;
+  saveSeen();
+}
+
+function emptyCard() {
+  const card = document.createElement("div");
+  card.className = "item";
+  card.innerHTML =
+    '<div class="date">Sin funciones próximas</div>' +
+    '<div class="time">No hay fechas disponibles ahora mismo.</div>';
+  return card;
+}
+
+function updateView(view, proximas) {
+  const rows = parseRows(proximas?.table || {});
+  const months = proximas?.months || monthsFromRows(rows);
+  const frag = document.createDocumentFragment();
+  const cards = new Map();
+
+  for (const m of months) {
+    const h = document.createElement("h3");
+    h.className = "month";
+    h.textContent = m.label;
+    frag.appendChild(h);
+
+    for (let i = m.start; i < m.start + m.count; i++) {
+      const r = rows[i];
+      if (!r || !r.fecha_iso || !r.hora) continue;
+
+      const card = view.cards.get(r.key) || createCard();
+      const delta = salesDelta(view.sala, r);
+      const sig = rowSignature(r, delta);
+
+      if (card.sig !== sig) {
+        fillCard(card, r, delta);
+        card.sig = sig;
+      }
+
+      card.vendidas = r.vendidas;
+
+      cards.set(r.key, card);
+      frag.appendChild(card.el);
+    }
+  }
+
+  view.cards = cards;
+  saveSeen();
+
+  if (!cards.size) {
+    view.el.replaceChildren(emptyCard());
+    return;
+  }
+
+  view.el.replaceChildren(frag);
+}
+
+function getView(sala) {
+  let view = views.get(sala);
+
+  if (!view) {
+    const el = document.createElement("div");
+    el.className = "view";
+    view = { sala, el, cards: new Map(), proximas: undefined };
+    views.set(sala, view);
+  }
+
+  const proximas = eventos[sala]?.proximas;
+  if (view.proximas !== proximas) {
+    updateView(view, proximas);
+    view.proximas = proximas;
+  }
+
+  return view;
+}
+
+function render() {
+  const view = getView(active);
+
+  if (listEl.firstChild !== view.el || listEl.childNodes.length !== 1) {
+    listEl.replaceChildren(view.el);
+  }
+}
+
+// Pide schedule.json con If-None-Match: si no cambió llega un 304 sin
+// cuerpo. Devuelve true si había datos nuevos.
+function loadPayload() {
+  const headers = etag ? { "If-None-Match": etag } : {};
+
+  return fetch("schedule.json", { cache: "no-store", headers })
+    .then(r => {
+      if (r.status === 304) return false;
+      if (!r.ok) throw new Error(`HTTP ${r.status}`);
+
+      etag = r.headers.get("ETag") || etag;
+
+      return r.json().then(data => {
+        if (data.generated_at && data.generated_at === payload.generated_at) return false;
+        setPayload(data);
+        return true;
+      });
+    });
+}
+
+function schedulePoll() {
+  clearTimeout(pollTimer);
+  pollTimer = document.hidden ? null : setTimeout(poll, pollDelay);
+}
+
+function poll() {
+  loadPayload()
+    .then(changed => {
+      pollDelay = changed ? POLL_MIN_MS : Math.min(pollDelay * 2, POLL_MAX_MS);
+    })
+    .catch(err => {
+      console.error(err);
+      pollDelay = Math.min(pollDelay * 2, POLL_MAX_MS);
+    })
+    .finally(schedulePoll);
+}
+
+// Con la pestaña oculta no se pide nada; al volver se consulta al momento.
+document.addEventListener("visibilitychange", () => {
+  if (document.hidden) {
+    clearTimeout(pollTimer);
+    pollTimer = null;
+    markSeen(active);
+    return;
+  }
+
+  pollDelay = POLL_MIN_MS;
+  poll();
+});
+
+loadPayload()
+  .catch(err => {
+    console.error(err);
+    render();
+  })
+  .finally(schedulePoll);
+
+(function () {
+  if (!("serviceWorker" in navigator)) return;
+
+  // sw.js cambia de contenido cada vez que cambian los estáticos con hash,
+  // así que no hace falta versionar la URL ni recargar la página.
+  navigator.serviceWorker.register("sw.js").then((reg) => {
+    reg.update().catch(() => {});
+  }).catch(console.error);
+})();
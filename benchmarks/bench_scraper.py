@@ -0,0 +1,259 @@
+"""
+Benchmark offline de las etapas del scraper contra las fixtures grabadas.
+Mide latencia por llamada (media, p50, p95), throughput y memoria pico de
+cada etapa y lo compara con benchmarks/baseline.json.
+
+    python -m benchmarks.bench_scraper                 # mide y compara
+    python -m benchmarks.bench_scraper --save-baseline # fija la referencia
+    python -m benchmarks.bench_scraper --save-baseline --stage onebox.extract_select_urls
+    python -m benchmarks.bench_scraper --check         # exit 1 si empeora
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+from benchmarks.fixtures import dinaticket_pages, onebox_pages
+from core import TZ, Function, Source
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+LATEST_PATH = BENCH_DIR / "latest.json"
+
+# Fecha fija para que el año que infiere Dinaticket no dependa del día.
+FIXED_NOW = datetime(2026, 8, 1, 12, 0, tzinfo=TZ)
+
+DATE_SAMPLES = [
+    "vie., 05 jun 2026 - 23:00",
+    "Sáb 13 jun 2026 - 19:30",
+    "viernes, 19 de junio de 2026 · 23:00 h",
+    "Domingo 28 de junio de 2026 a las 18:30",
+    "05/06/2026 23:00",
+    "26-06-2026 - 19:30",
+    "Entradas Cluedo mental Madrid",
+    "mié 1 julio 2026 - 21:00",
+]
+
+STAGES: dict[str, Callable[[], tuple[Callable, list, int]]] = {}
+
+
+def stage(name: str):
+    def decorator(fn):
+        STAGES[name] = fn
+        return fn
+
+    return decorator
+
+
+@stage("dinaticket.parse_html")
+def _dinaticket_parse():
+    from scraper_ci import parse_dinaticket_html
+
+    pages = list(dinaticket_pages().values())
+    return (lambda html: parse_dinaticket_html(html, now=FIXED_NOW)), pages, sum(map(len, pages))
+
+
+@stage("onebox.parse_date")
+def _onebox_parse_date():
+    from scraper_ci import parse_onebox_date
+
+    return parse_onebox_date, DATE_SAMPLES, sum(map(len, DATE_SAMPLES))
+
+
+@stage("onebox.extract_dates")
+def _onebox_extract_dates():
+    from scraper_ci import extract_onebox_dates_from_text
+
+    texts = list(onebox_pages("txt").values())
+    texts.append("\n".join(DATE_SAMPLES * 20))
+    return extract_onebox_dates_from_text, texts, sum(map(len, texts))
+
+
+@stage("onebox.extract_select_urls")
+def _onebox_extract_select_urls():
+    from benchmarks.mock_server import build_catalog, render_onebox_parent
+    from scraper_ci import extract_select_urls_from_html
+
+    # Las páginas grabadas no traen anchors /select/; la del servidor
+    # simulado sí (60 funciones con fecha).
+    pages = list(onebox_pages("html").values())
+    pages.append(render_onebox_parent(build_catalog(1, ("onebox",), 60)[0]))
+    return extract_select_urls_from_html, pages, sum(map(len, pages))
+
+
+@stage("payload.build")
+def _payload_build():
+    from scraper_ci import build_payload
+
+    start = datetime.now(TZ) + timedelta(days=1)
+    eventos = {
+        f"Sala{s:02d}": [
+            Function(
+                inicio=(start + timedelta(days=d, hours=s % 4)).replace(minute=30, second=0, microsecond=0),
+                vendidas=d % 30,
+                capacidad=30,
+                stock=30 - d % 30,
+                source=Source.ONEBOX if s % 2 else Source.DINATICKET,
+            )
+            for d in range(100)
+        ]
+        for s in range(20)
+    }
+    return build_payload, [eventos], 0
+
+
+@stage("payload.decode")
+def _payload_decode():
+    from core import iter_functions
+
+    build, inputs, _ = _payload_build()
+    # build_payload imprime una línea [DEBUG] por sala, como en measure().
+    with contextlib.redirect_stdout(io.StringIO()):
+        payload = json.loads(json.dumps(build(*inputs)))
+    return (lambda p: sum(1 for _ in iter_functions(p, ("proximas", "pasadas")))), [payload], 0
+
+
+@stage("analytics.compute")
+def _analytics_compute():
+    import numpy as np
+
+    from analytics import SalesHistory
+
+    # ~4 meses de cambios cada media hora sobre 400 funciones.
+    rng = np.random.default_rng(0)
+    t0 = int(FIXED_NOW.timestamp())
+    n_times, n_funcs = 6000, 400
+    history = SalesHistory(
+        np.array([f"Sala::{i}" for i in range(n_funcs)]),
+        np.full(n_funcs, t0 + 150 * 86400, dtype=np.int64),
+        t0 + np.arange(n_times, dtype=np.int64) * 1800,
+        np.cumsum(rng.integers(0, 2, (n_times, n_funcs)), axis=0).astype(np.int32),
+        np.full((n_times, n_funcs), 5000, dtype=np.int32),
+    )
+    keys = history.keys.tolist()
+    return history.analytics_rows, [keys], 0
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    k = (len(values) - 1) * pct
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def measure(fn: Callable, inputs: list, nbytes: int, repeat: int) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        for x in inputs:
+            fn(x)
+
+        samples: list[float] = []
+        t_total = time.perf_counter()
+        for _ in range(repeat):
+            for x in inputs:
+                t0 = time.perf_counter()
+                fn(x)
+                samples.append(time.perf_counter() - t0)
+        t_total = time.perf_counter() - t_total
+
+        tracemalloc.start()
+        for x in inputs:
+            fn(x)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "calls": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "p50_ms": round(_percentile(samples, 0.50) * 1000, 4),
+        "p95_ms": round(_percentile(samples, 0.95) * 1000, 4),
+        "calls_per_s": round(len(samples) / t_total, 1),
+        "mb_per_s": round(nbytes * repeat / t_total / 1e6, 2) if nbytes else None,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run(selected: list[str], repeat: int) -> dict:
+    results = {}
+    for name in selected:
+        fn, inputs, nbytes = STAGES[name]()
+        results[name] = measure(fn, inputs, nbytes, repeat)
+        r = results[name]
+        print(
+            f"{name:<30} p50 {r['p50_ms']:>9.3f} ms  p95 {r['p95_ms']:>9.3f} ms  "
+            f"{r['calls_per_s']:>9.1f} llamadas/s  pico {r['peak_kb']:>9.1f} KB"
+        )
+
+    return {
+        "created_at": datetime.now(TZ).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "stages": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, cur in current["stages"].items():
+        base = (baseline.get("stages") or {}).get(name)
+        if not base:
+            continue
+
+        for metric in ("p50_ms", "peak_kb"):
+            if base[metric] and cur[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {base[metric]} -> {cur[metric]} "
+                    f"(+{(cur[metric] / base[metric] - 1) * 100:.0f}%)"
+                )
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark offline del scraper")
+    parser.add_argument("--stage", action="append", choices=sorted(STAGES), help="solo estas etapas")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="margen antes de marcar regresión")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="sale con 1 si hay regresiones")
+    args = parser.parse_args()
+
+    current = run(args.stage or list(STAGES), args.repeat)
+    LATEST_PATH.write_text(json.dumps(current, ensure_ascii=False, indent=2), "utf-8")
+
+    if args.save_baseline:
+        if args.stage and BASELINE_PATH.exists():
+            # Con --stage solo se renuevan esas etapas.
+            baseline = json.loads(BASELINE_PATH.read_text("utf-8"))
+            baseline["stages"].update(current["stages"])
+            current = {**baseline, "created_at": current["created_at"]}
+        BASELINE_PATH.write_text(json.dumps(current, ensure_ascii=False, indent=2), "utf-8")
+        print(f"✔ Guardado {BASELINE_PATH.relative_to(BENCH_DIR.parent)}")
+        return
+
+    if not BASELINE_PATH.exists():
+        print("Sin baseline; usa --save-baseline para crearla.")
+        return
+
+    regressions = compare(current, json.loads(BASELINE_PATH.read_text("utf-8")), args.tolerance)
+    for line in regressions:
+        print(f"⚠️ Regresión {line}")
+    if not regressions:
+        print("Sin regresiones frente a la baseline.")
+    elif args.check:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Arranque de los puntos de entrada: tiempo de importación con
+python -X importtime (descontando lo que carga el propio intérprete) y los
+imports más caros de cada uno, para ver qué conviene diferir. Mide además
+el proceso completo de "scraper_ci.py html" en una copia temporal.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --top 8
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = ["core", "notify_telegram", "scraper_ci", "scraper_daemon", "bot_telegram"]
+# Lo que necesita "scraper_ci.py html" para regenerar docs/.
+SITE_FILES = ["template.html", "app.css", "app.js", "manifest.json", "sw.js", "docs/schedule.json"]
+
+
+def _importtime(code: str) -> list[tuple[int, int, str]]:
+    """(µs propios, µs acumulados, módulo con su sangría) por import."""
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    out = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        out.append((int(own), int(cumulative), name[1:]))
+    return out
+
+
+def measure_imports(module: str, baseline: set[str], repeat: int) -> tuple[float, list[tuple[str, float]]]:
+    """Mediana del tiempo de importación (ms) y sus imports directos más caros."""
+    totals, children = [], {}
+    for _ in range(repeat):
+        entries = _importtime(f"import {module}")
+        totals.append(sum(cum for _, cum, name in entries if not name.startswith(" ") and name.strip() not in baseline))
+
+        # Los hijos directos del módulo van justo antes que él, con dos espacios.
+        for _, cum, name in entries:
+            if name.startswith("  ") and not name.startswith("   ") and name.strip() not in baseline:
+                children.setdefault(name.strip(), []).append(cum)
+
+    heaviest = sorted(((n, statistics.median(v) / 1000) for n, v in children.items()), key=lambda kv: -kv[1])
+    return statistics.median(totals) / 1000, heaviest
+
+
+def measure_html(repeat: int) -> float | None:
+    """Mediana (ms) de "python scraper_ci.py html" de principio a fin."""
+    if not all((ROOT / f).exists() for f in SITE_FILES):
+        return None
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for f in SITE_FILES:
+            (Path(tmp) / f).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(ROOT / f, Path(tmp) / f)
+
+        env = {**os.environ, "PYTHONPATH": str(ROOT)}
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run(
+                [sys.executable, str(ROOT / "scraper_ci.py"), "html"],
+                cwd=tmp, env=env, capture_output=True, check=True,
+            )
+            samples.append(time.perf_counter() - t0)
+
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de los puntos de entrada")
+    parser.add_argument("--module", action="append", help="solo estos módulos")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="imports directos más caros a mostrar")
+    args = parser.parse_args()
+
+    baseline = {name.strip() for _, _, name in _importtime("pass")}
+    for module in args.module or ENTRY_POINTS:
+        total_ms, heaviest = measure_imports(module, baseline, args.repeat)
+        top = ", ".join(f"{name} {ms:.0f}" for name, ms in heaviest[: args.top])
+        print(f"{module:<18} import {total_ms:>8.1f} ms   {top}")
+
+    html_ms = measure_html(args.repeat)
+    if html_ms is None:
+        print("scraper_ci html    (faltan template.html o docs/schedule.json)")
+    else:
+        print(f"scraper_ci html    proceso {html_ms:>7.1f} ms (intérprete incluido)")
+
+
+if __name__ == "__main__":
+    main()
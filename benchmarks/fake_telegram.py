@@ -0,0 +1,231 @@
+"""
+Prueba local del modo webhook del bot sin Telegram: un Bot API falso
+(getMe, setWebhook, sendMessage, editMessageText... y schedule.json) y un
+cliente que envía updates al webhook como lo haría Telegram.
+Arranca bot_telegram.py en un subproceso apuntando al API falso, comprueba
+/healthz, que un secreto incorrecto da 403, manda N comandos en paralelo y
+mide la latencia update -> respuesta del bot y updates/s.
+
+    python -m benchmarks.fake_telegram --updates 200 --concurrency 20
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+SECRET = "fake-secret"
+TOKEN = "123:fake"
+FIRST_CHAT = 10_000
+
+COMMANDS = ["/start", "/status", "/soldout", "/lowstock 5", "/find 2026-10-20"]
+
+
+class FakeBotAPI:
+    """Bot API mínimo en un hilo aparte. Apunta cada respuesta del bot
+    (chat_id -> instante) para medir latencias."""
+
+    def __init__(self, payload: bytes, host: str = "127.0.0.1", port: int = 0):
+        self.payload = payload
+        self.calls: dict[str, int] = {}
+        self.replies: dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> FakeBotAPI:
+        threading.Thread(target=self.httpd.serve_forever, name="fake-telegram", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def call(self, method: str, params: dict) -> object:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self._next_id += 1
+            message_id = self._next_id
+
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if method in ("sendMessage", "sendPhoto", "editMessageText"):
+            chat_id = int(params.get("chat_id") or 0)
+            with self._lock:
+                self.replies.setdefault(chat_id, time.perf_counter())
+            return {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text") or "",
+            }
+        return True
+
+
+def _handler_for(api: FakeBotAPI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes, ctype: str = "application/json") -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if urlsplit(self.path).path == "/schedule.json":
+                self._send(200, api.payload)
+            else:
+                self._send(404, b"")
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            method = self.path.rsplit("/", 1)[-1]
+            ctype = self.headers.get("Content-Type") or ""
+            if "json" in ctype:
+                params = json.loads(body or b"{}")
+            elif "urlencoded" in ctype:
+                params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+            else:
+                params = {}
+            result = api.call(method, params)
+            self._send(200, json.dumps({"ok": True, "result": result}).encode())
+
+    return Handler
+
+
+def command_update(i: int, text: str) -> dict:
+    chat = {"id": FIRST_CHAT + i, "type": "private", "first_name": "Test"}
+    return {
+        "update_id": i,
+        "message": {
+            "message_id": i,
+            "date": int(time.time()),
+            "chat": chat,
+            "from": {"id": chat["id"], "is_bot": False, "first_name": "Test"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        },
+    }
+
+
+def _request(port: int, method: str, path: str, body: dict | None = None, secret: str = SECRET) -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret, "Content-Type": "application/json"}
+        conn.request(method, path, json.dumps(body).encode() if body is not None else None, headers)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+    finally:
+        conn.close()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round((len(values) - 1) * pct)))]
+
+
+def run(args: argparse.Namespace) -> int:
+    payload = Path(args.payload).read_bytes()
+
+    with FakeBotAPI(payload) as api, tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(ROOT),
+            "TELEGRAM_TOKEN": TOKEN,
+            "TELEGRAM_API_URL": api.base_url,
+            "TELEGRAM_WEBHOOK_URL": f"http://127.0.0.1:{args.port}/telegram",
+            "TELEGRAM_WEBHOOK_SECRET": SECRET,
+            "WEBHOOK_LISTEN": "127.0.0.1",
+            "PORT": str(args.port),
+            "SCHEDULE_URL": f"{api.base_url}/schedule.json",
+            "EVENTS_SOURCE": f"{api.base_url}/events.jsonl",
+        }
+        # state.json del bot, al temporal.
+        bot = subprocess.Popen([sys.executable, str(ROOT / "bot_telegram.py")], cwd=tmp, env=env)
+        try:
+            deadline = time.monotonic() + 20
+            while True:
+                try:
+                    if _request(args.port, "GET", "/healthz") == 200:
+                        break
+                except OSError:
+                    pass
+                if time.monotonic() > deadline or bot.poll() is not None:
+                    print("❌ El bot no arrancó el webhook")
+                    return 1
+                time.sleep(0.2)
+
+            print(f"Bot en webhook (:{args.port}); setWebhook={api.calls.get('setWebhook', 0)}")
+            status = _request(args.port, "POST", "/telegram", command_update(0, "/start"), secret="mal")
+            print(f"Secreto incorrecto -> {status}")
+
+            sent: dict[int, float] = {}
+
+            def post(i: int) -> None:
+                sent[FIRST_CHAT + i] = time.perf_counter()
+                _request(args.port, "POST", "/telegram", command_update(i, COMMANDS[i % len(COMMANDS)]))
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                list(pool.map(post, range(1, args.updates + 1)))
+
+            deadline = time.monotonic() + args.timeout
+            while len(api.replies) < args.updates and time.monotonic() < deadline:
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - t0
+
+            latencies = [api.replies[chat] - t for chat, t in sent.items() if chat in api.replies]
+            if latencies:
+                print(
+                    f"{len(latencies)}/{args.updates} respuestas en {elapsed:.2f} s "
+                    f"({len(latencies) / elapsed:.0f} updates/s); "
+                    f"latencia p50 {_percentile(latencies, 0.5) * 1000:.0f} ms "
+                    f"p95 {_percentile(latencies, 0.95) * 1000:.0f} ms"
+                )
+
+            conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=10)
+            conn.request("GET", "/metrics")
+            print(conn.getresponse().read().decode())
+            conn.close()
+
+            return 0 if status == 403 and len(latencies) == args.updates else 1
+        finally:
+            bot.terminate()
+            bot.wait(timeout=15)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prueba el webhook del bot con un Telegram falso")
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--timeout", type=float, default=30, help="espera máxima a las respuestas (s)")
+    parser.add_argument("--payload", default=str(ROOT / "docs" / "schedule.json"))
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Fixtures grabadas para los benchmarks (y el servidor simulado).
+onebox/: páginas padre y select capturadas por debug_capture.
+dinaticket/: páginas de evento; "record" las vuelve a capturar en vivo.
+Todo se guarda con gzip para no engordar el repo.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+ONEBOX_DIR = FIXTURES_DIR / "onebox"
+DINATICKET_DIR = FIXTURES_DIR / "dinaticket"
+
+
+def read_fixture(path: Path) -> str:
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        return fh.read()
+
+
+def write_fixture(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.GzipFile(path, "wb", mtime=0) as fh:
+        fh.write(text.encode("utf-8"))
+    print(f"✔ Fixture {path.relative_to(FIXTURES_DIR)} ({len(text)} bytes)")
+
+
+def onebox_pages(kind: str = "html") -> dict[str, str]:
+    return {
+        p.name.removesuffix(f".{kind}.gz"): read_fixture(p)
+        for p in sorted(ONEBOX_DIR.glob(f"*.{kind}.gz"))
+    }
+
+
+def dinaticket_pages() -> dict[str, str]:
+    return {
+        p.name.removesuffix(".html.gz"): read_fixture(p)
+        for p in sorted(DINATICKET_DIR.glob("*.html.gz"))
+    }
+
+
+def record_onebox(src_dir: Path) -> None:
+    # debug/<sala>__onebox_<etiqueta>__<hash>.{html,txt}.gz -> <sala>_<etiqueta>.{html,txt}.gz
+    for src in sorted(src_dir.glob("*__onebox_*.gz")):
+        sala, label, rest = src.name.split("__", 2)
+        kind = rest.split(".", 1)[1]
+        write_fixture(ONEBOX_DIR / f"{sala}_{label.removeprefix('onebox_')}.{kind}", read_fixture(src))
+
+
+def record_dinaticket() -> None:
+    import requests
+
+    from providers import load_config, salas_for
+    from scraper_ci import UA
+
+    for entry in (salas_for(load_config(), "dinaticket").get("dinaticket") or {}).values():
+        for url in entry.get("urls") or []:
+            r = requests.get(url, headers=UA, timeout=20)
+            r.raise_for_status()
+            event_id = url.rstrip("/").split("/")[-1]
+            write_fixture(DINATICKET_DIR / f"event_{event_id}.html.gz", r.text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Graba las fixtures de los benchmarks")
+    parser.add_argument("what", choices=["onebox", "dinaticket"])
+    parser.add_argument("--from", dest="src", type=Path, default=Path("debug"),
+                        help="carpeta con las capturas de debug_capture (onebox)")
+    args = parser.parse_args()
+
+    if args.what == "onebox":
+        record_onebox(args.src)
+    else:
+        record_dinaticket()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Prueba de carga del pipeline completo (run_providers) contra el servidor
+simulado: levanta benchmarks.mock_server, desvía las URLs con
+TICKETING_BASE_URL y mide tiempo total, funciones/s y funciones perdidas
+para cada tamaño de catálogo.
+
+    python -m benchmarks.load_test --shows 10 50 100 --latency 50 --jitter 100 --error-rate 0.02
+
+Onebox y Kultur necesitan los navegadores de Playwright instalados
+(python -m playwright install chromium webkit).
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import scraper_ci  # noqa: F401  (registra dinaticket y onebox)
+from benchmarks.mock_server import add_fault_args, build_catalog, providers_config, server_from_args
+from core import TZ
+from providers import BASE_URL_ENV, build_providers, run_providers
+
+RESULTS_PATH = Path(__file__).resolve().parent / "load_latest.json"
+
+
+def run_once(args: argparse.Namespace, n_shows: int) -> dict:
+    catalog = build_catalog(n_shows, tuple(args.providers), args.sessions, args.seed)
+    config = providers_config(catalog, args.browser_concurrency)
+    expected = sum(len(show.sessions) for show in catalog)
+
+    log = io.StringIO()
+    with server_from_args(args, catalog) as server, tempfile.TemporaryDirectory() as tmp:
+        os.environ[BASE_URL_ENV] = server.base_url
+        cwd = os.getcwd()
+        # Las cachés (docs/onebox_cache.json, kultur_cache_*) van al temporal.
+        os.chdir(tmp)
+        try:
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(log):
+                current = run_providers(build_providers(config))
+            elapsed = time.perf_counter() - t0
+        finally:
+            os.chdir(cwd)
+            os.environ.pop(BASE_URL_ENV, None)
+
+        stats = dict(server.stats)
+
+    got = sum(len(funcs) for funcs in current.values())
+    errors = sum(1 for line in log.getvalue().splitlines() if "ERROR" in line)
+
+    result = {
+        "shows": n_shows,
+        "expected": expected,
+        "functions": got,
+        "missing": expected - got,
+        "seconds": round(elapsed, 2),
+        "functions_per_s": round(got / elapsed, 2) if elapsed else None,
+        "scraper_errors": errors,
+        "server": stats,
+    }
+    print(
+        f"{n_shows:>4} shows  {elapsed:>8.2f} s  {got:>5}/{expected:<5} funciones  "
+        f"{result['functions_per_s'] or 0:>7.2f} funciones/s  errores {errors}  "
+        f"inyectados {stats.get('error', 0)}+{stats.get('hang', 0)}"
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Carga del scraper contra las taquillas simuladas")
+    parser.add_argument("--shows", type=int, nargs="+", default=[10, 50, 100], help="tamaños de catálogo")
+    add_fault_args(parser)
+    parser.add_argument("--browser-concurrency", type=int, help="concurrencia de Onebox/Kultur")
+    args = parser.parse_args()
+
+    print(f"Proveedores {', '.join(args.providers)}; latencia {args.latency}+{args.jitter} ms, "
+          f"503 {args.error_rate:.0%}, colgadas {args.hang_rate:.0%}")
+
+    runs = [run_once(args, n) for n in args.shows]
+
+    RESULTS_PATH.write_text(
+        json.dumps(
+            {"created_at": datetime.now(TZ).isoformat(), "args": vars(args), "runs": runs},
+            ensure_ascii=False,
+            indent=2,
+        ),
+        "utf-8",
+    )
+    print(f"✔ Guardado {RESULTS_PATH.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+Servidor local que imita las taquillas para probar el scraper sin tocar las
+webs reales: páginas de evento de Dinaticket, páginas padre, /select/ y
+endpoint JSON de sesión de Onebox y la página de Kultur con sus
+getCalendar/getSessions.
+
+Las rutas llevan el host original como primer segmento
+(http://127.0.0.1:8765/www.dinaticket.com/es/...), que es lo que genera
+providers.rebase_url cuando TICKETING_BASE_URL apunta aquí.
+
+Se puede añadir latencia, jitter y fallos (503 o respuestas colgadas) para
+ver cómo se comportan timeouts y concurrencia.
+
+    python -m benchmarks.mock_server --shows 20 --latency 80 --jitter 120 --error-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core import TZ
+
+DINATICKET_HOST = "www.dinaticket.com"
+ONEBOX_HOST = "entradas.laescaleradejacob.es"
+KULTUR_HOST = "appkultur.com"
+KULTUR_API_HOST = "europe-west6-kultur-platform.cloudfunctions.net"
+
+MOCK_APPCHECK = "mock-appcheck-token"
+# Endpoint JSON de sesión que el scraper prueba antes que el HTML de la select.
+ONEBOX_SESSION_API = f"https://{ONEBOX_HOST}/api/sessions/{{select_id}}"
+
+DOW = ["lun", "mar", "mié", "jue", "vie", "sáb", "dom"]
+MES = ["ene", "feb", "mar", "abr", "may", "jun", "jul", "ago", "sep", "oct", "nov", "dic"]
+
+_DINATICKET_RE = re.compile(r"^/www\.dinaticket\.com/es/provider/\d+/event/(\d+)$")
+_ONEBOX_PARENT_RE = re.compile(r"^/entradas\.laescaleradejacob\.es/laescaleradejacob/events/(\d+)$")
+_ONEBOX_SELECT_RE = re.compile(r"^/entradas\.laescaleradejacob\.es/laescaleradejacob/select/(\d+)$")
+_ONEBOX_SESSION_API_RE = re.compile(r"^/entradas\.laescaleradejacob\.es/api/sessions/(\d+)$")
+_KULTUR_PAGE_RE = re.compile(r"^/appkultur\.com/madrid/([\w-]+)$")
+_KULTUR_API_RE = re.compile(r"^/europe-west6-kultur-platform\.cloudfunctions\.net/events_api_v2-(getCalendar|getSessions)$")
+
+
+@dataclass(slots=True)
+class MockSession:
+    id: int
+    inicio: datetime
+    capacidad: int
+    vendidas: int
+
+    @property
+    def stock(self) -> int:
+        return self.capacidad - self.vendidas
+
+
+@dataclass(slots=True)
+class MockShow:
+    id: int
+    provider: str
+    sala: str
+    sessions: list[MockSession] = field(default_factory=list)
+
+    @property
+    def url(self) -> str:
+        if self.provider == "dinaticket":
+            return f"https://{DINATICKET_HOST}/es/provider/20864/event/{self.id}"
+        if self.provider == "onebox":
+            return f"https://{ONEBOX_HOST}/laescaleradejacob/events/{self.id}"
+        return f"https://{KULTUR_HOST}/madrid/{self.event_id}"
+
+    @property
+    def event_id(self) -> str:
+        return f"mock-{self.id}"
+
+
+def build_catalog(
+    n_shows: int,
+    providers: tuple[str, ...] = ("dinaticket", "onebox"),
+    sessions_per_show: int = 8,
+    seed: int = 0,
+) -> list[MockShow]:
+    """Shows simulados repartidos entre proveedores; la primera función de
+    cada show cae mañana para que Kultur también pida getSessions."""
+    rnd = random.Random(seed)
+    today = datetime.now(TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+    shows = []
+
+    for i in range(n_shows):
+        provider = providers[i % len(providers)]
+        show = MockShow(id=100000 + i, provider=provider, sala=f"Mock{i:03d}")
+        hora = rnd.choice([(18, 0), (19, 30), (20, 0), (21, 0), (23, 0)])
+
+        for j in range(sessions_per_show):
+            # Primera función mañana y luego una por semana (±2 días).
+            day = today + timedelta(days=1 + j * 7 + rnd.randint(0, 2) * (j > 0))
+            inicio = day.replace(hour=hora[0], minute=hora[1])
+            capacidad = rnd.choice([20, 30, 40, 60])
+            show.sessions.append(
+                MockSession(
+                    id=show.id * 100 + j,
+                    inicio=inicio,
+                    capacidad=capacidad,
+                    vendidas=rnd.randint(0, capacidad),
+                )
+            )
+
+        shows.append(show)
+
+    return shows
+
+
+def providers_config(catalog: list[MockShow], browser_concurrency: int | None = None) -> dict:
+    """providers.json equivalente al catálogo (URLs reales; rebase_url las
+    desvía al servidor)."""
+    settings = {
+        "dinaticket": {"concurrency": 4, "timeout": 20},
+        "onebox": {"concurrency": 1, "timeout": 45, "session_api": [ONEBOX_SESSION_API]},
+        "kultur": {"enabled": True, "concurrency": 1, "timeout": 30},
+    }
+    if browser_concurrency:
+        settings["onebox"]["concurrency"] = browser_concurrency
+        settings["kultur"]["concurrency"] = browser_concurrency
+
+    salas: dict[str, list[dict]] = {}
+    for show in catalog:
+        if show.provider == "dinaticket":
+            entry = {"provider": "dinaticket", "urls": [show.url]}
+        elif show.provider == "onebox":
+            entry = {"provider": "onebox", "url": show.url}
+        else:
+            entry = {"provider": "kultur", "event_id": show.event_id, "url": show.url}
+        salas[show.sala] = [entry]
+
+    return {"providers": settings, "salas": salas}
+
+
+def onebox_date(inicio: datetime) -> str:
+    return f"{DOW[inicio.weekday()]}., {inicio.day:02d} {MES[inicio.month - 1]} {inicio.year} - {inicio:%H:%M}"
+
+
+def render_dinaticket(show: MockShow) -> str:
+    groups = []
+    for s in show.sessions:
+        # Dos cupos como en la web real: el parser suma total y stock.
+        general = s.capacidad * 2 // 3
+        general_stock = min(general, s.stock)
+        groups.append(
+            '<div class="js-session-group session-group">'
+            f'<div class="session-group__date"><span class="num_dia">{s.inicio.day}</span>'
+            f'<span class="mes">{MES[s.inicio.month - 1].capitalize()}.</span></div>'
+            '<div class="js-session-row session-card">'
+            f'<span class="session-card__time-session">{s.inicio:%H:%M}h</span>'
+            f'<div class="js-quota-row" data-quota-total="{general}" data-stock="{general_stock}">General</div>'
+            f'<div class="js-quota-row" data-quota-total="{s.capacidad - general}" '
+            f'data-stock="{s.stock - general_stock}">Reducida</div>'
+            "</div></div>"
+        )
+
+    return _page(show.sala, "".join(groups))
+
+
+def render_onebox_parent(show: MockShow) -> str:
+    items = "".join(
+        '<li class="session">'
+        f'<a href="/{ONEBOX_HOST}/laescaleradejacob/select/{s.id}">'
+        f'<span class="date">{escape(onebox_date(s.inicio))}</span> Comprar</a></li>'
+        for s in show.sessions
+    )
+    return _page(show.sala, f'<ul class="sessions">{items}</ul>')
+
+
+def render_onebox_select(show: MockShow, session: MockSession) -> str:
+    seats = (
+        '<div class="seat available"></div>' * session.stock
+        + '<div class="seat"></div>' * session.vendidas
+    )
+    body = f'<h1>{escape(show.sala)}</h1><p class="date">{escape(onebox_date(session.inicio))}</p><div class="map">{seats}</div>'
+    return _page(show.sala, body)
+
+
+def onebox_session_json(session: MockSession) -> dict:
+    return {
+        "id": session.id,
+        "startDate": session.inicio.isoformat(),
+        "availability": {"capacity": session.capacidad, "available": session.stock, "sold": session.vendidas},
+    }
+
+
+def render_kultur_page(show: MockShow) -> str:
+    # La página real pide getCalendar con el token de AppCheck; el scraper
+    # escucha esa respuesta y reutiliza el token para getSessions.
+    script = (
+        f'fetch("/{KULTUR_API_HOST}/events_api_v2-getCalendar", {{'
+        'method: "POST", '
+        f'headers: {{"Content-Type": "application/json", "x-firebase-appcheck": "{MOCK_APPCHECK}"}}, '
+        f'body: JSON.stringify({{data: {{eventId: "{show.event_id}"}}}})'
+        "});"
+    )
+    return _page(show.sala, f"<h1>{escape(show.sala)}</h1><script>{script}</script>")
+
+
+def kultur_calendar(show: MockShow) -> dict:
+    by_date: Counter[str] = Counter()
+    for s in show.sessions:
+        by_date[s.inicio.date().isoformat()] += s.stock
+    return {"result": {"data": [{"date": d, "available": n} for d, n in sorted(by_date.items())]}}
+
+
+def kultur_sessions(show: MockShow, start: str, end: str) -> dict:
+    lo = datetime.fromisoformat(start.replace("Z", "+00:00"))
+    hi = datetime.fromisoformat(end.replace("Z", "+00:00"))
+    data = [
+        {
+            "startTime": s.inicio.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "availability": {"sold": s.vendidas, "capacity": s.capacidad, "available": s.stock},
+        }
+        for s in show.sessions
+        if lo <= s.inicio < hi
+    ]
+    return {"result": {"data": data}}
+
+
+def _page(title: str, body: str) -> str:
+    return (
+        '<!DOCTYPE html><html lang="es"><head><meta charset="utf-8">'
+        f"<title>{escape(title)}</title></head><body>{body}</body></html>"
+    )
+
+
+class MockTicketing:
+    """Servidor en un hilo aparte. Uso: with MockTicketing(catalog) as m: m.base_url"""
+
+    def __init__(
+        self,
+        catalog: list[MockShow],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        hang_rate: float = 0,
+        hang_s: float = 60,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_s = hang_s
+
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats: Counter[str] = Counter()
+
+        self.by_id = {show.id: show for show in catalog}
+        self.by_event_id = {show.event_id: show for show in catalog}
+        self.sessions = {s.id: (show, s) for show in catalog for s in show.sessions}
+
+        self.httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> MockTicketing:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-ticketing", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> MockTicketing:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def fault(self) -> str | None:
+        """Decide el destino de una petición: None, "error" o "hang"."""
+        with self._lock:
+            delay = self.latency_ms + self._rnd.uniform(0, self.jitter_ms)
+            roll = self._rnd.random()
+
+        time.sleep(delay / 1000)
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.hang_rate:
+            return "hang"
+        return None
+
+    def route(self, method: str, path: str, body: bytes) -> tuple[int, str, str]:
+        """(status, content-type, cuerpo) para una ruta."""
+        if method == "GET":
+            if m := _DINATICKET_RE.match(path):
+                show = self.by_id.get(int(m.group(1)))
+                if show:
+                    return 200, "text/html", render_dinaticket(show)
+            elif m := _ONEBOX_PARENT_RE.match(path):
+                show = self.by_id.get(int(m.group(1)))
+                if show:
+                    return 200, "text/html", render_onebox_parent(show)
+            elif m := _ONEBOX_SELECT_RE.match(path):
+                hit = self.sessions.get(int(m.group(1)))
+                if hit:
+                    return 200, "text/html", render_onebox_select(*hit)
+            elif m := _ONEBOX_SESSION_API_RE.match(path):
+                hit = self.sessions.get(int(m.group(1)))
+                if hit:
+                    return 200, "application/json", json.dumps(onebox_session_json(hit[1]))
+            elif m := _KULTUR_PAGE_RE.match(path):
+                show = self.by_event_id.get(m.group(1))
+                if show:
+                    return 200, "text/html", render_kultur_page(show)
+            elif path == "/__stats":
+                return 200, "application/json", json.dumps(self.stats)
+
+        elif method == "POST" and (m := _KULTUR_API_RE.match(path)):
+            try:
+                data = json.loads(body or b"{}").get("data") or {}
+            except ValueError:
+                return 400, "application/json", '{"error": "bad json"}'
+
+            show = self.by_event_id.get(data.get("eventId"))
+            if show:
+                if m.group(1) == "getCalendar":
+                    return 200, "application/json", json.dumps(kultur_calendar(show))
+                return 200, "application/json", json.dumps(kultur_sessions(show, data["from"], data["to"]))
+
+        return 404, "text/plain", "not found"
+
+
+def _handler_for(server: MockTicketing) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_OPTIONS(self):
+            # getSessions se lanza desde about:blank con cabecera propia: preflight CORS.
+            self.send_response(204)
+            self._cors()
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self):
+            self._serve("GET")
+
+        def do_POST(self):
+            self._serve("POST")
+
+        def _serve(self, method: str) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            path = self.path.split("?", 1)[0]
+
+            if path != "/__stats":
+                outcome = server.fault()
+                if outcome == "hang":
+                    server.count("hang")
+                    time.sleep(server.hang_s)
+                if outcome == "error":
+                    server.count("error")
+                    self._reply(503, "text/plain", "injected failure")
+                    return
+
+            status, ctype, text = server.route(method, path, body)
+            server.count(f"{method} {status}")
+            self._reply(status, ctype, text)
+
+        def _reply(self, status: int, ctype: str, text: str) -> None:
+            data = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", f"{ctype}; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self._cors()
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # El cliente ya abandonó (timeout): no es un fallo del servidor.
+                return
+            server.count("bytes", len(data))
+
+        def _cors(self) -> None:
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Access-Control-Allow-Headers", "Content-Type, x-firebase-appcheck")
+            self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+
+    return Handler
+
+
+def add_fault_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--providers", nargs="+", default=["dinaticket", "onebox"],
+                        choices=["dinaticket", "onebox", "kultur"])
+    parser.add_argument("--sessions", type=int, default=8, help="funciones por show")
+    parser.add_argument("--latency", type=float, default=0, help="latencia base (ms)")
+    parser.add_argument("--jitter", type=float, default=0, help="latencia extra aleatoria (ms)")
+    parser.add_argument("--error-rate", type=float, default=0, help="fracción de respuestas 503")
+    parser.add_argument("--hang-rate", type=float, default=0, help="fracción de respuestas colgadas")
+    parser.add_argument("--hang-s", type=float, default=60, help="segundos que cuelga una respuesta")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def server_from_args(args: argparse.Namespace, catalog: list[MockShow], port: int = 0) -> MockTicketing:
+    return MockTicketing(
+        catalog,
+        port=port,
+        latency_ms=args.latency,
+        jitter_ms=args.jitter,
+        error_rate=args.error_rate,
+        hang_rate=args.hang_rate,
+        hang_s=args.hang_s,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Taquillas simuladas para el scraper")
+    parser.add_argument("--shows", type=int, default=10, help="número de shows simulados")
+    add_fault_args(parser)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", help="guarda aquí el providers.json del catálogo")
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.shows, tuple(args.providers), args.sessions, args.seed)
+    if args.config:
+        with open(args.config, "w", encoding="utf-8") as fh:
+            json.dump(providers_config(catalog), fh, ensure_ascii=False, indent=2)
+        print(f"✔ Configuración en {args.config}")
+
+    server = server_from_args(args, catalog, args.port)
+    print(f"Taquillas simuladas en {server.base_url} ({len(catalog)} shows)")
+    print(f"  TICKETING_BASE_URL={server.base_url} PROVIDERS_CONFIG={args.config or '...'} python scraper_ci.py")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
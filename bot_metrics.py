@@ -0,0 +1,231 @@
+"""
+Métricas del bot en memoria: contadores e histogramas con etiquetas.
+- @timed_handler("nombre") en cada handler: latencia, llamadas y errores.
+- fetch_payload: duración de la descarga y aciertos/fallos de _cache.
+- poll_and_notify: alertas enviadas y send_message fallidos.
+render_prometheus() es el texto de /metrics (webhook o METRICS_PORT) y
+summary() el de /admin_stats. Se pierden al reiniciar: sirven para
+dimensionar el bot y ver regresiones, no como histórico.
+"""
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: tuple[str, str] | None = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def total(self, **labels: str) -> float:
+        want = set(_labels(labels))
+        with self._lock:
+            return sum(v for k, v in self.values.items() if want <= set(k))
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_fmt_labels(k)} {v:g}" for k, v in sorted(self.values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = BUCKETS_S):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [conteo por cubo (+Inf al final), suma, total]
+        self.values: dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def quantile(self, q: float, **labels: str) -> float | None:
+        """Estimación por cubos (límite superior del cubo del cuantil)."""
+        with self._lock:
+            entry = self.values.get(_labels(labels))
+            if not entry or not entry[2]:
+                return None
+            target = q * entry[2]
+            seen = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[0]):
+                seen += count
+                if seen >= target:
+                    return bound
+        return None
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Counter | Histogram] = []
+        self.started = time.monotonic()
+
+    def counter(self, name: str, help: str) -> Counter:
+        metric = Counter(name, help)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str) -> Histogram:
+        metric = Histogram(name, help)
+        self.metrics.append(metric)
+        return metric
+
+
+REGISTRY = Registry()
+
+COMMANDS = REGISTRY.counter("bot_handler_calls_total", "Updates atendidos por handler")
+COMMAND_ERRORS = REGISTRY.counter("bot_handler_errors_total", "Excepciones no capturadas por handler")
+COMMAND_SECONDS = REGISTRY.histogram("bot_handler_seconds", "Latencia por handler")
+FETCH_SECONDS = REGISTRY.histogram("bot_fetch_payload_seconds", "Descarga y parseo de schedule.json")
+PAYLOAD_CACHE = REGISTRY.counter("bot_payload_cache_total", "fetch_payload por resultado (hit, miss, stale)")
+FETCH_ERRORS = REGISTRY.counter("bot_fetch_payload_errors_total", "Fallos de descarga o parseo del payload")
+ALERTS_SENT = REGISTRY.counter("bot_alerts_sent_total", "Alertas enviadas a suscriptores")
+SEND_FAILURES = REGISTRY.counter("bot_send_failures_total", "send_message fallidos")
+
+
+def timed_handler(name: str):
+    """Cuenta y mide un handler async; las excepciones se cuentan y siguen."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            COMMANDS.inc(handler=name)
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                COMMAND_ERRORS.inc(handler=name)
+                raise
+            finally:
+                COMMAND_SECONDS.observe(time.perf_counter() - t0, handler=name)
+
+        return wrapper
+
+    return decorator
+
+
+def render_prometheus() -> str:
+    lines = [
+        "# TYPE bot_uptime_seconds gauge",
+        f"bot_uptime_seconds {time.monotonic() - REGISTRY.started:.0f}",
+    ]
+    for metric in REGISTRY.metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+def _ms(seconds: float | None) -> str:
+    if seconds is None:
+        return "—"
+    if seconds == float("inf"):
+        return f">{BUCKETS_S[-1]:g} s"
+    return f"≤{seconds * 1000:.0f} ms"
+
+
+def summary() -> str:
+    uptime = time.monotonic() - REGISTRY.started
+    hits, misses, stale = (PAYLOAD_CACHE.total(result=r) for r in ("hit", "miss", "stale"))
+    lookups = hits + misses + stale
+
+    lines = [
+        f"📊 Bot — {uptime / 3600:.1f} h en marcha",
+        "",
+        f"Payload: {misses + stale:.0f} descargas, p50 {_ms(FETCH_SECONDS.quantile(0.5))} "
+        f"p95 {_ms(FETCH_SECONDS.quantile(0.95))}, {FETCH_ERRORS.total():.0f} errores",
+        f"Caché: {hits / lookups:.0%} aciertos ({hits:.0f}/{lookups:.0f})" if lookups else "Caché: sin consultas",
+        f"Alertas: {ALERTS_SENT.total():.0f} enviadas, {SEND_FAILURES.total():.0f} fallidas",
+        "",
+        "Handlers (llamadas · p50 · p95 · errores):",
+    ]
+
+    for key, calls in sorted(list(COMMANDS.values.items()), key=lambda kv: -kv[1]):
+        name = dict(key)["handler"]
+        lines.append(
+            f"• {name}: {calls:.0f} · {_ms(COMMAND_SECONDS.quantile(0.5, handler=name))} · "
+            f"{_ms(COMMAND_SECONDS.quantile(0.95, handler=name))} · {COMMAND_ERRORS.total(handler=name):.0f}"
+        )
+
+    return "\n".join(lines)
+
+
+def serve_http(host: str, port: int) -> ThreadingHTTPServer:
+    """/metrics en un hilo aparte, para el modo polling (en webhook lo sirve
+    el propio servidor del webhook)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="bot-metrics", daemon=True).start()
+    return httpd
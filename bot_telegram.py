@@ -1,27 +1,72 @@
-import os, json, re, requests, time, logging
+import os, json, re, requests, time, logging, asyncio, threading
 from pathlib import Path
-from bs4 import BeautifulSoup
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from typing import Any, Dict, List, Optional, Tuple
-
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
+from telegram.error import BadRequest
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
     CallbackQueryHandler,
+    InlineQueryHandler,
 )
 
+import bot_metrics
+import change_events
+import sparkline
+from bot_metrics import (
+    ALERTS_SENT,
+    FETCH_ERRORS,
+    FETCH_SECONDS,
+    PAYLOAD_CACHE,
+    SEND_FAILURES,
+    timed_handler,
+)
+from core import Function, event_functions, iter_functions, iter_rows
+
 # ====================== CONFIG ======================
-URL = "https://magiaymentalismo.github.io/Atrapalo_clean/?v=1632222"
-UA  = {"User-Agent": "Mozilla/5.0 (X11; Linux) AppleWebKit/537.36 Chrome/123 Safari/537.36"}
+URL = os.getenv("SCHEDULE_URL", "https://magiaymentalismo.github.io/Atrapalo_clean/schedule.json")
+UA  = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux) AppleWebKit/537.36 Chrome/123 Safari/537.36",
+    "Cache-Control": "no-cache",
+}
 TZ  = ZoneInfo("Europe/Madrid")
 TELEGRAM_LIMIT = 4096
+# Líneas por página de resultados (un solo mensaje que se edita).
+PAGE_LINES = 20
+INLINE_RESULTS = 20
 CACHE_TTL = 60
 STATE_FILE = Path("state.json")
+# Flujo de cambios del scraper: la URL publicada o, con el daemon en la
+# misma máquina, la ruta local de docs/events.jsonl.
+EVENTS_SOURCE = os.getenv("EVENTS_SOURCE", URL.rsplit("/", 1)[0] + "/events.jsonl")
+_EVENTS_LOCAL = not EVENTS_SOURCE.startswith(("http://", "https://"))
+EVENTS_POLL_S = int(os.getenv("EVENTS_POLL_S", "5" if _EVENTS_LOCAL else "60"))
+# Modo webhook (bot_webhook.py): URL pública completa, con el path. Sin ella, polling.
+WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8080"))
+# /metrics en modo polling (en webhook va en el mismo puerto del webhook).
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Chats que pueden usar /admin_stats (ids separados por comas).
+ADMIN_CHAT_IDS = {int(x) for x in os.getenv("ADMIN_CHAT_IDS", "").replace(" ", "").split(",") if x}
+# Solo para pruebas contra un Bot API falso (benchmarks/fake_telegram.py).
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
 
 EXCLUDE_EVENTS_FROM_BOT = {"Juanma"}
+# Franjas por imagen de /trend (el pie de foto admite 1024 caracteres).
+TREND_MAX_FUNCS = 12
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,15 +84,6 @@ def _is_excluded(event_name: Optional[str]) -> bool:
     return bool(event_name) and event_name in EXCLUDE_EVENTS_FROM_BOT
 
 # ====================== UTILS ======================
-def _normalize_int(x) -> Optional[int]:
-    if x in (None, "", "—", "-", "N/A", "NA"):
-        return None
-    try:
-        s = str(x).replace(".", "").replace(",", "")
-        return int(s)
-    except Exception:
-        return None
-
 def _split_for_telegram(text: str, limit: int = TELEGRAM_LIMIT) -> List[str]:
     if len(text) <= limit:
         return [text]
@@ -69,6 +105,9 @@ def _split_for_telegram(text: str, limit: int = TELEGRAM_LIMIT) -> List[str]:
     return parts
 
 def _extract_payload_from_html(html: str) -> Dict[str, Any]:
+    # Solo para SCHEDULE_URL antiguas que apuntan al index.html con el payload embebido.
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
 
     tag = soup.find("script", id="PAYLOAD")
@@ -91,28 +130,52 @@ def fetch_payload(force: bool = False) -> Dict[str, Any]:
     global _cache
 
     if (not force) and _cache and (_now() - _cache[0] < CACHE_TTL):
+        PAYLOAD_CACHE.inc(result="hit")
         return _cache[1]
 
-    try:
-        r = requests.get(URL, headers=UA, timeout=20)
-        r.raise_for_status()
-    except requests.RequestException as e:
-        if _cache:
-            logger.warning("HTTP error, usando cache: %s", e)
-            return _cache[1]
-        raise RuntimeError(f"HTTP error: {e}") from e
-
-    try:
-        data = _extract_payload_from_html(r.text)
-    except Exception as e:
-        if _cache:
-            logger.warning("Error parseando payload, usando cache: %s", e)
-            return _cache[1]
-        raise RuntimeError(f"No pude parsear el payload: {e}") from e
+    with FETCH_SECONDS.time():
+        try:
+            r = requests.get(URL, headers=UA, timeout=20)
+            r.raise_for_status()
+        except requests.RequestException as e:
+            FETCH_ERRORS.inc(stage="http")
+            if _cache:
+                PAYLOAD_CACHE.inc(result="stale")
+                logger.warning("HTTP error, usando cache: %s", e)
+                return _cache[1]
+            raise RuntimeError(f"HTTP error: {e}") from e
 
+        try:
+            if r.text.lstrip().startswith("{"):
+                data = r.json()
+            else:
+                data = _extract_payload_from_html(r.text)
+        except Exception as e:
+            FETCH_ERRORS.inc(stage="parse")
+            if _cache:
+                PAYLOAD_CACHE.inc(result="stale")
+                logger.warning("Error parseando payload, usando cache: %s", e)
+                return _cache[1]
+            raise RuntimeError(f"No pude parsear el payload: {e}") from e
+
+    PAYLOAD_CACHE.inc(result="miss")
     _cache = (_now(), data)
     return data
 
+_fetch_lock = asyncio.Lock()
+
+async def get_payload() -> Dict[str, Any]:
+    """fetch_payload para los handlers: con la caché vigente no sale del
+    bucle; si hay que descargar lo hace en un hilo (requests es bloqueante)
+    y una sola vez aunque lleguen varios updates a la vez."""
+    if _cache and (_now() - _cache[0] < CACHE_TTL):
+        PAYLOAD_CACHE.inc(result="hit")
+        return _cache[1]
+
+    async with _fetch_lock:
+        # Quien esperaba el lock encuentra en _cache la descarga del anterior.
+        return await asyncio.to_thread(fetch_payload)
+
 def _safe_pct(vendidas: Optional[int], cap: Optional[int]) -> Optional[int]:
     if vendidas is None or cap in (None, 0):
         return None
@@ -138,90 +201,31 @@ def _fmt_extra(vendidas, cap, stock) -> str:
 
     return (" · " + " ".join(parts)) if parts else ""
 
-def _reply_long(update: Update, text: str):
-    async def _inner():
-        for part in _split_for_telegram(text):
-            if getattr(update, "callback_query", None):
-                await update.callback_query.message.reply_text(part)
-            else:
-                await update.message.reply_text(part)
-
-    return _inner()
-
 # ================== HELPERS SOBRE EL PAYLOAD ================== #
-def _iter_all_rows(data: Dict[str, Any]):
-    eventos = data.get("eventos") or {}
-
-    for nombre, info in eventos.items():
-        if _is_excluded(nombre):
-            continue
-
-        if not isinstance(info, dict):
-            continue
+# Columnas de analítica del scraper (analytics.ANALYTICS_HEADERS; el bot no carga numpy).
+PACE_HEADERS = ("Ocupacion", "Ritmo", "DiasAgotar", "OcupacionPrevista")
 
-        if "proximas" in info or "pasadas" in info:
-            for sec_name in ("proximas", "pasadas"):
-                sec = info.get(sec_name) or {}
-                table = sec.get("table") or {}
-                rows = table.get("rows") or []
-
-                for r in rows:
-                    yield nombre, r
-        else:
-            table = info.get("table") or {}
-            rows = table.get("rows") or []
+def _excluded_names(data: Dict[str, Any]) -> List[str]:
+    return [n for n in (data.get("eventos") or {}) if _is_excluded(n)]
 
-            for r in rows:
-                yield nombre, r
+def _iter_all_rows(data: Dict[str, Any]) -> Iterator[Tuple[str, Function]]:
+    return iter_functions(data, ("proximas", "pasadas"), skip=_excluded_names(data))
 
-def _iter_upcoming_functions(data: Dict[str, Any]):
-    eventos = data.get("eventos") or {}
+def _iter_upcoming_functions(data: Dict[str, Any]) -> Iterator[Tuple[str, Function]]:
+    return iter_functions(data, skip=_excluded_names(data))
 
-    for nombre, info in eventos.items():
-        if _is_excluded(nombre):
-            continue
-
-        if not isinstance(info, dict):
-            continue
+def _get_rows_for_event_view(ev: Dict[str, Any], top: int = 5) -> List[Function]:
+    return event_functions(ev, top)
 
-        proximas = info.get("proximas") or {}
-        table = proximas.get("table") or {}
-        rows = table.get("rows") or []
-
-        for r in rows:
-            fecha_label = r[0] if len(r) > 0 else ""
-            hora        = r[1] if len(r) > 1 else ""
-            vendidas    = _normalize_int(r[2] if len(r) > 2 else None)
-            fecha_iso   = r[3] if len(r) > 3 else ""
-            cap         = _normalize_int(r[4] if len(r) > 4 else None)
-            stock       = _normalize_int(r[5] if len(r) > 5 else None)
-
-            key = f"{nombre}::{fecha_iso}::{hora}"
-
-            yield {
-                "key": key,
-                "evento": nombre,
-                "fecha_label": fecha_label,
-                "hora": hora,
-                "fecha_iso": fecha_iso,
-                "vendidas": vendidas,
-                "cap": cap,
-                "stock": stock,
-            }
-
-def _get_rows_for_event_view(ev: Dict[str, Any], top: int = 5) -> List[list]:
-    if not isinstance(ev, dict):
-        return []
-
-    if "proximas" in ev:
-        rows = (((ev.get("proximas") or {}).get("table") or {}).get("rows") or [])
-        return rows[:top] if top else rows
-
-    rows = (((ev.get("table") or {}).get("rows") or []))
-    return rows[:top] if top else rows
+def _iter_upcoming_with_pace(data: Dict[str, Any]) -> Iterator[Tuple[str, Function, Dict[str, Any]]]:
+    """Como _iter_upcoming_functions, con las columnas de analítica que
+    añade el scraper (Ocupacion, Ritmo, DiasAgotar, OcupacionPrevista)."""
+    for row in iter_rows(data, skip=_excluded_names(data)):
+        pace = {h: row.get(h) for h in PACE_HEADERS if row.columns.index(h) >= 0}
+        if pace:
+            yield row.sala, row.function, pace
 
-def format_resume(data: Dict[str, Any], evento: Optional[str] = None, top: int = 5) -> str:
-    eventos = data.get("eventos", {})
+def _generated_label(data: Dict[str, Any]) -> str:
     gen_str = data.get("generated_at") or data.get("generatedAt") or datetime.now(tz=TZ).isoformat()
 
     try:
@@ -229,38 +233,148 @@ def format_resume(data: Dict[str, Any], evento: Optional[str] = None, top: int =
     except Exception:
         gen_dt = datetime.now(tz=TZ)
 
-    header = f"🪄 Cartelera (actualizado {gen_dt:%d/%m %H:%M})"
-    lines = [header]
+    return f"{gen_dt:%d/%m %H:%M}"
 
+def _resume_lines(data: Dict[str, Any], evento: Optional[str] = None, top: int = 5) -> Iterator[str]:
+    eventos = data.get("eventos", {})
     keys = [k for k in eventos.keys() if not _is_excluded(k)]
 
     if evento:
         wanted = evento.casefold()
         keys = [k for k in keys if wanted in k.casefold()]
 
-        if not keys:
-            return f"No encontré un evento que contenga “{evento}”."
-
     for k in keys:
-        ev = eventos.get(k) or {}
-        rows = _get_rows_for_event_view(ev, top=top)
+        rows = _get_rows_for_event_view(eventos.get(k) or {}, top=top)
 
         if not rows:
             continue
 
-        lines.append(f"\n— {k} —")
+        yield f"\n— {k} —"
+
+        for f in rows:
+            extra = _fmt_extra(f.vendidas, f.capacidad, f.stock)
+
+            yield f"• {f.fecha_label} {f.hora}{extra}"
+
+def format_resume(data: Dict[str, Any], evento: Optional[str] = None, top: int = 5) -> str:
+    lines = list(_resume_lines(data, evento, top))
+
+    if not lines:
+        return f"No encontré un evento que contenga “{evento}”." if evento else "Sin funciones."
+
+    return "\n".join([f"🪄 Cartelera (actualizado {_generated_label(data)})", *lines])
+
+# ====================== PÁGINAS ======================
+# Cada vista devuelve (cabecera, líneas, mensaje si no hay nada). Las líneas
+# son un generador: una página solo recorre el payload hasta donde la
+# necesita. El callback_data lleva vista, página y argumento, así que los
+# botones siguen funcionando aunque el bot se reinicie.
+View = Tuple[str, Iterator[str], str]
+
+def _view_resume(data: Dict[str, Any], arg: str) -> View:
+    header = f"🪄 Cartelera (actualizado {_generated_label(data)})"
+    empty = f"No encontré un evento que contenga “{arg}”." if arg else "Sin funciones."
+    return header, _resume_lines(data, evento=arg or None, top=20 if arg else 10), empty
+
+def _view_find(data: Dict[str, Any], wanted: str) -> View:
+    lines = (
+        f"• {k}: {f.fecha_label} {f.hora}{_fmt_extra(f.vendidas, f.capacidad, f.stock)}"
+        for k, f in _iter_all_rows(data)
+        if f.fecha_iso == wanted
+    )
+    return f"🎫 Funciones el {wanted}:", lines, "No hay funciones ese día."
+
+def _view_lowstock(data: Dict[str, Any], arg: str) -> View:
+    threshold = int(arg or 10)
+    lines = (
+        f"• {k}: {f.fecha_label} {f.hora} · quedan {f.stock}"
+        for k, f in _iter_all_rows(data)
+        if f.stock is not None and 0 <= f.stock <= threshold
+    )
+    return f"⚠️ Funciones con ≤ {threshold} entradas:", lines, "No hay funciones con pocas entradas."
+
+def _view_soldout(data: Dict[str, Any], arg: str) -> View:
+    lines = (f"• {k}: {f.fecha_label} {f.hora} · AGOTADO" for k, f in _iter_all_rows(data) if f.stock == 0)
+    return "⛔ Funciones agotadas:", lines, "No hay funciones agotadas."
+
+def _ritmo_lines(data: Dict[str, Any], q: str) -> Iterator[str]:
+    current = None
+
+    for nombre, f, pace in _iter_upcoming_with_pace(data):
+        if q and q not in nombre.casefold():
+            continue
+        if not pace.get("Ritmo"):
+            continue
+
+        if nombre != current:
+            current = nombre
+            yield f"\n— {nombre} —"
+
+        line = f"• {f.fecha_label} {f.hora}{_fmt_extra(f.vendidas, f.capacidad, f.stock)} · {pace['Ritmo']}/día"
+        prevista, dias = pace.get("OcupacionPrevista"), pace.get("DiasAgotar")
+
+        if prevista is not None and prevista < 100:
+            line += f" · prevista {prevista}%"
+        elif f.stock != 0 and dias:
+            line += f" · se agota en ~{dias:.0f} d"
+
+        yield line
+
+def _view_ritmo(data: Dict[str, Any], arg: str) -> View:
+    return "📊 Ritmo de venta (últimos 7 días)", _ritmo_lines(data, arg.casefold()), "Sin ventas recientes para calcular el ritmo."
+
+VIEWS = {
+    "st": _view_resume,
+    "fd": _view_find,
+    "ls": _view_lowstock,
+    "so": _view_soldout,
+    "rt": _view_ritmo,
+}
+
+def _page_data(kind: str, page: int, arg: str) -> str:
+    # Telegram admite 64 bytes de callback_data; el argumento se recorta.
+    prefix = f"pg|{kind}|{page}|"
+    room = 64 - len(prefix.encode("utf-8"))
+    return prefix + arg.encode("utf-8")[:room].decode("utf-8", "ignore")
+
+def render_page(data: Dict[str, Any], kind: str, arg: str = "", page: int = 0) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    header, lines, empty = VIEWS[kind](data, arg)
+    start = page * PAGE_LINES
+    section = None
+    chunk: List[str] = []
+
+    # Una línea de más para saber si hay página siguiente.
+    for i, line in enumerate(islice(lines, start + PAGE_LINES + 1)):
+        if i >= start:
+            chunk.append(line)
+        elif line.startswith("\n— "):
+            section = line
+
+    if not chunk:
+        return (empty if page == 0 else f"{header}\n\n(sin más resultados)"), None
 
-        for r in rows:
-            fecha_label = r[0] if len(r) > 0 else ""
-            hora        = r[1] if len(r) > 1 else ""
-            vendidas    = _normalize_int(r[2] if len(r) > 2 else None)
-            cap         = _normalize_int(r[4] if len(r) > 4 else None)
-            stock       = _normalize_int(r[5] if len(r) > 5 else None)
-            extra = _fmt_extra(vendidas, cap, stock)
+    has_next = len(chunk) > PAGE_LINES
+    chunk = chunk[:PAGE_LINES]
+    # La página empieza a mitad de un evento: se repite su título.
+    if section and not chunk[0].startswith("\n— "):
+        chunk.insert(0, f"{section} (sigue)")
 
-            lines.append(f"• {fecha_label} {hora}{extra}")
+    text = "\n".join([header, *chunk])
 
-    return "\n".join(lines) if len(lines) > 1 else "Sin funciones."
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀️", callback_data=_page_data(kind, page - 1, arg)))
+    if page > 0 or has_next:
+        buttons.append(InlineKeyboardButton(f"Pág. {page + 1}", callback_data="noop"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("▶️", callback_data=_page_data(kind, page + 1, arg)))
+
+    return text[:TELEGRAM_LIMIT], InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def _send_page(update: Update, kind: str, arg: str = ""):
+    text, markup = render_page(await get_payload(), kind, arg)
+    message = update.message or update.callback_query.message
+    await message.reply_text(text, reply_markup=markup)
 
 # ====================== ESTADO ======================
 def _load_state():
@@ -276,7 +390,8 @@ def _load_state():
         raw = {}
 
     raw.setdefault("subscribers", [])
-    raw.setdefault("counts", {})
+    raw.setdefault("events_seq", None)
+    raw.pop("counts", None)
 
     return raw
 
@@ -287,6 +402,7 @@ def _save_state(state):
         logger.warning("No pude guardar state.json: %s", e)
 
 # ====================== COMANDOS ======================
+@timed_handler("start")
 async def start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     keyboard = [
         [
@@ -311,14 +427,14 @@ async def start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         reply_markup=reply_markup,
     )
 
+@timed_handler("status")
 async def status_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     try:
-        data = fetch_payload()
-        msg = format_resume(data, evento=None, top=10)
-        await _reply_long(update, msg)
+        await _send_page(update, "st")
     except Exception as e:
         await update.message.reply_text(f"Error leyendo datos: {e}")
 
+@timed_handler("evento")
 async def evento_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     try:
         q = " ".join(ctx.args).strip()
@@ -327,12 +443,11 @@ async def evento_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("Uso: /evento <texto>")
             return
 
-        data = fetch_payload()
-        msg = format_resume(data, evento=q, top=20)
-        await _reply_long(update, msg)
+        await _send_page(update, "st", q)
     except Exception as e:
         await update.message.reply_text(f"Error: {e}")
 
+@timed_handler("find")
 async def find_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     try:
         if not ctx.args:
@@ -345,33 +460,11 @@ async def find_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("Formato inválido. Usa YYYY-MM-DD.")
             return
 
-        data = fetch_payload()
-        results = []
-
-        for k, r in _iter_all_rows(data):
-            if len(r) > 3 and r[3] == wanted:
-                results.append((k, r))
-
-        if not results:
-            await update.message.reply_text("No hay funciones ese día.")
-            return
-
-        lines = [f"🎫 Funciones el {wanted}:"]
-
-        for k, r in results:
-            fecha_label = r[0] if len(r) > 0 else ""
-            hora        = r[1] if len(r) > 1 else ""
-            vendidas    = _normalize_int(r[2] if len(r) > 2 else None)
-            cap         = _normalize_int(r[4] if len(r) > 4 else None)
-            stock       = _normalize_int(r[5] if len(r) > 5 else None)
-            extra = _fmt_extra(vendidas, cap, stock)
-
-            lines.append(f"• {k}: {fecha_label} {hora}{extra}")
-
-        await _reply_long(update, "\n".join(lines))
+        await _send_page(update, "fd", wanted)
     except Exception as e:
         await update.message.reply_text(f"Error: {e}")
 
+@timed_handler("lowstock")
 async def lowstock_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     try:
         threshold = None
@@ -382,55 +475,28 @@ async def lowstock_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             except Exception:
                 threshold = None
 
-        threshold = threshold or 10
-
-        data = fetch_payload()
-        lines = [f"⚠️ Funciones con ≤ {threshold} entradas:"]
-        count = 0
-
-        for k, r in _iter_all_rows(data):
-            stock = _normalize_int(r[5] if len(r) > 5 else None)
-
-            if stock is not None and stock <= threshold and stock >= 0:
-                fecha_label = r[0] if len(r) > 0 else ""
-                hora        = r[1] if len(r) > 1 else ""
-
-                lines.append(f"• {k}: {fecha_label} {hora} · quedan {stock}")
-                count += 1
-
-        if count == 0:
-            await update.message.reply_text("No hay funciones con pocas entradas.")
-        else:
-            await _reply_long(update, "\n".join(lines))
+        await _send_page(update, "ls", str(threshold or 10))
     except Exception as e:
         await update.message.reply_text(f"Error: {e}")
 
+@timed_handler("soldout")
 async def soldout_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     try:
-        data = fetch_payload()
-        lines = ["⛔ Funciones agotadas:"]
-        count = 0
-
-        for k, r in _iter_all_rows(data):
-            stock = _normalize_int(r[5] if len(r) > 5 else None)
-
-            if stock == 0:
-                fecha_label = r[0] if len(r) > 0 else ""
-                hora        = r[1] if len(r) > 1 else ""
-
-                lines.append(f"• {k}: {fecha_label} {hora} · AGOTADO")
-                count += 1
+        await _send_page(update, "so")
+    except Exception as e:
+        await update.message.reply_text(f"Error: {e}")
 
-        if count == 0:
-            await update.message.reply_text("No hay funciones agotadas.")
-        else:
-            await _reply_long(update, "\n".join(lines))
+@timed_handler("ritmo")
+async def ritmo_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    try:
+        await _send_page(update, "rt", " ".join(ctx.args).strip())
     except Exception as e:
         await update.message.reply_text(f"Error: {e}")
 
+@timed_handler("raw")
 async def raw_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     try:
-        data = fetch_payload()
+        data = await get_payload()
         keys = list(data.keys())
         eventos = [e for e in (data.get("eventos") or {}).keys() if not _is_excluded(e)]
         gen = data.get("generated_at") or data.get("generatedAt")
@@ -442,11 +508,146 @@ async def raw_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             f"eventos: {', '.join(eventos) if eventos else '(ninguno)'}"
         )
 
-        await _reply_long(update, msg)
+        await update.message.reply_text(msg)
+    except Exception as e:
+        await update.message.reply_text(f"Error: {e}")
+
+# ====================== TENDENCIAS ======================
+# Historial de ventas para /trend: el flujo de eventos publicado, acumulado
+# en memoria por seq (se descarga solo lo nuevo, desde _trend_seq).
+# _cached_trend corre en hilos (asyncio.to_thread): todo este estado, el
+# lector incluido, va bajo _trend_lock.
+_trend_lock = threading.Lock()
+_trend_reader = change_events.EventReader(EVENTS_SOURCE)
+_trend_events: Dict[int, Dict[str, Any]] = {}
+_trend_seq = 0
+# Imágenes ya dibujadas para el generated_at actual: {evento: (png, pie)}.
+_trend_cache: Dict[str, Tuple[bytes, str]] = {}
+_trend_cache_gen: Optional[str] = None
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def _load_trend_events() -> Dict[str, List[Dict[str, Any]]]:
+    global _trend_seq
+
+    # El cursor va aparte: los eventos podados no se vuelven a leer.
+    for e in _trend_reader.read_since(_trend_seq):
+        _trend_events[e["seq"]] = e
+        _trend_seq = max(_trend_seq, e["seq"])
+
+    today = datetime.now(TZ).date().isoformat()
+    for seq in [seq for seq, e in _trend_events.items() if e.get("fecha_iso", "") < today]:
+        del _trend_events[seq]
+
+    by_key: Dict[str, List[Dict[str, Any]]] = {}
+    for seq in sorted(_trend_events):
+        e = _trend_events[seq]
+        by_key.setdefault(e["key"], []).append(e)
+    return by_key
+
+def render_trend(data: Dict[str, Any], evento: str) -> Optional[Tuple[bytes, str]]:
+    """PNG con una sparkline de vendidas acumuladas por próxima función del
+    evento, y el pie de foto con las etiquetas en el mismo orden. Se llama
+    con _trend_lock tomado (desde _cached_trend)."""
+    wanted = evento.casefold()
+    funcs = [(n, f) for n, f in _iter_upcoming_functions(data) if wanted in n.casefold()]
+    if not funcs:
+        return None
+    funcs = funcs[:TREND_MAX_FUNCS]
+
+    by_key = _load_trend_events()
+    now_ts = _timestamp(data.get("generated_at")) or time.time()
+
+    series: List[List[Tuple[float, float]]] = []
+    for nombre, f in funcs:
+        points = []
+        for e in by_key.get(f.key(nombre), []):
+            t = _timestamp(e.get("at"))
+            if t is None:
+                continue
+            if not points:
+                points.append((t, e["prev"]))
+            points.append((t, e["vendidas"]))
+        points.append((now_ts, f.vendidas or 0))
+        series.append(points)
+
+    # Antes del primer cambio registrado la función tenía su primer valor
+    # (las que no cambiaron quedan como línea plana).
+    t0 = min(s[0][0] for s in series)
+    series = [[(t0, s[0][1])] + s if s[0][0] > t0 else s for s in series]
+
+    png = sparkline.render(
+        series,
+        [f.capacidad for _, f in funcs],
+        [sparkline.color_for(f.vendidas, f.capacidad) for _, f in funcs],
+    )
+
+    salas = list(dict.fromkeys(n for n, _ in funcs))
+    lines = [f"📈 {', '.join(salas)} — ventas acumuladas"]
+    for i, (nombre, f) in enumerate(funcs, 1):
+        sala = f"{nombre} · " if len(salas) > 1 else ""
+        cap = f"/{f.capacidad}" if f.capacidad else ""
+        lines.append(f"{i}. {sala}{f.fecha_label} {f.hora} · {f.vendidas or 0}{cap}")
+
+    return png, "\n".join(lines)[:1024]
+
+def _cached_trend(data: Dict[str, Any], evento: str) -> Optional[Tuple[bytes, str]]:
+    global _trend_cache_gen
+
+    with _trend_lock:
+        gen = data.get("generated_at")
+        if gen != _trend_cache_gen:
+            _trend_cache.clear()
+            _trend_cache_gen = gen
+
+        key = evento.casefold()
+        if key not in _trend_cache:
+            rendered = render_trend(data, evento)
+            if rendered is None:
+                return None
+            _trend_cache[key] = rendered
+        return _trend_cache[key]
+
+@timed_handler("trend")
+async def trend_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    try:
+        q = " ".join(ctx.args).strip()
+
+        if not q:
+            await update.message.reply_text("Uso: /trend <evento>")
+            return
+
+        if _is_excluded(q):
+            await update.message.reply_text("Ese evento no se muestra en el bot 🙂")
+            return
+
+        data = await get_payload()
+        # Descarga de eventos y dibujo fuera del bucle de eventos.
+        rendered = await asyncio.to_thread(_cached_trend, data, q)
+
+        if rendered is None:
+            await update.message.reply_text(f"No encontré funciones próximas de “{q}”.")
+            return
+
+        png, caption = rendered
+        await update.message.reply_photo(photo=png, caption=caption)
     except Exception as e:
         await update.message.reply_text(f"Error: {e}")
 
+@timed_handler("admin_stats")
+async def admin_stats_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.id not in ADMIN_CHAT_IDS:
+        await update.message.reply_text("Comando solo para administradores (ADMIN_CHAT_IDS).")
+        return
+
+    await update.message.reply_text(bot_metrics.summary())
+
 # ====================== SUSCRIPCIÓN & ALERTAS ======================
+@timed_handler("subscribe")
 async def subscribe_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     state = _load_state()
@@ -458,6 +659,7 @@ async def subscribe_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("Ya estabas suscrito ✅")
 
+@timed_handler("unsubscribe")
 async def unsubscribe_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     state = _load_state()
@@ -469,81 +671,105 @@ async def unsubscribe_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("No estabas suscrito.")
 
+_events = change_events.EventReader(EVENTS_SOURCE)
+
+@timed_handler("poll")
 async def poll_and_notify(context):
+    global _cache
+
+    state = _load_state()
+    cursor = state.get("events_seq")
+
     try:
-        data = fetch_payload()
+        if cursor is None:
+            # Primera vez: se empieza desde el final, sin avisar del histórico.
+            state["events_seq"] = await asyncio.to_thread(_events.latest_seq)
+            _save_state(state)
+            return
+
+        events = await asyncio.to_thread(_events.read_since, cursor)
     except Exception as e:
-        logger.warning("No pude obtener payload en poll: %s", e)
+        logger.warning("No pude leer los eventos en poll: %s", e)
         return
 
-    state = _load_state()
-    last_counts: Dict[str, int] = state.get("counts", {}) or {}
-    changes = []
-
-    current_functions = list(_iter_upcoming_functions(data))
+    if not events:
+        return
 
-    for f in current_functions:
-        k = f["key"]
-        v = f["vendidas"] or 0
-        prev = last_counts.get(k)
+    # Hay datos nuevos publicados: la caché caduca, pero se conserva como
+    # respaldo de fetch_payload si la próxima descarga falla.
+    if _cache:
+        _cache = (0.0, _cache[1])
+    changes = []
 
-        if prev is None:
-            last_counts[k] = v
+    # El daemon publica más a menudo de lo que se consulta: un aviso por función.
+    for e in change_events.merge_by_key(events):
+        nombre = e.get("sala")
+        f = change_events.event_function(e)
+        if f is None or _is_excluded(nombre):
             continue
 
-        if v > prev:
-            diff = v - prev
-            extra = _fmt_extra(v, f["cap"], f["stock"])
+        v, prev = e["vendidas"], e["prev"]
+        extra = _fmt_extra(v, f.capacidad, f.stock)
 
+        if v > prev:
             changes.append(
-                f"📈 *Nuevas ventas* (+{diff}) — {f['evento']}\n"
-                f"• {f['fecha_label']} {f['hora']}{extra}"
+                f"📈 *Nuevas ventas* (+{v - prev}) — {nombre}\n"
+                f"• {f.fecha_label} {f.hora}{extra}"
             )
-
         elif v < prev:
-            diff = prev - v
-            extra = _fmt_extra(v, f["cap"], f["stock"])
-
             changes.append(
-                f"📉 *Bajaron las vendidas* (-{diff}) — {f['evento']}\n"
-                f"• {f['fecha_label']} {f['hora']}{extra}"
+                f"📉 *Bajaron las vendidas* (-{prev - v}) — {nombre}\n"
+                f"• {f.fecha_label} {f.hora}{extra}"
             )
 
-        last_counts[k] = v
-
-    current_keys = {f["key"] for f in current_functions}
-
-    for k in list(last_counts.keys()):
-        if k not in current_keys:
-            last_counts.pop(k, None)
-
-    state["counts"] = last_counts
+    state["events_seq"] = events[-1]["seq"]
     _save_state(state)
 
     if changes and state["subscribers"]:
         text = "🔔 *Actualizaciones de cartelera*\n\n" + "\n\n".join(changes)
 
-        for chat_id in state["subscribers"]:
-            try:
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    parse_mode="Markdown",
-                )
-            except Exception as e:
-                logger.warning("No pude enviar alerta a %s: %s", chat_id, e)
+        for part in _split_for_telegram(text):
+            for chat_id in state["subscribers"]:
+                try:
+                    await context.bot.send_message(
+                        chat_id=chat_id,
+                        text=part,
+                        parse_mode="Markdown",
+                    )
+                    ALERTS_SENT.inc()
+                except Exception as e:
+                    SEND_FAILURES.inc(kind=type(e).__name__)
+                    logger.warning("No pude enviar alerta a %s: %s", chat_id, e)
 
 # ====================== BOTONES ======================
+@timed_handler("button")
 async def button_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
     data = query.data
 
+    if data == "noop":
+        return
+
+    if data.startswith("pg|"):
+        _, kind, page, arg = data.split("|", 3)
+
+        if kind not in VIEWS:
+            return
+
+        text, markup = render_page(await get_payload(), kind, arg, int(page))
+
+        try:
+            await query.edit_message_text(text, reply_markup=markup)
+        except BadRequest as e:
+            # Doble toque en el mismo botón: el mensaje ya está así.
+            if "not modified" not in str(e).lower():
+                raise
+        return
+
     if data == "status":
-        data_json = fetch_payload()
-        msg = format_resume(data_json, evento=None, top=10)
-        await _reply_long(update, msg)
+        await _send_page(update, "st")
         return
 
     if data == "subscribe":
@@ -563,13 +789,47 @@ async def button_callback(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await query.edit_message_text("Ese evento no se muestra en el bot 🙂")
             return
 
-        data_json = fetch_payload()
-        msg = format_resume(data_json, evento=nombre, top=20)
-        await _reply_long(update, msg)
+        await _send_page(update, "st", nombre)
         return
 
     await query.edit_message_text("No entendí tu selección 😅")
 
+# ====================== INLINE ======================
+# @bot <texto> en cualquier chat: funciones próximas cuyo evento o fecha
+# contienen el texto. Hay que activar el modo inline en @BotFather (/setinline).
+@timed_handler("inline")
+async def inline_query(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    iq = update.inline_query
+    q = iq.query.strip().casefold()
+
+    try:
+        offset = int(iq.offset or 0)
+    except ValueError:
+        offset = 0
+
+    data = await get_payload()
+    matches = (
+        (nombre, f)
+        for nombre, f in _iter_upcoming_functions(data)
+        if not q or q in nombre.casefold() or q in f.fecha_iso or q in f.fecha_label.casefold()
+    )
+    chunk = list(islice(matches, offset, offset + INLINE_RESULTS + 1))
+
+    results = []
+    for i, (nombre, f) in enumerate(chunk[:INLINE_RESULTS], offset):
+        extra = _fmt_extra(f.vendidas, f.capacidad, f.stock)
+        results.append(
+            InlineQueryResultArticle(
+                id=str(i),
+                title=f"{nombre} — {f.fecha_label} {f.hora}",
+                description=extra.removeprefix(" · ") or f.source.label,
+                input_message_content=InputTextMessageContent(f"🎭 {nombre}\n• {f.fecha_label} {f.hora}{extra}"),
+            )
+        )
+
+    next_offset = str(offset + INLINE_RESULTS) if len(chunk) > INLINE_RESULTS else ""
+    await iq.answer(results, cache_time=CACHE_TTL, next_offset=next_offset)
+
 # ====================== MAIN ======================
 def main():
     token = os.getenv("TELEGRAM_TOKEN")
@@ -577,7 +837,13 @@ def main():
     if not token:
         raise SystemExit("❌ Falta TELEGRAM_TOKEN. Configúralo en GitHub Secrets o en variables de entorno.")
 
-    app = ApplicationBuilder().token(token).build()
+    builder = ApplicationBuilder().token(token)
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_URL}/bot")
+    if WEBHOOK_URL:
+        # Cada update en su propia tarea: un /trend lento no frena al resto.
+        builder = builder.concurrent_updates(True)
+    app = builder.build()
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("status", status_cmd))
@@ -585,19 +851,44 @@ def main():
     app.add_handler(CommandHandler("find", find_cmd))
     app.add_handler(CommandHandler("lowstock", lowstock_cmd))
     app.add_handler(CommandHandler("soldout", soldout_cmd))
+    app.add_handler(CommandHandler("ritmo", ritmo_cmd))
+    app.add_handler(CommandHandler("trend", trend_cmd))
     app.add_handler(CommandHandler("raw", raw_cmd))
+    app.add_handler(CommandHandler("admin_stats", admin_stats_cmd))
     app.add_handler(CommandHandler("subscribe", subscribe_cmd))
     app.add_handler(CommandHandler("unsubscribe", unsubscribe_cmd))
 
     app.add_handler(CallbackQueryHandler(button_callback))
+    app.add_handler(InlineQueryHandler(inline_query))
 
-    app.job_queue.run_repeating(poll_and_notify, interval=120, first=5)
+    app.job_queue.run_repeating(poll_and_notify, interval=EVENTS_POLL_S, first=5)
 
     async def on_error(update, context):
         logger.warning("Error: %s", context.error)
 
     app.add_error_handler(on_error)
 
+    if WEBHOOK_URL:
+        if not WEBHOOK_SECRET:
+            raise SystemExit("❌ Falta TELEGRAM_WEBHOOK_SECRET para el modo webhook.")
+
+        import bot_webhook
+
+        asyncio.run(
+            bot_webhook.serve(
+                app,
+                WEBHOOK_URL,
+                WEBHOOK_SECRET,
+                WEBHOOK_LISTEN,
+                WEBHOOK_PORT,
+                metrics_text=bot_metrics.render_prometheus,
+            )
+        )
+        return
+
+    if METRICS_PORT:
+        bot_metrics.serve_http(WEBHOOK_LISTEN, METRICS_PORT)
+
     app.run_polling(drop_pending_updates=True)
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+"""
+Modo webhook del bot: servidor HTTP asyncio embebido (sin tornado ni
+frameworks) en el mismo bucle que la Application de python-telegram-bot.
+- POST <path>: update de Telegram. Se valida la cabecera
+  X-Telegram-Bot-Api-Secret-Token, se encola y se responde 200 al momento;
+  los handlers corren en paralelo (concurrent_updates).
+- GET /healthz: estado en JSON (para el balanceador o el supervisor).
+- GET /metrics: métricas en texto plano.
+Se activa con TELEGRAM_WEBHOOK_URL; sin ella el bot sigue con run_polling.
+benchmarks/fake_telegram.py lo prueba en local sin Telegram.
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1 << 20
+# Conexión keep-alive sin peticiones: se cierra.
+IDLE_TIMEOUT_S = 75
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        app: Application,
+        secret: str,
+        path: str = "/telegram",
+        metrics_text: Callable[[], str] | None = None,
+    ):
+        self.app = app
+        self.secret = secret
+        self.path = path
+        self.metrics_text = metrics_text
+        self.started = time.monotonic()
+        self.received = 0
+        self.rejected = 0
+        self._server: asyncio.AbstractServer | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self, host: str, port: int) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info("Webhook escuchando en %s:%s%s", host, port, self.path)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            # wait_closed espera también a las conexiones keep-alive abiertas.
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT_S)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    return
+
+                method, target, headers = self._parse_head(head)
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, b"", close=True)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                status, ctype, payload = await self._route(method, urlsplit(target).path, headers, body)
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, ctype, close)
+                if close:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.debug("Conexión webhook cerrada: %s", e)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def _parse_head(head: bytes) -> tuple[str, str, dict[str, str]]:
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        return method, target, headers
+
+    async def _route(self, method: str, path: str, headers: dict[str, str], body: bytes) -> tuple[int, str, bytes]:
+        if path == self.path:
+            if method != "POST":
+                return 405, "text/plain", b""
+            return await self._update(headers, body)
+
+        if path == "/healthz" and method == "GET":
+            health = {
+                "ok": self.app.running,
+                "uptime_s": round(time.monotonic() - self.started),
+                "updates": self.received,
+                "rejected": self.rejected,
+                "queue": self.app.update_queue.qsize(),
+            }
+            return 200 if self.app.running else 503, "application/json", json.dumps(health).encode()
+
+        if path == "/metrics" and method == "GET":
+            return 200, "text/plain; version=0.0.4", self.render_metrics().encode()
+
+        return 404, "text/plain", b""
+
+    async def _update(self, headers: dict[str, str], body: bytes) -> tuple[int, str, bytes]:
+        token = headers.get("x-telegram-bot-api-secret-token", "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            self.rejected += 1
+            return 403, "text/plain", b""
+
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except Exception as e:
+            logger.warning("Update inválido: %s", e)
+            return 400, "text/plain", b""
+
+        self.received += 1
+        await self.app.update_queue.put(update)
+        return 200, "text/plain", b""
+
+    def render_metrics(self) -> str:
+        lines = [
+            "# TYPE bot_webhook_updates_total counter",
+            f"bot_webhook_updates_total {self.received}",
+            "# TYPE bot_webhook_rejected_total counter",
+            f"bot_webhook_rejected_total {self.rejected}",
+            "# TYPE bot_webhook_queue_size gauge",
+            f"bot_webhook_queue_size {self.app.update_queue.qsize()}",
+        ]
+        text = "\n".join(lines) + "\n"
+        if self.metrics_text:
+            text += self.metrics_text()
+        return text
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, body: bytes, ctype: str = "text/plain", close: bool = False) -> None:
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+            f"Content-Type: {ctype}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(
+    app: Application,
+    webhook_url: str,
+    secret: str,
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    metrics_text: Callable[[], str] | None = None,
+) -> None:
+    """Arranca la Application, registra el webhook en Telegram y sirve hasta
+    SIGTERM/SIGINT. webhook_url es la URL pública completa (con el path)."""
+    server = WebhookServer(app, secret, urlsplit(webhook_url).path or "/", metrics_text)
+    stop = asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with app:
+        await app.start()
+        await server.start(host, port)
+        await app.bot.set_webhook(
+            url=webhook_url,
+            secret_token=secret,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True,
+        )
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await app.stop()
@@ -0,0 +1,201 @@
+"""
+Flujo de cambios de ventas (docs/events.jsonl): una línea JSON por función
+cuyas vendidas cambian entre dos publicaciones, con un seq creciente.
+- Lo escribe scraper_ci.publish() comparando con el schedule.json anterior,
+  tanto en el cron como en el daemon (allí el evento sale a los segundos).
+- notify_telegram y el bot lo leen desde su cursor (último seq procesado)
+  en vez de volver a comparar schedule.json cada uno por su lado.
+- Se publica con la web, así el bot lo puede leer por HTTP; si pasa de
+  MAX_EVENTS líneas se compacta a las últimas KEEP_EVENTS de funciones
+  aún no pasadas (los lectores van por seq, no por posición).
+"""
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from core import TZ, Function, iter_functions
+
+# Junto a schedule.json (render.DOCS_DIR); sin importar render, que arrastra
+# las métricas del scraper al bot y al notificador.
+EVENTS_PATH = Path("docs") / "events.jsonl"
+KEEP_EVENTS = 1000
+MAX_EVENTS = 2000
+
+
+def upcoming_functions(payload: dict) -> dict[str, tuple[str, Function]]:
+    return {f.key(sala): (sala, f) for sala, f in iter_functions(payload)}
+
+
+def diff_payloads(previous: dict | None, payload: dict) -> list[dict]:
+    """Eventos de vendidas entre dos payloads. Sin payload anterior no hay
+    eventos (la primera publicación no es una venta)."""
+    if not previous:
+        return []
+
+    before = upcoming_functions(previous)
+    events = []
+    for key, (sala, f) in upcoming_functions(payload).items():
+        old = before.get(key)
+        if old is None or f.vendidas is None or old[1].vendidas is None:
+            continue
+        if f.vendidas == old[1].vendidas:
+            continue
+        events.append({
+            "key": key,
+            "sala": sala,
+            "fecha_iso": f.fecha_iso,
+            "hora": f.hora,
+            "source": f.source.value,
+            "vendidas": f.vendidas,
+            "prev": old[1].vendidas,
+            "capacidad": f.capacidad,
+            "stock": f.stock,
+        })
+    return events
+
+
+def merge_by_key(events: list[dict]) -> list[dict]:
+    """Un evento por función cuando se leen varias publicaciones de golpe:
+    desde la primera vendidas anterior hasta la última."""
+    merged: dict[str, dict] = {}
+    for e in events:
+        if e["key"] in merged:
+            merged[e["key"]] = {**e, "prev": merged[e["key"]]["prev"]}
+        else:
+            merged[e["key"]] = e
+    return list(merged.values())
+
+
+def event_function(event: dict) -> Function | None:
+    return Function.create(
+        event["fecha_iso"],
+        event["hora"],
+        vendidas=event.get("vendidas"),
+        capacidad=event.get("capacidad"),
+        stock=event.get("stock"),
+        source=event.get("source") or "dinaticket",
+    )
+
+
+def parse_lines(text: str) -> list[dict]:
+    events = []
+    for line in text.splitlines():
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict) and isinstance(event.get("seq"), int):
+            events.append(event)
+    return events
+
+
+def _read_lines(path: Path) -> list[str]:
+    try:
+        return path.read_text("utf-8").splitlines()
+    except FileNotFoundError:
+        return []
+
+
+def last_seq(path: Path = EVENTS_PATH) -> int:
+    events = parse_lines("\n".join(_read_lines(path)[-5:]))
+    return events[-1]["seq"] if events else 0
+
+
+def _compact(lines: list[str], path: Path) -> None:
+    # Primero sobran los eventos de funciones ya pasadas: el /trend del bot
+    # dibuja la curva de ventas de las próximas desde su primer evento.
+    today = datetime.now(TZ).date().isoformat()
+    upcoming = [line for line, e in zip(lines, map(parse_lines, lines)) if e and e[0].get("fecha_iso", "") >= today]
+    kept = upcoming[-KEEP_EVENTS:]
+    # La última línea se queda siempre: de ella sale el siguiente seq.
+    if not kept or kept[-1] is not lines[-1]:
+        kept.append(lines[-1])
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text("\n".join(kept) + "\n", "utf-8")
+    os.replace(tmp, path)
+
+
+def append(events: list[dict], at: str, path: Path = EVENTS_PATH) -> list[dict]:
+    """Añade los eventos con seq y fecha de publicación; devuelve lo escrito."""
+    if not events:
+        return []
+
+    seq = last_seq(path)
+    written = [{"seq": seq + i, "at": at, **e} for i, e in enumerate(events, 1)]
+    lines = [json.dumps(e, ensure_ascii=False, separators=(",", ":")) for e in written]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as fh:
+        fh.write("\n".join(lines) + "\n")
+
+    existing = _read_lines(path)
+    if len(existing) > MAX_EVENTS:
+        _compact(existing, path)
+
+    print(f"✔ {len(written)} eventos en {path} (seq {written[-1]['seq']})")
+    return written
+
+
+class EventReader:
+    """Lector incremental del flujo, local (ruta) o publicado (URL).
+    En local sigue la posición en el fichero; por HTTP usa ETag para no
+    descargar nada si no ha cambiado."""
+
+    def __init__(self, location: str | Path = EVENTS_PATH, timeout: float = 20):
+        self.location = str(location)
+        self.is_url = self.location.startswith(("http://", "https://"))
+        self.timeout = timeout
+        self._offset = 0
+        self._inode: int | None = None
+        self._etag: str | None = None
+
+    def read_since(self, cursor: int) -> list[dict]:
+        events = self._read_url() if self.is_url else self._read_file()
+        return [e for e in events if e["seq"] > cursor]
+
+    def _read_file(self) -> list[dict]:
+        path = Path(self.location)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return []
+        # Compactado (os.replace cambia el inodo) o recreado: desde el principio.
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._inode, self._offset = st.st_ino, 0
+
+        with path.open("rb") as fh:
+            fh.seek(self._offset)
+            data = fh.read()
+        # Solo líneas completas: la última puede estar a medio escribir.
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        return parse_lines(data[:end].decode("utf-8"))
+
+    def _read_url(self) -> list[dict]:
+        # urllib.request solo en modo URL: el scraper no lo necesita.
+        import urllib.error
+        import urllib.request
+
+        headers = {"Cache-Control": "no-cache"}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        req = urllib.request.Request(self.location, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                self._etag = resp.headers.get("ETag")
+                return parse_lines(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            if e.code in (304, 404):
+                return []
+            raise
+
+    def latest_seq(self) -> int:
+        """Seq del último evento disponible (para arrancar sin avisar de todo
+        el histórico)."""
+        self._etag = None
+        self._inode = None
+        events = self._read_url() if self.is_url else self._read_file()
+        return events[-1]["seq"] if events else 0
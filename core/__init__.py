@@ -0,0 +1,10 @@
+"""
+Tipos compartidos entre el scraper, el notificador y el bot.
+"""
+from core.function import HEADERS, TZ, Function, Source, normalize_hhmm, to_int
+from core.payload import Columns, Row, event_functions, iter_functions, iter_rows
+
+__all__ = [
+    "HEADERS", "TZ", "Function", "Source", "normalize_hhmm", "to_int",
+    "Columns", "Row", "event_functions", "iter_functions", "iter_rows",
+]
@@ -0,0 +1,167 @@
+"""
+Registro tipado de una función (sesión) de un show.
+Se parsea una sola vez al scrapear y se serializa a las filas posicionales
+de schedule.json con to_row(); bot y notificador lo reconstruyen con core.payload.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from zoneinfo import ZoneInfo
+
+TZ = ZoneInfo("Europe/Madrid")
+
+HEADERS = [
+    "Fecha",
+    "Hora",
+    "Vendidas",
+    "FechaISO",
+    "Capacidad",
+    "Stock",
+    "BuyUrl",
+    "Source",
+    "Dia",
+]
+
+DIAS = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+
+MESES = [
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre",
+]
+
+_HHMM_RE = re.compile(r"^(\d{1,2})(?::?(\d{2}))?$")
+_NOT_HHMM_RE = re.compile(r"[^0-9:]")
+
+
+class Source(str, Enum):
+    DINATICKET = "dinaticket"
+    ONEBOX = "onebox"
+    KULTUR = "kultur"
+
+    @property
+    def label(self) -> str:
+        return _SOURCE_LABELS[self]
+
+
+_SOURCE_LABELS = {
+    Source.DINATICKET: "Dina",
+    Source.ONEBOX: "Onebox",
+    Source.KULTUR: "Kultur",
+}
+
+
+def normalize_hhmm(h: str | None) -> str:
+    if not h:
+        return "00:00"
+    s = str(h).strip().lower()
+    s = s.replace(" ", "").replace("h", "")
+    s = _NOT_HHMM_RE.sub("", s)
+    s = s.rstrip(":")
+    m = _HHMM_RE.match(s)
+    if not m:
+        return s
+    return f"{int(m.group(1)):02d}:{int(m.group(2) or '00'):02d}"
+
+
+def to_int(value) -> int | None:
+    if isinstance(value, int):
+        return value
+    if value in (None, "", "—", "-", "N/A", "NA"):
+        return None
+
+    try:
+        return int(str(value).replace(".", "").replace(",", ""))
+    except Exception:
+        return None
+
+
+@dataclass(slots=True)
+class Function:
+    inicio: datetime
+    vendidas: int | None
+    capacidad: int | None
+    stock: int | None
+    source: Source
+    buy_url: str | None = None
+
+    @classmethod
+    def create(
+        cls,
+        fecha_iso: str,
+        hora: str | None,
+        vendidas=None,
+        capacidad=None,
+        stock=None,
+        source: Source | str = Source.DINATICKET,
+        buy_url: str | None = None,
+    ) -> Function | None:
+        hora = normalize_hhmm(hora)
+        try:
+            y, m, d = fecha_iso.split("-")
+            hh, mm = hora.split(":")
+            inicio = datetime(int(y), int(m), int(d), int(hh), int(mm), tzinfo=TZ)
+        except (AttributeError, ValueError):
+            return None
+
+        return cls(
+            inicio=inicio,
+            vendidas=to_int(vendidas),
+            capacidad=to_int(capacidad),
+            stock=to_int(stock),
+            source=Source(source),
+            buy_url=buy_url or None,
+        )
+
+    @classmethod
+    def from_row(cls, row: list, headers: list[str] | None = None) -> Function | None:
+        """Columnas por nombre según headers; sin ellos, en el orden de HEADERS."""
+        from core.payload import Columns
+
+        return Columns.for_headers(headers).function(row)
+
+    @property
+    def fecha_iso(self) -> str:
+        d = self.inicio
+        return f"{d.year:04d}-{d.month:02d}-{d.day:02d}"
+
+    @property
+    def hora(self) -> str:
+        d = self.inicio
+        return f"{d.hour:02d}:{d.minute:02d}"
+
+    @property
+    def fecha_label(self) -> str:
+        return self.inicio.strftime("%d %b %Y")
+
+    @property
+    def dia(self) -> str:
+        return DIAS[self.inicio.weekday()]
+
+    @property
+    def mes_key(self) -> str:
+        return f"{self.inicio.year:04d}-{self.inicio.month:02d}"
+
+    @property
+    def mes_label(self) -> str:
+        return f"{MESES[self.inicio.month - 1]} de {self.inicio.year}"
+
+    def key(self, sala: str) -> str:
+        # Kultur comparte fecha/hora con la taquilla principal de la sala.
+        base = f"{sala}::{self.fecha_iso}::{self.hora}"
+        return f"{base}::k" if self.source is Source.KULTUR else base
+
+    def to_row(self) -> list:
+        return [
+            self.fecha_label,
+            self.hora,
+            self.vendidas,
+            self.fecha_iso,
+            self.capacidad,
+            self.stock,
+            self.buy_url,
+            self.source.value,
+            self.dia,
+        ]
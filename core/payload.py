@@ -0,0 +1,147 @@
+"""
+Lectura de schedule.json compartida por el bot, el notificador y
+change_events: eventos -> proximas/pasadas -> table -> rows.
+Las columnas se buscan por nombre en "headers" (la posición de HEADERS
+solo es el respaldo si faltan), así una columna nueva o ausente (Dia en
+payloads antiguos, las de analítica) no desplaza a las demás. El mapeo de
+cada lista de headers se calcula una vez.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+from core.function import HEADERS, Function, Source
+
+SECTIONS = ("proximas", "pasadas")
+
+
+@dataclass(frozen=True, slots=True)
+class Columns:
+    headers: tuple[str, ...]
+    fecha_iso: int
+    hora: int
+    vendidas: int
+    capacidad: int
+    stock: int
+    buy_url: int
+    source: int
+
+    @classmethod
+    def for_headers(cls, headers: Iterable[str] | None) -> Columns:
+        return _columns(tuple(headers or ()))
+
+    def index(self, name: str) -> int:
+        try:
+            return self.headers.index(name)
+        except ValueError:
+            return -1
+
+    @staticmethod
+    def _get(row: list, i: int):
+        return row[i] if 0 <= i < len(row) else None
+
+    def get(self, row: list, name: str):
+        return self._get(row, self.index(name))
+
+    def function(self, row: list) -> Function | None:
+        get = self._get
+        try:
+            source = Source(get(row, self.source) or Source.DINATICKET)
+        except ValueError:
+            source = Source.DINATICKET
+
+        return Function.create(
+            get(row, self.fecha_iso),
+            get(row, self.hora),
+            vendidas=get(row, self.vendidas),
+            capacidad=get(row, self.capacidad),
+            stock=get(row, self.stock),
+            source=source,
+            buy_url=get(row, self.buy_url),
+        )
+
+
+@lru_cache(maxsize=32)
+def _columns(headers: tuple[str, ...]) -> Columns:
+    def col(name: str) -> int:
+        if name in headers:
+            return headers.index(name)
+        # Sin headers (o sin esa columna): la posición con la que escribe to_row().
+        return HEADERS.index(name) if not headers else -1
+
+    return Columns(
+        headers=headers,
+        fecha_iso=col("FechaISO"),
+        hora=col("Hora"),
+        vendidas=col("Vendidas"),
+        capacidad=col("Capacidad"),
+        stock=col("Stock"),
+        buy_url=col("BuyUrl"),
+        source=col("Source"),
+    )
+
+
+@dataclass(slots=True)
+class Row:
+    sala: str
+    function: Function
+    raw: list
+    columns: Columns
+
+    def get(self, name: str):
+        """Valor de una columna por nombre (None si el payload no la trae)."""
+        return self.columns.get(self.raw, name)
+
+
+def table_rows(table: dict | None, sala: str = "", top: int | None = None) -> Iterator[Row]:
+    table = table or {}
+    columns = Columns.for_headers(table.get("headers"))
+    rows = table.get("rows") or []
+
+    for raw in rows[:top] if top else rows:
+        f = columns.function(raw)
+        if f:
+            yield Row(sala, f, raw, columns)
+
+
+def event_tables(info: dict, sections: tuple[str, ...] = ("proximas",)) -> Iterator[dict]:
+    """Tablas de un evento; los payloads sin proximas/pasadas solo traen table."""
+    if not isinstance(info, dict):
+        return
+
+    if any(s in info for s in SECTIONS):
+        for s in sections:
+            yield (info.get(s) or {}).get("table") or {}
+    else:
+        yield info.get("table") or {}
+
+
+def iter_rows(
+    payload: dict,
+    sections: tuple[str, ...] = ("proximas",),
+    skip: Iterable[str] = (),
+) -> Iterator[Row]:
+    skip = set(skip)
+    for sala, info in (payload.get("eventos") or {}).items():
+        if sala in skip:
+            continue
+        for table in event_tables(info, sections):
+            yield from table_rows(table, sala)
+
+
+def iter_functions(
+    payload: dict,
+    sections: tuple[str, ...] = ("proximas",),
+    skip: Iterable[str] = (),
+) -> Iterator[tuple[str, Function]]:
+    for row in iter_rows(payload, sections, skip):
+        yield row.sala, row.function
+
+
+def event_functions(info: dict, top: int | None = None) -> list[Function]:
+    """Las primeras top funciones de la primera tabla del evento (próximas)."""
+    for table in event_tables(info):
+        return [row.function for row in table_rows(table, top=top)]
+    return []
@@ -0,0 +1,106 @@
+"""
+Capturas de depuración (HTML + texto de la página) cuando el scraper no
+encuentra lo que espera. Van a debug/, fuera de docs/, así no se publican ni
+se commitean; el workflow las sube como artefacto.
+- Antes de serializar el DOM se mira si ya hay una captura reciente de esa
+  misma sala/etiqueta: si la hay no se vuelve a pedir page.content().
+- Se deduplican por hash del contenido y se guardan con gzip.
+- Se borran las de más de MAX_AGE y, si el total pasa de MAX_TOTAL_BYTES,
+  las más antiguas.
+DEBUG_CAPTURE=0 las desactiva.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+
+from metrics import span
+
+DEBUG_DIR = Path(os.environ.get("DEBUG_DIR", "debug"))
+MAX_TOTAL_BYTES = 20 * 1024 * 1024
+MAX_AGE_S = 7 * 24 * 3600
+# Una misma sala/etiqueta no se vuelve a capturar antes de esto.
+RECAPTURE_AFTER_S = 6 * 3600
+MAX_TEXT_CHARS = 15000
+
+HASH_LEN = 12
+
+
+def enabled() -> bool:
+    return os.environ.get("DEBUG_CAPTURE", "1") != "0"
+
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_-]+", "_", s).strip("_")
+
+
+def _prefix(sala: str, label: str) -> str:
+    return f"{_slug(sala)}__{_slug(label)}__"
+
+
+def recently_captured(sala: str, label: str, now: float | None = None) -> bool:
+    now = now or time.time()
+    for path in DEBUG_DIR.glob(f"{_prefix(sala, label)}*.html.gz"):
+        if now - path.stat().st_mtime < RECAPTURE_AFTER_S:
+            return True
+    return False
+
+
+def should_capture(sala: str, label: str) -> bool:
+    return enabled() and not recently_captured(sala, label)
+
+
+def _write_gz(path: Path, text: str) -> int:
+    data = gzip.compress(text.encode("utf-8"), compresslevel=6, mtime=0)
+    path.write_bytes(data)
+    return len(data)
+
+
+def capture(sala: str, label: str, html: str, text: str) -> Path | None:
+    """Guarda html y texto comprimidos; devuelve la ruta del .html.gz o None
+    si ya había una captura idéntica (a la que solo se le renueva la fecha)."""
+    with span("debug.write", sala=sala, label=label) as sp:
+        digest = hashlib.sha256(html.encode("utf-8")).hexdigest()[:HASH_LEN]
+        DEBUG_DIR.mkdir(parents=True, exist_ok=True)
+
+        for existing in DEBUG_DIR.glob(f"*__{digest}.*.gz"):
+            existing.touch()
+            sp.attrs["duplicate"] = True
+        if sp.attrs.get("duplicate"):
+            return None
+
+        base = DEBUG_DIR / f"{_prefix(sala, label)}{digest}"
+        html_path = base.with_name(base.name + ".html.gz")
+        sp.bytes = _write_gz(html_path, html)
+        sp.bytes += _write_gz(base.with_name(base.name + ".txt.gz"), text[:MAX_TEXT_CHARS])
+
+    rotate()
+    return html_path
+
+
+def rotate(now: float | None = None) -> None:
+    """Borra capturas viejas y, si aún se pasa del tope, las más antiguas
+    (html y texto de una captura se borran juntos)."""
+    if not DEBUG_DIR.exists():
+        return
+
+    now = now or time.time()
+    groups: dict[str, list] = {}
+    for path in DEBUG_DIR.glob("*.gz"):
+        st = path.stat()
+        g = groups.setdefault(path.name.split(".", 1)[0], [0.0, 0, []])
+        g[0] = max(g[0], st.st_mtime)
+        g[1] += st.st_size
+        g[2].append(path)
+
+    total = sum(size for _, size, _ in groups.values())
+    for mtime, size, paths in sorted(groups.values(), key=lambda g: g[0]):
+        if now - mtime <= MAX_AGE_S and total <= MAX_TOTAL_BYTES:
+            break
+        for path in paths:
+            path.unlink()
+        total -= size
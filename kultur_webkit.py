@@ -4,34 +4,39 @@ Fetcher de Kultur via WebKit (Safari engine) — macOS only.
 Llama a getCalendar para todas las fechas, y getSessions para las que
 estan dentro de las proximas 48hs.
 Guarda: docs/kultur_cache_{sala}.json
+Las salas se leen de providers.json (entradas con provider "kultur").
 """
 import asyncio
 import json
+import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from urllib.parse import urlsplit
 from zoneinfo import ZoneInfo
 
-from playwright.async_api import async_playwright
+from core import Function, Source
+from metrics import add_retry, count_response_bytes, span
+from retry_policy import POLICY
+from providers import BROWSER, Provider, load_config, rebase_url, register_provider, salas_for
 
 TZ = ZoneInfo("Europe/Madrid")
 DOCS_DIR = Path("docs")
 
-KULTUR_EVENTS = {
-    "Miedo": "BW8A51aMmrnmTQzH",
-}
-
-KULTUR_PAGES = {
-    "Miedo": "https://appkultur.com/madrid/miedo-mentalismo-y-espiritismo-con-ariel-hamui",
-}
-
 SESSIONS_ENDPOINT = "https://europe-west6-kultur-platform.cloudfunctions.net/events_api_v2-getSessions"
 CALENDAR_ENDPOINT = "https://europe-west6-kultur-platform.cloudfunctions.net/events_api_v2-getCalendar"
 
 
-async def fetch_kultur_data(sala: str) -> dict:
-    event_id = KULTUR_EVENTS[sala]
-    page_url  = KULTUR_PAGES[sala]
+async def fetch_kultur_data(sala: str, event_id: str, page_url: str, timeout: float = 30) -> dict:
+    # Playwright solo al leer Kultur: scraper_ci importa este módulo para registrar el proveedor.
+    from playwright.async_api import async_playwright
+
+    # La página tiene su propio segundo intento (reload); solo se adapta el timeout.
+    host = urlsplit(page_url).netloc
+    goto_timeout = int(POLICY.timeout(host, timeout) * 1000)
     now       = datetime.now(TZ)
+    page_url  = rebase_url(page_url)
+    calendar_endpoint = rebase_url(CALENDAR_ENDPOINT)
+    sessions_endpoint = rebase_url(SESSIONS_ENDPOINT)
 
     print(f"\n{'='*50}")
     print(f"  Kultur WebKit [{sala}]")
@@ -49,7 +54,7 @@ async def fetch_kultur_data(sala: str) -> dict:
 
         async def on_response(resp):
             nonlocal calendar_data
-            if CALENDAR_ENDPOINT in resp.url:
+            if calendar_endpoint in resp.url:
                 try:
                     status = resp.status
                     print(f"  getCalendar: {status}")
@@ -71,44 +76,49 @@ async def fetch_kultur_data(sala: str) -> dict:
 
         async def on_request(req):
             nonlocal appcheck_token
-            if CALENDAR_ENDPOINT in req.url or SESSIONS_ENDPOINT in req.url:
+            if calendar_endpoint in req.url or sessions_endpoint in req.url:
                 tok = req.headers.get("x-firebase-appcheck")
                 if tok:
                     appcheck_token = tok
 
         page.on("request", on_request)
         page.on("response", on_response)
+        page.on("response", count_response_bytes)
 
-        for attempt in (1, 2):
-            try:
-                if attempt == 1:
-                    print("  -> Intento 1 cargando pagina")
-                    await page.goto(page_url, wait_until="domcontentloaded", timeout=30000)
-                else:
-                    print("  -> Intento 2 recargando pagina")
-                    calendar_event.clear()
-                    await page.reload(wait_until="domcontentloaded", timeout=30000)
+        with span("kultur.calendar", sala=sala):
+            for attempt in (1, 2):
+                try:
+                    if attempt == 1:
+                        print("  -> Intento 1 cargando pagina")
+                        t0 = time.monotonic()
+                        await page.goto(page_url, wait_until="domcontentloaded", timeout=goto_timeout)
+                        POLICY.record(host, time.monotonic() - t0)
+                    else:
+                        print("  -> Intento 2 recargando pagina")
+                        add_retry()
+                        calendar_event.clear()
+                        await page.reload(wait_until="domcontentloaded", timeout=goto_timeout)
 
-                await page.wait_for_timeout(8000)
+                    await page.wait_for_timeout(8000)
 
-                try:
-                    await asyncio.wait_for(calendar_event.wait(), timeout=15)
-                except Exception:
-                    print(f"  Error esperando getCalendar en intento {attempt}")
+                    try:
+                        await asyncio.wait_for(calendar_event.wait(), timeout=15)
+                    except Exception:
+                        print(f"  Error esperando getCalendar en intento {attempt}")
 
-                if calendar_data:
-                    break
+                    if calendar_data:
+                        break
 
-                try:
-                    await page.mouse.wheel(0, 800)
-                    await page.wait_for_timeout(1500)
-                except Exception:
-                    pass
-            except Exception as e:
-                print(f"  Error cargando pagina en intento {attempt}: {e}")
+                    try:
+                        await page.mouse.wheel(0, 800)
+                        await page.wait_for_timeout(1500)
+                    except Exception:
+                        pass
+                except Exception as e:
+                    print(f"  Error cargando pagina en intento {attempt}: {e}")
 
-            if calendar_data:
-                break
+                if calendar_data:
+                    break
 
         await asyncio.sleep(2)
         await browser.close()
@@ -167,7 +177,7 @@ async def fetch_kultur_data(sala: str) -> dict:
                         js = f"""
                         async () => {{
                             const payload = {json.dumps(payload)};
-                            const r = await fetch("{SESSIONS_ENDPOINT}", {{
+                            const r = await fetch("{sessions_endpoint}", {{
                                 method: "POST",
                                 headers: {{"Content-Type": "application/json", "x-firebase-appcheck": "{appcheck_token}"}},
                                 body: JSON.stringify(payload)
@@ -175,7 +185,9 @@ async def fetch_kultur_data(sala: str) -> dict:
                             return await r.json();
                         }}
                         """
-                        res = await page2.evaluate(js)
+                        with span("kultur.sessions", fecha=fecha) as sp:
+                            res = await page2.evaluate(js)
+                            sp.bytes = len(json.dumps(res)) if res else 0
                         if res:
                             inner = res.get("result", res)
                             sessions = inner.get("data", []) if isinstance(inner, dict) else []
@@ -240,15 +252,60 @@ async def fetch_kultur_data(sala: str) -> dict:
     return idx
 
 
+def save_kultur_cache(sala: str, idx: dict) -> Path:
+    DOCS_DIR.mkdir(exist_ok=True)
+    cache_path = DOCS_DIR / f"kultur_cache_{sala}.json"
+    with span("write", path=str(cache_path)) as sp:
+        text = json.dumps({"idx": idx}, ensure_ascii=False, indent=2)
+        cache_path.write_text(text, "utf-8")
+        sp.bytes = len(text.encode("utf-8"))
+    return cache_path
+
+
+def idx_to_functions(idx: dict, page_url: str | None = None) -> list[Function]:
+    out = []
+    for key, v in idx.items():
+        fecha_iso, _, hora = key.partition("|")
+        f = Function.create(
+            fecha_iso,
+            hora,
+            v.get("vendidas"),
+            v.get("capacidad"),
+            v.get("disponibles"),
+            Source.KULTUR,
+            page_url,
+        )
+        if f:
+            out.append(f)
+
+    return sorted(out, key=lambda f: f.inicio)
+
+
+@register_provider("kultur")
+class KulturProvider(Provider):
+    capability = BROWSER
+
+    def fetch(self, sala: str) -> list[Function]:
+        entry = self.salas[sala]
+        idx = asyncio.run(fetch_kultur_data(sala, entry["event_id"], entry["url"], self.timeout))
+        if idx:
+            save_kultur_cache(sala, idx)
+        return idx_to_functions(idx, entry["url"])
+
+
 def main():
     DOCS_DIR.mkdir(exist_ok=True)
-    for sala in KULTUR_EVENTS:
-        idx = asyncio.run(fetch_kultur_data(sala))
+    config = load_config()
+    # Ejecutado a mano (macOS) se lanza aunque esté desactivado en el CI.
+    settings = {**((config.get("providers") or {}).get("kultur") or {}), "enabled": True}
+    provider = KulturProvider(settings, salas_for(config, "kultur").get("kultur"))
+
+    for sala, entry in provider.salas.items():
+        idx = asyncio.run(fetch_kultur_data(sala, entry["event_id"], entry["url"], provider.timeout))
         if not idx:
             print(f"  Sin datos para {sala}")
             continue
-        cache_path = DOCS_DIR / f"kultur_cache_{sala}.json"
-        cache_path.write_text(json.dumps({"idx": idx}, ensure_ascii=False, indent=2), "utf-8")
+        cache_path = save_kultur_cache(sala, idx)
         print(f"\n  Cache guardado: {cache_path} ({len(idx)} sesiones)")
         print(f"\n  Resumen {sala}:")
         for k, v in list(idx.items())[:10]:
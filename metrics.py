@@ -0,0 +1,284 @@
+"""
+Instrumentación ligera de cada ejecución del scraper.
+span("nombre", **attrs) mide una etapa (proveedor, carga de página, conteo de
+butacas, escritura de fichero...) y guarda duración, bytes (descargados o,
+en las escrituras, escritos), reintentos y aciertos de caché. Los spans se
+anidan por hilo, así cada proveedor suma lo de sus etapas; los workers de un
+pool se cuelgan del span que los lanza con RECORDER.adopt().
+Al terminar, finish() escribe docs/run_metrics.json y un resumen legible
+(también en el resumen del job si corre en GitHub Actions).
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from core import TZ
+
+METRICS_PATH = Path("docs") / "run_metrics.json"
+
+
+@dataclass(slots=True)
+class Span:
+    id: int
+    name: str
+    parent: int | None
+    thread: str
+    start: float
+    attrs: dict = field(default_factory=dict)
+    duration_ms: float = 0.0
+    bytes: int = 0
+    retries: int = 0
+    cache_hits: int = 0
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        d = {
+            "id": self.id,
+            "name": self.name,
+            "parent": self.parent,
+            "thread": self.thread,
+            "start_s": round(self.start, 3),
+            "duration_ms": round(self.duration_ms, 1),
+        }
+        for key in ("bytes", "retries", "cache_hits", "error"):
+            if getattr(self, key):
+                d[key] = getattr(self, key)
+        if self.attrs:
+            d["attrs"] = self.attrs
+        return d
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Empieza otra ejecución. Solo sin spans abiertos (entre ejecuciones):
+        el daemon usa rotate(), que lo comprueba."""
+        self.started_at = datetime.now(TZ)
+        self._t0 = time.perf_counter()
+        self.spans: list[Span] = []
+
+    def rotate(self) -> dict | None:
+        """to_dict() y reset() de una vez si no hay ningún span abierto; si
+        lo hay, None y no se toca nada (se reintenta más tarde)."""
+        with self._lock:
+            if self._open:
+                return None
+            data = self.to_dict()
+            self.reset()
+            return data
+
+    def _stack(self) -> list[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self) -> Span | None:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def adopt(self, parent: Span | None) -> Iterator[None]:
+        """Los spans de este hilo cuelgan de parent, abierto en otro hilo:
+        los workers de un pool no heredan la pila del que los lanza."""
+        if parent is None:
+            yield
+            return
+
+        stack = self._stack()
+        stack.append(parent)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Span]:
+        stack = self._stack()
+        t0 = time.perf_counter()
+
+        with self._lock:
+            sp = Span(
+                id=len(self.spans),
+                name=name,
+                parent=stack[-1].id if stack else None,
+                thread=threading.current_thread().name,
+                start=t0 - self._t0,
+                attrs=attrs,
+            )
+            self.spans.append(sp)
+            self._open += 1
+
+        stack.append(sp)
+        try:
+            yield sp
+        except BaseException as e:
+            sp.error = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            sp.duration_ms = (time.perf_counter() - t0) * 1000
+            stack.pop()
+            with self._lock:
+                self._open -= 1
+
+    def rollup(self) -> dict[int, dict]:
+        """Bytes, reintentos y aciertos de caché de cada span más los de sus hijos."""
+        totals = {sp.id: {"bytes": sp.bytes, "retries": sp.retries, "cache_hits": sp.cache_hits} for sp in self.spans}
+        # Los hijos siempre tienen id mayor que el padre: basta recorrer al revés.
+        for sp in reversed(self.spans):
+            if sp.parent is not None:
+                for key, value in totals[sp.id].items():
+                    totals[sp.parent][key] += value
+        return totals
+
+    def summary(self) -> dict[str, dict]:
+        out: dict[str, dict] = defaultdict(
+            lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "bytes": 0, "retries": 0, "cache_hits": 0, "errors": 0}
+        )
+        for sp in self.spans:
+            s = out[sp.name]
+            s["count"] += 1
+            s["total_ms"] += sp.duration_ms
+            s["max_ms"] = max(s["max_ms"], sp.duration_ms)
+            s["bytes"] += sp.bytes
+            s["retries"] += sp.retries
+            s["cache_hits"] += sp.cache_hits
+            s["errors"] += sp.error is not None
+
+        for s in out.values():
+            s["mean_ms"] = round(s["total_ms"] / s["count"], 1)
+            s["total_ms"] = round(s["total_ms"], 1)
+            s["max_ms"] = round(s["max_ms"], 1)
+
+        return dict(sorted(out.items(), key=lambda kv: -kv[1]["total_ms"]))
+
+    def providers(self) -> list[dict]:
+        totals = self.rollup()
+        return [
+            {
+                "provider": sp.attrs.get("provider"),
+                "sala": sp.attrs.get("sala"),
+                "duration_ms": round(sp.duration_ms, 1),
+                "wait_ms": sp.attrs.get("wait_ms"),
+                "functions": sp.attrs.get("functions"),
+                "error": sp.error,
+                **totals[sp.id],
+            }
+            for sp in self.spans
+            if sp.name == "provider"
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(TZ).isoformat(),
+            "duration_s": round(time.perf_counter() - self._t0, 2),
+            "providers": self.providers(),
+            "summary": self.summary(),
+            "spans": [sp.to_dict() for sp in self.spans],
+        }
+
+
+RECORDER = Recorder()
+
+
+def span(name: str, **attrs):
+    return RECORDER.span(name, **attrs)
+
+
+def add_bytes(n: int) -> None:
+    sp = RECORDER.current()
+    if sp and n:
+        sp.bytes += n
+
+
+def add_retry() -> None:
+    sp = RECORDER.current()
+    if sp:
+        sp.retries += 1
+
+
+def add_cache_hit() -> None:
+    sp = RECORDER.current()
+    if sp:
+        sp.cache_hits += 1
+
+
+def count_response_bytes(response) -> None:
+    """Callback para page.on("response"): suma el Content-Length al span activo."""
+    try:
+        add_bytes(int(response.headers.get("content-length") or 0))
+    except (TypeError, ValueError):
+        pass
+
+
+def format_summary(data: dict) -> list[str]:
+    lines = [f"⏱ Ejecución {data['duration_s']:.1f} s"]
+
+    for p in data["providers"]:
+        extra = f" · espera {p['wait_ms'] / 1000:.1f} s" if p.get("wait_ms") else ""
+        lines.append(
+            f"  {p['provider']:<11} {p['sala']:<14} {p['duration_ms'] / 1000:>7.1f} s  "
+            f"{p['functions'] if p['functions'] is not None else '—':>3} funciones  "
+            f"{p['bytes'] / 1024:>8.1f} KB  reintentos {p['retries']}  caché {p['cache_hits']}"
+            f"{extra}{'  ERROR' if p['error'] else ''}"
+        )
+
+    lines.append("  Etapas (tiempo acumulado):")
+    for name, s in data["summary"].items():
+        if name == "provider":
+            continue
+        lines.append(
+            f"  {name:<24} {s['count']:>4}×  total {s['total_ms'] / 1000:>7.1f} s  "
+            f"media {s['mean_ms']:>8.1f} ms  máx {s['max_ms']:>8.1f} ms"
+            + (f"  errores {s['errors']}" if s["errors"] else "")
+        )
+
+    return lines
+
+
+def _step_summary(data: dict) -> str:
+    rows = [
+        "| Proveedor | Sala | Segundos | Funciones | KB | Reintentos | Caché |",
+        "|---|---|---:|---:|---:|---:|---:|",
+    ]
+    for p in data["providers"]:
+        rows.append(
+            f"| {p['provider']} | {p['sala']} | {p['duration_ms'] / 1000:.1f} | {p['functions'] if p['functions'] is not None else '—'} "
+            f"| {p['bytes'] / 1024:.0f} | {p['retries']} | {p['cache_hits']} |"
+        )
+    return f"### Scraper: {data['duration_s']:.1f} s\n\n" + "\n".join(rows) + "\n"
+
+
+def finish(path: Path = METRICS_PATH, data: dict | None = None) -> dict:
+    """Escribe las métricas de la ejecución (o las ya tomadas con rotate())."""
+    if data is None:
+        data = RECORDER.to_dict()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), "utf-8")
+
+    for line in format_summary(data):
+        print(line)
+    print(f"✔ Generado {path}")
+
+    step_summary = os.environ.get("GITHUB_STEP_SUMMARY")
+    if step_summary:
+        with open(step_summary, "a", encoding="utf-8") as fh:
+            fh.write(_step_summary(data))
+
+    return data
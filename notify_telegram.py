@@ -4,18 +4,25 @@ import os
 import sys
 from pathlib import Path
 import urllib.request
+from datetime import datetime
+
+import change_events
+from core import TZ
 
 TOKEN = os.environ.get("TELEGRAM_TOKEN", "")
 CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "")
 
-PREV = Path("docs/schedule_prev.json")
-CURR = Path("docs/schedule.json")
+# Último seq de docs/events.jsonl ya avisado y máximos de vendidas por
+# función (lo commitea el workflow).
+CURSOR = Path("data/notify_cursor.json")
 
 
 def send(text):
+    # Devuelve False sin credenciales: otros scripts (run_history) lo usan
+    # y no deben terminar el proceso.
     if not TOKEN or not CHAT_ID:
         print("Sin credenciales Telegram.")
-        sys.exit(0)
+        return False
 
     url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
 
@@ -32,114 +39,76 @@ def send(text):
     )
 
     urllib.request.urlopen(req, timeout=10)
+    return True
 
 
-def to_int(value):
-    if value in (None, "", "—", "-", "N/A", "NA"):
-        return None
-
+def load_cursor():
+    # Además del seq, el máximo de vendidas ya avisado por función: solo se
+    # avisa al superarlo (Dinaticket baja al caducar reservas y vuelve a subir).
     try:
-        return int(str(value).replace(".", "").replace(",", ""))
+        raw = json.loads(CURSOR.read_text(encoding="utf-8"))
+        return int(raw["seq"]), dict(raw.get("maximos") or {})
     except Exception:
-        return None
-
+        return None, {}
 
-def get_rows(data):
-    out = {}
 
-    for sala, info in (data.get("eventos") or {}).items():
-        rows = ((info.get("proximas") or {}).get("table") or {}).get("rows") or []
+def save_cursor(seq, maximos):
+    # Las funciones ya pasadas no vuelven a tener eventos.
+    today = datetime.now(TZ).date().isoformat()
+    maximos = {k: v for k, v in maximos.items() if k.split("::")[1] >= today}
 
-        for r in rows:
-            if len(r) >= 4:
-                key = f"{sala}::{r[3]}::{r[1]}"
-
-                out[key] = {
-                    "sala": sala,
-                    "fecha": r[0],
-                    "hora": r[1],
-                    "vendidas": r[2],
-                    "cap": r[4] if len(r) > 4 else None,
-                    "stock": r[5] if len(r) > 5 else None,
-                    "kVend": r[8] if len(r) > 8 else None,
-                    "kCap": r[9] if len(r) > 9 else None,
-                }
-
-    return out
+    CURSOR.parent.mkdir(parents=True, exist_ok=True)
+    CURSOR.write_text(
+        json.dumps({"seq": seq, "maximos": maximos}, ensure_ascii=False, indent=2) + "\n",
+        encoding="utf-8",
+    )
 
 
-def has_valid_data(rows):
-    return any(r["vendidas"] is not None for r in rows.values())
+def main():
+    reader = change_events.EventReader(change_events.EVENTS_PATH)
+    cursor, maximos = load_cursor()
 
+    if cursor is None:
+        # Primera vez: se empieza desde el final, sin avisar del histórico.
+        save_cursor(reader.latest_seq(), maximos)
+        print("Cursor inicializado.")
+        sys.exit(0)
 
-def main():
-    if not CURR.exists():
-        print("No existe docs/schedule.json.")
+    events = reader.read_since(cursor)
+    if not events:
+        print("Sin cambios.")
         sys.exit(0)
 
-    curr_data = json.loads(CURR.read_text(encoding="utf-8"))
-    curr = get_rows(curr_data)
+    changes = []
+
+    for e in change_events.merge_by_key(events):
+        f = change_events.event_function(e)
+        if f is None:
+            continue
 
-    if not has_valid_data(curr):
-        print("Datos inválidos — saliendo.")
-        sys.exit(0)
+        # Sin máximo guardado, el punto de partida es la vendidas anterior.
+        cv = e["vendidas"]
+        pv = maximos.get(e["key"], e["prev"])
+        maximos[e["key"]] = max(cv, pv)
 
-    if PREV.exists():
-        try:
-            maximos = json.loads(PREV.read_text(encoding="utf-8"))
-        except Exception:
-            maximos = {}
-    else:
-        maximos = {}
+        if cv <= pv:
+            continue
 
-    changes = []
+        cap_str = f"/{f.capacidad}" if f.capacidad else ""
+        changes.append(
+            f"📈 *{e['sala']}* — {f.fecha_label} {f.hora}\n"
+            f"{f.source.label}: {cv}{cap_str} (+{cv - pv})"
+        )
 
-    for key, c in curr.items():
-        sala = c["sala"]
-        fecha = c["fecha"]
-        hora = c["hora"]
-
-        cv = to_int(c["vendidas"])
-        pv = maximos.get(key)
-
-        if cv is not None:
-            if pv is None:
-                maximos[key] = cv
-            elif cv > pv:
-                diff = cv - pv
-                cap_str = f"/{c['cap']}" if c["cap"] else ""
-                changes.append(
-                    f"📈 *{sala}* — {fecha} {hora}\n"
-                    f"Dina: {cv}{cap_str} (+{diff})"
-                )
-                maximos[key] = cv
-
-        ckv = to_int(c["kVend"])
-        pkv = maximos.get(f"{key}::k")
-
-        if ckv is not None:
-            if pkv is None:
-                maximos[f"{key}::k"] = ckv
-            elif ckv > pkv:
-                diff = ckv - pkv
-                cap_str = f"/{c['kCap']}" if c["kCap"] else ""
-                changes.append(
-                    f"📈 *{sala}* — {fecha} {hora}\n"
-                    f"Kultur: {ckv}{cap_str} (+{diff})"
-                )
-                maximos[f"{key}::k"] = ckv
-
-    PREV.parent.mkdir(parents=True, exist_ok=True)
-    PREV.write_text(json.dumps(maximos, ensure_ascii=False, indent=2), encoding="utf-8")
+    save_cursor(events[-1]["seq"], maximos)
 
     if not changes:
         print("Sin cambios.")
         sys.exit(0)
 
     msg = "🎭 *Actualización de ventas*\n\n" + "\n\n".join(changes)
-    send(msg)
-
-    print(f"Enviado: {len(changes)} cambios.")
+    if send(msg):
+        print(f"Enviado: {len(changes)} cambios.")
 
 
 if __name__ == "__main__":
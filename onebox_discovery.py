@@ -0,0 +1,155 @@
+"""
+Caché de descubrimiento de Onebox: para cada página padre (/events/<id>) las
+URLs /select/ de sus funciones con fecha y hora (data/onebox_discovery.json).
+El scraper va primero a las URLs guardadas y solo vuelve a descubrir desde la
+página padre cuando la caché caduca (DISCOVERY_TTL), alguna select da 404 o
+ya no quedan funciones futuras. Si un redescubrimiento no encuentra nada
+(página sin selects o caída), el siguiente espera EMPTY_BACKOFF, el doble
+cada vez hasta DISCOVERY_TTL, en vez de repetirse en cada ejecución.
+Sustituye a los fallback_selects escritos a mano en providers.json.
+También recuerda si las selects de cada página padre se pueden leer por HTTP
+sin navegador ("http_probe"); se vuelve a probar en cada redescubrimiento.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from core import TZ
+
+DISCOVERY_PATH = Path("data") / "onebox_discovery.json"
+DISCOVERY_TTL = timedelta(hours=24)
+EMPTY_BACKOFF = timedelta(hours=1)
+
+
+def empty_backoff(empty_runs: int, ttl: timedelta = DISCOVERY_TTL) -> timedelta:
+    """Espera antes de redescubrir tras empty_runs descubrimientos vacíos seguidos."""
+    if empty_runs <= 0:
+        return timedelta(0)
+    return min(EMPTY_BACKOFF * 2 ** (empty_runs - 1), ttl)
+
+
+class DiscoveryCache:
+    def __init__(self, data: dict | None = None):
+        self.data: dict[str, dict] = data or {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: Path = DISCOVERY_PATH) -> DiscoveryCache:
+        try:
+            return cls(json.loads(path.read_text("utf-8")))
+        except Exception:
+            return cls()
+
+    def save(self, path: Path = DISCOVERY_PATH) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self._prune(datetime.now(TZ))
+            text = json.dumps(self.data, ensure_ascii=False, indent=2, sort_keys=True)
+            self._dirty = False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text + "\n", "utf-8")
+        print(f"✔ Actualizado {path}")
+
+    def _prune(self, now: datetime) -> None:
+        # Las funciones de hace más de un día ya no sirven de nada.
+        limit = (now - timedelta(days=1)).date().isoformat()
+        for entry in self.data.values():
+            entry["selects"] = [s for s in entry.get("selects") or [] if (s.get("fecha_iso") or limit) >= limit]
+
+    def selects(self, parent_url: str, now: datetime | None = None) -> list[dict]:
+        """Selects conocidas de la página padre que aún no han pasado (o sin fecha)."""
+        today = (now or datetime.now(TZ)).date().isoformat()
+        with self._lock:
+            entry = self.data.get(parent_url) or {}
+            return [dict(s) for s in entry.get("selects") or [] if (s.get("fecha_iso") or today) >= today]
+
+    def needs_refresh(
+        self,
+        parent_url: str,
+        now: datetime | None = None,
+        ttl: timedelta = DISCOVERY_TTL,
+    ) -> bool:
+        now = now or datetime.now(TZ)
+        with self._lock:
+            entry = self.data.get(parent_url)
+            if not entry or entry.get("stale"):
+                return True
+            try:
+                discovered_at = datetime.fromisoformat(entry["discovered_at"])
+            except (KeyError, ValueError):
+                return True
+            empty_runs = entry.get("empty_runs", 0)
+
+        age = now - discovered_at
+        if not self.selects(parent_url, now):
+            return age > empty_backoff(empty_runs, ttl)
+        return age > ttl
+
+    def update_discovered(self, parent_url: str, items: list[dict], now: datetime | None = None) -> None:
+        """Fusiona lo descubierto en la página padre: conserva fechas ya
+        conocidas si el anchor no traía fecha. El intento se apunta siempre;
+        si no trae ninguna función futura cuenta para el backoff."""
+        now = now or datetime.now(TZ)
+        today = now.date().isoformat()
+        with self._lock:
+            entry = self.data.setdefault(parent_url, {"selects": []})
+            entry["discovered_at"] = now.isoformat()
+            entry.pop("stale", None)
+            self._dirty = True
+
+            if any((item.get("fecha_iso") or today) >= today for item in items):
+                entry.pop("empty_runs", None)
+            else:
+                entry["empty_runs"] = entry.get("empty_runs", 0) + 1
+            if not items:
+                return
+
+            known = {s["url"]: s for s in entry.get("selects") or []}
+
+            selects = []
+            for item in items:
+                merged = {**known.get(item["url"], {}), **{k: v for k, v in item.items() if v}}
+                selects.append(merged)
+
+            entry["selects"] = sorted(selects, key=lambda s: (s.get("fecha_iso") or "", s.get("hora") or "", s["url"]))
+            entry.pop("http_probe", None)
+
+    def http_probe(self, parent_url: str) -> bool:
+        """Si merece la pena probar las selects por HTTP antes que con navegador."""
+        with self._lock:
+            return (self.data.get(parent_url) or {}).get("http_probe", True)
+
+    def set_http_probe(self, parent_url: str, ok: bool) -> None:
+        with self._lock:
+            entry = self.data.get(parent_url)
+            if entry is not None and entry.get("http_probe", True) != ok:
+                entry["http_probe"] = ok
+                self._dirty = True
+
+    def mark_ok(self, parent_url: str, url: str, fecha_iso: str, hora: str) -> None:
+        with self._lock:
+            for s in (self.data.get(parent_url) or {}).get("selects") or []:
+                if s["url"] == url:
+                    if s.get("fecha_iso") != fecha_iso or s.get("hora") != hora:
+                        s["fecha_iso"], s["hora"] = fecha_iso, hora
+                        self._dirty = True
+                    return
+
+    def mark_gone(self, parent_url: str, url: str) -> None:
+        """La select dio 404: se quita y la página padre se redescubre."""
+        with self._lock:
+            entry = self.data.get(parent_url)
+            if not entry:
+                return
+            entry["selects"] = [s for s in entry.get("selects") or [] if s["url"] != url]
+            entry["stale"] = True
+            self._dirty = True
+
+
+DISCOVERY = DiscoveryCache.load()
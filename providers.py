@@ -0,0 +1,171 @@
+"""
+Registro de proveedores de entradas (Dinaticket, Onebox, Kultur...).
+Cada proveedor implementa fetch(sala) -> list[Function] con las funciones de la
+sala, declara si necesita navegador o solo HTTP y lleva su propia
+concurrencia y timeout. La configuración de salas vive en providers.json.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from core import Function
+from metrics import span
+
+CONFIG_PATH = Path(os.environ.get("PROVIDERS_CONFIG", "providers.json"))
+
+# Con TICKETING_BASE_URL=http://127.0.0.1:8765 todas las peticiones a las
+# taquillas van al servidor simulado (benchmarks/mock_server.py), que recibe
+# el host original como primer segmento de la ruta.
+BASE_URL_ENV = "TICKETING_BASE_URL"
+
+HTTP = "http"
+BROWSER = "browser"
+
+DEFAULT_CONCURRENCY = {HTTP: 4, BROWSER: 1}
+DEFAULT_TIMEOUT = {HTTP: 20, BROWSER: 45}
+
+PROVIDERS: dict[str, type[Provider]] = {}
+
+
+def register_provider(name: str):
+    def decorator(cls: type[Provider]) -> type[Provider]:
+        cls.name = name
+        PROVIDERS[name] = cls
+        return cls
+
+    return decorator
+
+
+class Provider:
+    name = ""
+    capability = HTTP
+    # En modo daemon, hilos propios con un navegador ya lanzado que fetch()
+    # reutiliza (solo proveedores con Playwright sync en el mismo hilo).
+    warm_browser = False
+
+    def __init__(self, settings: dict | None = None, salas: dict[str, dict] | None = None):
+        settings = settings or {}
+        self.enabled = bool(settings.get("enabled", True))
+        self.concurrency = max(1, int(settings.get("concurrency", DEFAULT_CONCURRENCY[self.capability])))
+        self.timeout = float(settings.get("timeout", DEFAULT_TIMEOUT[self.capability]))
+        self.settings = settings
+        self.salas = salas or {}
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    def fetch(self, sala: str) -> list[Function]:
+        raise NotImplementedError
+
+    def run(self, sala: str) -> list[Function]:
+        queued = time.perf_counter()
+        with self._slots:
+            wait_ms = round((time.perf_counter() - queued) * 1000, 1)
+            with span("provider", provider=self.name, sala=sala, wait_ms=wait_ms) as sp:
+                funcs = self.fetch(sala)
+                sp.attrs["functions"] = len(funcs)
+                return funcs
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name} salas={list(self.salas)}>"
+
+
+def rebase_url(url: str) -> str:
+    """https://host/ruta -> {TICKETING_BASE_URL}/host/ruta si está definida."""
+    base = os.environ.get(BASE_URL_ENV, "").rstrip("/")
+    if not base or not url or url.startswith(base + "/"):
+        return url
+
+    parts = urlsplit(url)
+    if not parts.netloc:
+        return url
+
+    rebased = f"{base}/{parts.netloc}{parts.path}"
+    return f"{rebased}?{parts.query}" if parts.query else rebased
+
+
+def unrebase_url(url: str) -> str:
+    """Inversa de rebase_url: {TICKETING_BASE_URL}/host/ruta -> https://host/ruta."""
+    base = os.environ.get(BASE_URL_ENV, "").rstrip("/")
+    if not base or not url.startswith(base + "/"):
+        return url
+    return "https://" + url[len(base) + 1:]
+
+
+def load_config(path: Path = CONFIG_PATH) -> dict:
+    if not path.exists():
+        print(f"⚠️ No existe {path}; sin proveedores configurados")
+        return {}
+    return json.loads(path.read_text("utf-8"))
+
+
+def salas_for(config: dict, provider_name: str | None = None) -> dict[str, dict[str, dict]]:
+    """Agrupa las entradas de "salas" por proveedor: {proveedor: {sala: entrada}}."""
+    salas_by_provider: dict[str, dict[str, dict]] = {}
+
+    for sala, entries in (config.get("salas") or {}).items():
+        if isinstance(entries, dict):
+            entries = [entries]
+        for entry in entries:
+            if provider_name and entry.get("provider") != provider_name:
+                continue
+            salas_by_provider.setdefault(entry["provider"], {})[sala] = entry
+
+    return salas_by_provider
+
+
+def build_providers(config: dict) -> list[Provider]:
+    settings = config.get("providers") or {}
+    salas_by_provider = salas_for(config)
+
+    out: list[Provider] = []
+    for name, salas in salas_by_provider.items():
+        cls = PROVIDERS.get(name)
+        if cls is None:
+            print(f"⚠️ Proveedor desconocido en la configuración: {name}")
+            continue
+
+        provider = cls(settings.get(name), salas)
+        if provider.enabled:
+            out.append(provider)
+
+    return out
+
+
+def run_providers(providers: list[Provider]) -> dict[str, list[Function]]:
+    """Lanza cada proveedor en el pool de su capacidad (HTTP o navegador)."""
+    current: dict[str, list[Function]] = {}
+    pools: dict[str, ThreadPoolExecutor] = {}
+
+    for capability in (HTTP, BROWSER):
+        workers = sum(p.concurrency for p in providers if p.capability == capability)
+        if workers:
+            pools[capability] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=capability)
+
+    futures = {}
+    for provider in providers:
+        for sala in provider.salas:
+            current.setdefault(sala, [])
+            fut = pools[provider.capability].submit(provider.run, sala)
+            futures[fut] = (provider, sala)
+
+    try:
+        for fut in as_completed(futures):
+            provider, sala = futures[fut]
+            try:
+                funcs = fut.result()
+            except Exception as e:
+                print(f"ERROR {provider.name} {sala}: {e}")
+                funcs = []
+
+            current[sala].extend(funcs)
+            print(f"{provider.name} {sala}: {len(funcs)} funciones")
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+    return current
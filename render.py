@@ -0,0 +1,252 @@
+"""
+Generación de docs/: index.html a partir de template.html, schedule.json y
+los estáticos (app.css, app.js, manifest.json, sw.js).
+app.css y app.js se publican minificados con el hash del contenido en el
+nombre; sw.js recibe el manifiesto de precache con esos nombres. index.html
+ya no lleva el payload: la página pide schedule.json.
+Las plantillas se parten una sola vez por sus placeholders {{NOMBRE}} y solo
+se tocan los ficheros cuyo contenido cambia, así el cron no genera commits
+vacíos.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterable
+
+from metrics import span
+
+TEMPLATE_PATH = Path("template.html")
+MANIFEST_PATH = Path("manifest.json")
+SW_PATH = Path("sw.js")
+CSS_PATH = Path("app.css")
+JS_PATH = Path("app.js")
+DOCS_DIR = Path("docs")
+SCHEDULE_PATH = DOCS_DIR / "schedule.json"
+PRECACHE_PATH = DOCS_DIR / "precache-manifest.json"
+
+HASH_LEN = 10
+
+_PLACEHOLDER_RE = re.compile(r"\{\{([A-Z_]+)\}\}")
+
+_BLOCK_RE = re.compile(r"(<(style|script)\b[^>]*>)(.*?)(</\2>)", re.S | re.I)
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACES_RE = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLON_RE = re.compile(r":\s+")
+_WS_RE = re.compile(r"\s+")
+
+_template_cache: dict[Path, tuple[float, list[str]]] = {}
+
+
+def minify_css(css: str) -> str:
+    css = _CSS_COMMENT_RE.sub("", css)
+    css = _WS_RE.sub(" ", css)
+    css = _CSS_SPACES_RE.sub(r"\1", css)
+    css = _CSS_COLON_RE.sub(":", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js: str) -> str:
+    # Conservador: sin parser no se juntan líneas (ASI) ni se tocan literales;
+    # solo se quitan sangrías, líneas vacías y comentarios de línea completa.
+    out = []
+    for line in js.splitlines():
+        line = line.strip()
+        if not line or line.startswith("//"):
+            continue
+        out.append(line)
+    return "\n".join(out)
+
+
+def minify_html(html: str) -> str:
+    def block(m: re.Match) -> str:
+        open_tag, tag, body, close_tag = m.groups()
+        if tag.lower() == "style":
+            body = minify_css(body)
+        elif "application/json" not in open_tag:
+            body = minify_js(body)
+        return open_tag + body + close_tag
+
+    parts = []
+    pos = 0
+    for m in _BLOCK_RE.finditer(html):
+        parts.append(_minify_markup(html[pos:m.start()]))
+        parts.append(block(m))
+        pos = m.end()
+    parts.append(_minify_markup(html[pos:]))
+    return "".join(parts)
+
+
+def _minify_markup(html: str) -> str:
+    return "\n".join(line.strip() for line in html.splitlines() if line.strip())
+
+
+def load_template(path: Path, minify=minify_html) -> list[str]:
+    """Parte la plantilla (ya minificada) en [literal, NOMBRE, literal, ...];
+    se cachea por mtime."""
+    mtime = path.stat().st_mtime
+    cached = _template_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    parts = _PLACEHOLDER_RE.split(minify(path.read_text("utf-8")))
+    _template_cache[path] = (mtime, parts)
+    return parts
+
+
+def render_template(path: Path, values: dict[str, str], minify=minify_html) -> Iterable[str]:
+    parts = load_template(path, minify)
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            yield part
+        elif part in values:
+            yield values[part]
+        else:
+            raise KeyError(f"{path}: falta el valor de {{{{{part}}}}}")
+
+
+def _sha256_file(path: Path) -> str | None:
+    if not path.exists():
+        return None
+    h = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_if_changed(path: Path, chunks: Iterable[str]) -> bool:
+    """Escribe chunks en path solo si el hash del contenido cambia."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    tmp = Path(tmp_name)
+    with span("write", path=str(path)) as sp:
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in chunks:
+                    data = chunk.encode("utf-8")
+                    h.update(data)
+                    fh.write(data)
+                    sp.bytes += len(data)
+
+            changed = h.hexdigest() != _sha256_file(path)
+            sp.attrs["changed"] = changed
+            if not changed:
+                tmp.unlink()
+                return False
+
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+            return True
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+
+def copy_if_changed(src: Path, dst: Path) -> bool:
+    if not src.exists():
+        return False
+    if _sha256_file(src) == _sha256_file(dst):
+        return False
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    dst.write_bytes(src.read_bytes())
+    return True
+
+
+def _short_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LEN]
+
+
+def write_hashed_asset(src: Path, minify) -> str:
+    """Publica src minificado como docs/<stem>.<hash><suffix>, borra las
+    versiones anteriores y devuelve el nombre publicado."""
+    text = minify(src.read_text("utf-8"))
+    name = f"{src.stem}.{_short_hash(text.encode('utf-8'))}{src.suffix}"
+
+    if write_if_changed(DOCS_DIR / name, [text]):
+        print(f"✔ Generado docs/{name}")
+
+    for old in DOCS_DIR.glob(f"{src.stem}.*{src.suffix}"):
+        if old.name != name and len(old.name) == len(name):
+            old.unlink()
+            print(f"🗑 Borrado docs/{old.name}")
+
+    return name
+
+
+def keep_generated_at(payload: dict, previous_path: Path = SCHEDULE_PATH) -> dict:
+    """Si los datos no cambiaron, conserva el generated_at anterior para
+    que los ficheros generados salgan idénticos."""
+    try:
+        previous = json.loads(previous_path.read_text("utf-8"))
+    except Exception:
+        return payload
+
+    if previous.get("eventos") == payload.get("eventos") and previous.get("generated_at"):
+        payload["generated_at"] = previous["generated_at"]
+    return payload
+
+
+def write_html() -> None:
+    if not TEMPLATE_PATH.exists():
+        print("⚠️ No existe template.html; no genero docs/index.html")
+        return
+
+    DOCS_DIR.mkdir(exist_ok=True)
+
+    values = {
+        "APP_CSS": write_hashed_asset(CSS_PATH, minify_css),
+        "APP_JS": write_hashed_asset(JS_PATH, minify_js),
+        "MANIFEST_VERSION": "",
+    }
+
+    if MANIFEST_PATH.exists():
+        copy_if_changed(MANIFEST_PATH, DOCS_DIR / MANIFEST_PATH.name)
+        values["MANIFEST_VERSION"] = _short_hash(MANIFEST_PATH.read_bytes())
+
+    index_path = DOCS_DIR / "index.html"
+    if write_if_changed(index_path, render_template(TEMPLATE_PATH, values)):
+        print("✔ Generado docs/index.html")
+    else:
+        print("= docs/index.html sin cambios")
+
+    write_service_worker(values, index_path)
+
+
+def write_service_worker(values: dict[str, str], index_path: Path) -> None:
+    if not SW_PATH.exists():
+        return
+
+    files = ["./", "index.html", values["APP_CSS"], values["APP_JS"]]
+    if values["MANIFEST_VERSION"]:
+        files.append(f"manifest.json?v={values['MANIFEST_VERSION']}")
+    files += sorted(f"icons/{p.name}" for p in (DOCS_DIR / "icons").glob("*.png"))
+
+    # Los nombres con hash ya identifican app.css/app.js; index.html se
+    # añade aparte porque su nombre no cambia.
+    version = _short_hash(("\n".join(files) + _sha256_file(index_path)).encode("utf-8"))
+    manifest = {"version": version, "files": files}
+    manifest_json = json.dumps(manifest, ensure_ascii=False)
+
+    if write_if_changed(PRECACHE_PATH, [json.dumps(manifest, ensure_ascii=False, indent=2)]):
+        print(f"✔ Generado {PRECACHE_PATH}")
+
+    sw = render_template(SW_PATH, {"PRECACHE_MANIFEST": manifest_json}, minify=minify_js)
+    if write_if_changed(DOCS_DIR / SW_PATH.name, sw):
+        print(f"✔ Generado docs/sw.js (precache {version})")
+
+
+def write_schedule_json(payload: dict) -> None:
+    chunks = json.JSONEncoder(ensure_ascii=False, indent=2).iterencode(payload)
+
+    if write_if_changed(SCHEDULE_PATH, chunks):
+        print("✔ Generado docs/schedule.json")
+    else:
+        print("= docs/schedule.json sin cambios")
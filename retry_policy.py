@@ -0,0 +1,217 @@
+"""
+Timeouts y reintentos de las peticiones a las taquillas.
+- Timeout adaptativo por host: p95 de las últimas latencias × TIMEOUT_FACTOR,
+  acotado entre MIN_TIMEOUT_S y el timeout configurado del proveedor × 1.5.
+  Las latencias se guardan en data/host_latency.json entre ejecuciones.
+- Reintentos con backoff exponencial y jitter; cada reintento amplía el
+  timeout por si el host solo va lento.
+- Presupuesto global por ejecución (RUN_BUDGET_S): cuando queda poco se dejan
+  de reintentar las funciones de baja prioridad (las lejanas) y, agotado,
+  ni se intentan. El daemon da a cada lectura el suyo (job_budget), por hilo,
+  sin tocar el de las demás.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, TypeVar
+from urllib.parse import urlsplit
+
+from core import TZ
+from metrics import add_retry, span
+
+LATENCY_PATH = Path("data") / "host_latency.json"
+LATENCY_WINDOW = 50
+MIN_SAMPLES = 5
+
+TIMEOUT_FACTOR = 3.0
+MIN_TIMEOUT_S = 5.0
+MAX_TIMEOUT_FACTOR = 1.5
+RETRY_TIMEOUT_GROWTH = 1.5
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE_S = 1.0
+BACKOFF_CAP_S = 15.0
+
+# El job tiene timeout-minutes: 20; dependencias, navegador y publicación se
+# llevan unos minutos.
+RUN_BUDGET_S = float(os.environ.get("RUN_BUDGET_S", 14 * 60))
+# Con menos de esta fracción del presupuesto solo se reintenta lo prioritario.
+LOW_PRIORITY_RESERVE = 0.25
+
+HIGH = "high"
+LOW = "low"
+# Funciones más lejanas que esto son de baja prioridad.
+HIGH_PRIORITY_DAYS = 14
+
+T = TypeVar("T")
+
+
+class BudgetExhausted(RuntimeError):
+    pass
+
+
+class HTTPStatusError(RuntimeError):
+    """Respuesta 4xx/5xx de page.goto (Playwright no lanza por status)."""
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f"HTTP {status} en {url}")
+        self.status = status
+
+
+class RetryPolicy:
+    def __init__(self, budget_s: float = RUN_BUDGET_S, latencies: dict[str, list[float]] | None = None):
+        self.budget_s = budget_s
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._rnd = random.Random()
+        self._job = threading.local()
+        self.latencies: dict[str, deque[float]] = {
+            host: deque(values, maxlen=LATENCY_WINDOW) for host, values in (latencies or {}).items()
+        }
+
+    @classmethod
+    def load(cls, path: Path = LATENCY_PATH) -> RetryPolicy:
+        try:
+            latencies = json.loads(path.read_text("utf-8")).get("hosts") or {}
+        except Exception:
+            latencies = {}
+        return cls(latencies=latencies)
+
+    def save(self, path: Path = LATENCY_PATH) -> None:
+        with self._lock:
+            hosts = {host: [round(v, 2) for v in values] for host, values in sorted(self.latencies.items())}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps({"updated_at": datetime.now(TZ).isoformat(), "hosts": hosts}, ensure_ascii=False),
+            "utf-8",
+        )
+
+    @contextmanager
+    def job_budget(self, started: float | None) -> Iterator[None]:
+        """Presupuesto de este hilo contado desde started: el daemon abre uno
+        por lectura (time.monotonic()) y los workers de esa lectura continúan
+        el suyo con job_started(). Con None rige el de toda la ejecución."""
+        prev = getattr(self._job, "started", None)
+        self._job.started = started
+        try:
+            yield
+        finally:
+            self._job.started = prev
+
+    def job_started(self) -> float | None:
+        return getattr(self._job, "started", None)
+
+    def remaining(self) -> float:
+        started = self.job_started()
+        return self.budget_s - (time.monotonic() - (self.started if started is None else started))
+
+    def record(self, host: str, seconds: float) -> None:
+        with self._lock:
+            self.latencies.setdefault(host, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def timeout(self, host: str, default: float, attempt: int = 0) -> float:
+        """Timeout en segundos para el intento `attempt` (0 = primero)."""
+        with self._lock:
+            values = sorted(self.latencies.get(host) or ())
+
+        if len(values) >= MIN_SAMPLES:
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            base = min(max(p95 * TIMEOUT_FACTOR, MIN_TIMEOUT_S), default * MAX_TIMEOUT_FACTOR)
+        else:
+            base = default
+
+        timeout = base * RETRY_TIMEOUT_GROWTH ** attempt
+        # Nunca más allá de lo que queda de presupuesto (con un mínimo útil).
+        return max(MIN_TIMEOUT_S, min(timeout, self.remaining()))
+
+    def may_attempt(self, priority: str) -> bool:
+        return priority == HIGH or self.remaining() > 0
+
+    def may_retry(self, priority: str) -> bool:
+        reserve = self.budget_s * LOW_PRIORITY_RESERVE if priority == LOW else 0
+        return self.remaining() > reserve
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniforme entre 0 y base·2^intento, con tope."""
+        with self._lock:
+            return self._rnd.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+
+    def call(
+        self,
+        fn: Callable[[float], T],
+        url: str,
+        default_timeout: float,
+        priority: str = HIGH,
+        attempts: int = MAX_ATTEMPTS,
+        key: str = "",
+        record_timeouts: bool = True,
+    ) -> T:
+        """Llama fn(timeout_s) con reintentos. `key` distingue etapas de un
+        mismo host (p. ej. "#seats" para la espera de butacas);
+        record_timeouts=False cuando un timeout es un resultado normal (una
+        página sin mapa de butacas) y no debe alargar los siguientes."""
+        host = (urlsplit(url).netloc or url) + key
+
+        if not self.may_attempt(priority):
+            raise BudgetExhausted(f"presupuesto agotado, se omite {url}")
+
+        for attempt in range(attempts):
+            timeout = self.timeout(host, default_timeout, attempt)
+            t0 = time.monotonic()
+            try:
+                result = fn(timeout)
+            except Exception as e:
+                elapsed = time.monotonic() - t0
+                # Un timeout también es una muestra: sube el p95 si el host se ralentiza.
+                if record_timeouts and elapsed >= timeout * 0.9:
+                    self.record(host, elapsed)
+
+                if attempt + 1 >= attempts or not is_retryable(e) or not self.may_retry(priority):
+                    raise
+
+                wait = min(self.backoff(attempt), max(0.0, self.remaining()))
+                print(f"↻ Reintento {attempt + 1} {url} en {wait:.1f}s ({type(e).__name__})")
+                add_retry()
+                with span("backoff", url=url):
+                    time.sleep(wait)
+                continue
+
+            self.record(host, time.monotonic() - t0)
+            return result
+
+        raise AssertionError("unreachable")
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Errores de red/timeouts y 5xx/429 sí; 4xx no (la página no existe)."""
+    if isinstance(exc, BudgetExhausted):
+        return False
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(exc, "status", None)
+    if isinstance(status, int):
+        return status >= 500 or status == 429
+    return True
+
+
+def priority_for(fecha_iso: str | None, now: datetime | None = None) -> str:
+    """Las funciones próximas (o sin fecha conocida) son prioritarias."""
+    if not fecha_iso:
+        return HIGH
+    try:
+        fecha = datetime.strptime(fecha_iso, "%Y-%m-%d").date()
+    except ValueError:
+        return HIGH
+    now = now or datetime.now(TZ)
+    return HIGH if (fecha - now.date()).days <= HIGH_PRIORITY_DAYS else LOW
+
+
+POLICY = RetryPolicy.load()
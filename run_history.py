@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Histórico acotado de ejecuciones del scraper (data/run_history.jsonl, una
+línea por ejecución, últimas MAX_RUNS) a partir de docs/run_metrics.json.
+Calcula p50/p95 de la duración total y de cada proveedor, compara las
+últimas ejecuciones con las anteriores y avisa por Telegram si un proveedor
+se vuelve mucho más lento o si la ejecución se acerca al timeout del
+workflow (timeout-minutes: 20).
+"""
+from __future__ import annotations
+
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from core import TZ
+from metrics import METRICS_PATH
+
+HISTORY_PATH = Path("data") / "run_history.jsonl"
+MAX_RUNS = 500
+
+RECENT_RUNS = 10
+MIN_BASELINE_RUNS = 30
+REGRESSION_FACTOR = 2.0
+# Por debajo de esto un p95 "doble" es ruido (p. ej. 0,4 s -> 0,8 s).
+MIN_REGRESSION_S = 10
+
+WORKFLOW_TIMEOUT_S = 20 * 60
+# El job también instala dependencias y navegadores antes del scraper.
+TIMEOUT_WARN_RATIO = 0.6
+
+ALERT_COOLDOWN = timedelta(hours=12)
+
+
+def load_history(path: Path = HISTORY_PATH) -> list[dict]:
+    if not path.exists():
+        return []
+
+    runs = []
+    for line in path.read_text("utf-8").splitlines():
+        try:
+            runs.append(json.loads(line))
+        except ValueError:
+            continue
+    return runs
+
+
+def save_history(runs: list[dict], path: Path = HISTORY_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = (json.dumps(r, ensure_ascii=False, separators=(",", ":")) for r in runs[-MAX_RUNS:])
+    path.write_text("\n".join(lines) + "\n", "utf-8")
+
+
+def run_entry(metrics: dict) -> dict:
+    """Resumen compacto de un run_metrics.json: duración y ms por proveedor."""
+    providers: dict[str, list[int]] = defaultdict(list)
+    errors = 0
+    for p in metrics.get("providers") or []:
+        providers[p["provider"]].append(round(p["duration_ms"]))
+        errors += bool(p.get("error"))
+
+    return {
+        "at": metrics.get("started_at") or datetime.now(TZ).isoformat(),
+        "duration_s": metrics.get("duration_s"),
+        "providers": dict(providers),
+        "errors": errors,
+        "alerts": [],
+    }
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def window_stats(runs: list[dict]) -> dict:
+    """p50/p95 en segundos de la duración total y de cada proveedor."""
+    durations = [r["duration_s"] for r in runs if r.get("duration_s") is not None]
+    by_provider: dict[str, list[float]] = defaultdict(list)
+    for r in runs:
+        for name, values in (r.get("providers") or {}).items():
+            by_provider[name].extend(v / 1000 for v in values)
+
+    def pcts(values: list[float]) -> dict:
+        return {"n": len(values), "p50": percentile(values, 0.50), "p95": percentile(values, 0.95)}
+
+    return {
+        "duration": pcts(durations),
+        "providers": {name: pcts(values) for name, values in sorted(by_provider.items())},
+    }
+
+
+def detect_alerts(runs: list[dict]) -> list[tuple[str, str]]:
+    """(clave, mensaje) de cada problema detectado en las últimas ejecuciones."""
+    alerts: list[tuple[str, str]] = []
+    recent = window_stats(runs[-RECENT_RUNS:])
+
+    if len(runs) >= MIN_BASELINE_RUNS + RECENT_RUNS:
+        baseline = window_stats(runs[:-RECENT_RUNS])
+        candidates = [("duración total", "duration", baseline["duration"], recent["duration"])]
+        candidates += [
+            (name, f"provider:{name}", baseline["providers"][name], stats)
+            for name, stats in recent["providers"].items()
+            if name in baseline["providers"]
+        ]
+
+        for label, key, base, cur in candidates:
+            if not base["p95"] or not cur["p95"]:
+                continue
+            if cur["p95"] >= base["p95"] * REGRESSION_FACTOR and cur["p95"] - base["p95"] >= MIN_REGRESSION_S:
+                alerts.append((
+                    f"regression:{key}",
+                    f"🐢 *{label}*: p95 {base['p95']:.0f}s → {cur['p95']:.0f}s "
+                    f"(×{cur['p95'] / base['p95']:.1f} en las últimas {RECENT_RUNS})",
+                ))
+
+    limit = WORKFLOW_TIMEOUT_S * TIMEOUT_WARN_RATIO
+    last = runs[-1].get("duration_s") or 0
+    p95 = recent["duration"]["p95"] or 0
+    if max(last, p95) >= limit:
+        alerts.append((
+            "timeout",
+            f"⏳ El scraper tarda {last / 60:.1f} min (p95 {p95 / 60:.1f} min); "
+            f"el workflow corta a los {WORKFLOW_TIMEOUT_S // 60} min",
+        ))
+
+    return alerts
+
+
+def recently_alerted(runs: list[dict], key: str, now: datetime) -> bool:
+    for r in reversed(runs):
+        try:
+            at = datetime.fromisoformat(r["at"])
+        except (KeyError, ValueError):
+            continue
+        if now - at > ALERT_COOLDOWN:
+            return False
+        if key in (r.get("alerts") or []):
+            return True
+    return False
+
+
+def format_stats(stats: dict) -> list[str]:
+    def fmt(s: dict) -> str:
+        if not s["n"]:
+            return "sin datos"
+        return f"p50 {s['p50']:.1f}s  p95 {s['p95']:.1f}s  (n={s['n']})"
+
+    lines = [f"  {'total':<11} {fmt(stats['duration'])}"]
+    lines += [f"  {name:<11} {fmt(s)}" for name, s in stats["providers"].items()]
+    return lines
+
+
+def main() -> None:
+    if not METRICS_PATH.exists():
+        print(f"No existe {METRICS_PATH}; nada que registrar.")
+        return
+
+    entry = run_entry(json.loads(METRICS_PATH.read_text("utf-8")))
+    runs = load_history()
+    if runs and runs[-1].get("at") == entry["at"]:
+        print("Ejecución ya registrada.")
+        return
+
+    runs.append(entry)
+    now = datetime.now(TZ)
+
+    print(f"Histórico: {len(runs[-MAX_RUNS:])} ejecuciones")
+    for line in format_stats(window_stats(runs[-MAX_RUNS:])):
+        print(line)
+
+    pending = [(key, msg) for key, msg in detect_alerts(runs) if not recently_alerted(runs[:-1], key, now)]
+    if pending:
+        from notify_telegram import send
+
+        for _, msg in pending:
+            print(msg)
+        if send("⚠️ *Scraper más lento de lo normal*\n\n" + "\n".join(msg for _, msg in pending)):
+            entry["alerts"] = [key for key, _ in pending]
+
+    save_history(runs)
+    print(f"✔ Actualizado {HISTORY_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,45 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import json
 import re
-import shutil
-from datetime import datetime
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from html import unescape
 from pathlib import Path
-from zoneinfo import ZoneInfo
-
-import requests
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
-
-DINATICKET_EVENTS = {
-    "Disfruta": ["https://www.dinaticket.com/es/provider/20864/event/4947155"],
-    "Escondi2": ["https://www.dinaticket.com/es/provider/20864/event/4943466"],
-}
-
-ONEBOX_EVENTS = {
-    "Miedo": "https://entradas.laescaleradejacob.es/laescaleradejacob/events/56108",
-    "CluedoMental": "https://entradas.laescaleradejacob.es/laescaleradejacob/events/56921",
-}
-
-ONEBOX_FALLBACK_SELECTS = {
-    "https://entradas.laescaleradejacob.es/laescaleradejacob/events/56108": [
-        {"url": "https://entradas.laescaleradejacob.es/laescaleradejacob/select/2904525", "fecha_iso": "2026-06-05", "hora": "23:00"},
-        {"url": "https://entradas.laescaleradejacob.es/laescaleradejacob/select/2904526", "fecha_iso": "2026-06-12", "hora": "23:00"},
-        {"url": "https://entradas.laescaleradejacob.es/laescaleradejacob/select/2904527", "fecha_iso": "2026-06-19", "hora": "23:00"},
-        {"url": "https://entradas.laescaleradejacob.es/laescaleradejacob/select/2904528", "fecha_iso": "2026-06-26", "hora": "23:00"},
-    ],
-
-    "https://entradas.laescaleradejacob.es/laescaleradejacob/events/56921": [
-        {"url": "https://entradas.laescaleradejacob.es/laescaleradejacob/select/2905048", "fecha_iso": "2026-06-05", "hora": "19:30"},
-        {"url": "https://entradas.laescaleradejacob.es/laescaleradejacob/select/2905049", "fecha_iso": "2026-06-19", "hora": "19:30"},
-        {"url": "https://entradas.laescaleradejacob.es/laescaleradejacob/select/2905050", "fecha_iso": "2026-06-26", "hora": "19:30"},
-    ],
-}
+from typing import TYPE_CHECKING, Iterator
+from urllib.parse import urljoin
+
+import change_events
+import debug_capture
+import kultur_webkit  # noqa: F401  (registra el proveedor "kultur")
+from core import HEADERS, TZ, Function, Source
+from metrics import RECORDER, add_cache_hit, add_retry, count_response_bytes, finish, span
+from onebox_discovery import DISCOVERY, DISCOVERY_TTL
+from providers import (
+    BROWSER,
+    HTTP,
+    Provider,
+    build_providers,
+    load_config,
+    rebase_url,
+    register_provider,
+    run_providers,
+    unrebase_url,
+)
+from render import SCHEDULE_PATH, keep_generated_at, write_html, write_schedule_json
+from retry_policy import POLICY, BudgetExhausted, HTTPStatusError, priority_for
+
+# requests, BeautifulSoup, Playwright y numpy (analytics) se importan donde se
+# usan: "html" y la importación desde el daemon o los benchmarks no los cargan.
+if TYPE_CHECKING:
+    import requests
+
+    from analytics import SalesHistory
 
 UA = {
     "User-Agent": (
@@ -45,13 +49,26 @@ UA = {
     )
 }
 
-TZ = ZoneInfo("Europe/Madrid")
-
-TEMPLATE_PATH = Path("template.html")
-MANIFEST_PATH = Path("manifest.json")
-SW_PATH = Path("sw.js")
 DOCS_DIR = Path("docs")
+
+CHROMIUM_ARGS = ["--no-sandbox", "--disable-dev-shm-usage"]
+PAGE_OPTIONS = {
+    "user_agent": UA["User-Agent"],
+    "viewport": {"width": 1440, "height": 1100},
+    "locale": "es-ES",
+    "timezone_id": "Europe/Madrid",
+}
+# Conexiones abiertas por host en la sesión HTTP compartida.
+HTTP_POOL_SIZE = 16
+
+# Espera a que aparezca el mapa de butacas; retry_policy la ajusta a lo que
+# suele tardar de verdad.
+SEATS_TIMEOUT_S = 15
+# Selects conocidas que se piden a la vez por HTTP antes de abrir el navegador.
+HTTP_PROBE_CONCURRENCY = 4
+HTTP_PROBE_TIMEOUT_S = 15
 ONEBOX_CACHE_PATH = DOCS_DIR / "onebox_cache.json"
+ONEBOX_CACHE_LOCK = threading.Lock()
 
 MESES_CORTOS = {
     "Ene": "01", "Feb": "02", "Mar": "03", "Abr": "04",
@@ -75,19 +92,6 @@ MESES_ES = {
 }
 
 
-def normalize_hhmm(h: str | None) -> str:
-    if not h:
-        return "00:00"
-    s = str(h).strip().lower()
-    s = s.replace(" ", "").replace("h", "")
-    s = re.sub(r"[^0-9:]", "", s)
-    s = s.rstrip(":")
-    m = re.match(r"^(\d{1,2})(?::?(\d{2}))?$", s)
-    if not m:
-        return s
-    return f"{int(m.group(1)):02d}:{int(m.group(2) or '00'):02d}"
-
-
 def safe_int(value, default: int = 0) -> int:
     try:
         return int(value)
@@ -95,10 +99,6 @@ def safe_int(value, default: int = 0) -> int:
         return default
 
 
-def slugify(s: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9_-]+", "_", s).strip("_")
-
-
 def load_onebox_cache() -> dict:
     if not ONEBOX_CACHE_PATH.exists():
         return {}
@@ -108,52 +108,124 @@ def load_onebox_cache() -> dict:
         return {}
 
 
-def save_onebox_cache(cache: dict) -> None:
-    DOCS_DIR.mkdir(exist_ok=True)
-    ONEBOX_CACHE_PATH.write_text(
-        json.dumps(cache, ensure_ascii=False, indent=2),
-        "utf-8",
-    )
+def save_onebox_cache(updates: dict) -> None:
+    with ONEBOX_CACHE_LOCK, span("write", path=str(ONEBOX_CACHE_PATH)) as sp:
+        cache = load_onebox_cache()
+        cache.update(updates)
+
+        text = json.dumps(cache, ensure_ascii=False, indent=2)
+        DOCS_DIR.mkdir(exist_ok=True)
+        ONEBOX_CACHE_PATH.write_text(text, "utf-8")
+        sp.bytes = len(text.encode("utf-8"))
     print("✔ Actualizado docs/onebox_cache.json")
 
 
-def write_html(payload: dict) -> None:
-    if not TEMPLATE_PATH.exists():
-        print("⚠️ No existe template.html; no genero docs/index.html")
+_http_session: requests.Session | None = None
+_http_lock = threading.Lock()
+
+
+def http_session() -> requests.Session:
+    """Sesión HTTP compartida por todos los hilos: reutiliza las conexiones
+    (keep-alive) entre peticiones al mismo host."""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            import requests
+
+            _http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            _http_session.mount("https://", adapter)
+            _http_session.mount("http://", adapter)
+        return _http_session
+
+
+_warm = threading.local()
+
+
+class WarmBrowser:
+    """Chromium lanzado una sola vez y reutilizado por el hilo que lo crea
+    (Playwright sync no se puede compartir entre hilos). Mientras está
+    activo, onebox_page() abre contextos nuevos en él en vez de lanzar otro
+    navegador; si se cae se relanza."""
+
+    def __init__(self):
+        self._playwright = None
+        self.browser = None
+
+    def launch(self) -> None:
+        with span("onebox.launch", warm=True):
+            self.browser = self._playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+
+    def __enter__(self) -> WarmBrowser:
+        from playwright.sync_api import sync_playwright
+
+        self._playwright = sync_playwright().start()
+        try:
+            self.launch()
+        except BaseException:
+            self._playwright.stop()
+            raise
+        _warm.browser = self
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _warm.browser = None
+        try:
+            self.browser.close()
+        finally:
+            self._playwright.stop()
+
+
+@contextmanager
+def onebox_page() -> Iterator:
+    warm: WarmBrowser | None = getattr(_warm, "browser", None)
+    if warm is not None:
+        if not warm.browser.is_connected():
+            print("↻ Relanzando el navegador")
+            warm.launch()
+        context = warm.browser.new_context(**PAGE_OPTIONS)
+        try:
+            page = context.new_page()
+            page.on("response", count_response_bytes)
+            yield page
+        finally:
+            context.close()
         return
 
-    html_template = TEMPLATE_PATH.read_text("utf-8")
-    html = html_template.replace(
-        "{{PAYLOAD_JSON}}",
-        json.dumps(payload, ensure_ascii=False).replace("</script>", "<\\/script>"),
-    )
+    from playwright.sync_api import sync_playwright
 
-    DOCS_DIR.mkdir(exist_ok=True)
-    (DOCS_DIR / "index.html").write_text(html, "utf-8")
+    with sync_playwright() as p:
+        with span("onebox.launch"):
+            browser = p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+            page = browser.new_page(**PAGE_OPTIONS)
+        page.on("response", count_response_bytes)
+        try:
+            yield page
+        finally:
+            browser.close()
 
-    if MANIFEST_PATH.exists():
-        shutil.copy(MANIFEST_PATH, DOCS_DIR / "manifest.json")
-    if SW_PATH.exists():
-        shutil.copy(SW_PATH, DOCS_DIR / "sw.js")
 
-    print("✔ Generado docs/index.html")
+def fetch_functions_dinaticket(url: str, timeout: float = 20) -> list[Function]:
+    def get(timeout_s: float) -> requests.Response:
+        with span("dinaticket.http", url=url) as sp:
+            r = http_session().get(rebase_url(url), headers=UA, timeout=timeout_s)
+            sp.bytes = len(r.content)
+            sp.attrs["status"] = r.status_code
+            r.raise_for_status()
+            return r
 
+    r = POLICY.call(get, url, timeout)
 
-def write_schedule_json(payload: dict) -> None:
-    DOCS_DIR.mkdir(exist_ok=True)
-    (DOCS_DIR / "schedule.json").write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2),
-        "utf-8",
-    )
-    print("✔ Generado docs/schedule.json")
+    with span("dinaticket.parse"):
+        return parse_dinaticket_html(r.text)
 
 
-def fetch_functions_dinaticket(url: str) -> list[dict]:
-    r = requests.get(url, headers=UA, timeout=20)
-    r.raise_for_status()
+def parse_dinaticket_html(html: str, now: datetime | None = None) -> list[Function]:
+    from bs4 import BeautifulSoup
 
-    soup = BeautifulSoup(r.text, "html.parser")
-    out: list[dict] = []
+    soup = BeautifulSoup(html, "html.parser")
+    out: list[Function] = []
+    now = now or datetime.now(TZ)
 
     for session in soup.find_all("div", class_="js-session-row"):
         parent = session.find_parent("div", class_="js-session-group")
@@ -171,7 +243,6 @@ def fetch_functions_dinaticket(url: str) -> list[dict]:
             print("DEBUG Dinaticket mes no reconocido:", repr(mes_txt))
             continue
 
-        now = datetime.now(TZ)
         anio = now.year
 
         fecha_tmp = datetime.strptime(
@@ -183,10 +254,9 @@ def fetch_functions_dinaticket(url: str) -> list[dict]:
             fecha_tmp = fecha_tmp.replace(year=anio + 1)
 
         fecha_iso = fecha_tmp.strftime("%Y-%m-%d")
-        fecha_label = fecha_tmp.strftime("%d %b %Y")
 
         hora_span = session.find("span", class_="session-card__time-session")
-        hora = normalize_hhmm(hora_span.get_text(strip=True) if hora_span else "")
+        hora = hora_span.get_text(strip=True) if hora_span else ""
 
         quotas = session.find_all("div", class_="js-quota-row")
 
@@ -199,18 +269,11 @@ def fetch_functions_dinaticket(url: str) -> list[dict]:
             stock = sum(safe_int(q.get("data-stock", 0)) for q in quotas)
             vendidas = max(0, cap - stock)
 
-        out.append({
-            "fecha_label": fecha_label,
-            "fecha_iso": fecha_iso,
-            "hora": hora,
-            "vendidas_dt": vendidas,
-            "capacidad": cap,
-            "stock": stock,
-            "buy_url": None,
-            "source": "dinaticket",
-        })
+        f = Function.create(fecha_iso, hora, vendidas, cap, stock, Source.DINATICKET)
+        if f:
+            out.append(f)
 
-    return sorted(out, key=lambda f: (f["fecha_iso"], f["hora"]))
+    return sorted(out, key=lambda f: f.inicio)
 
 
 def parse_onebox_date(raw: str) -> tuple[str, str] | None:
@@ -311,141 +374,317 @@ def count_onebox_stock_playwright(page) -> tuple[int | None, int | None]:
     return stock, capacidad
 
 
-def extract_select_urls_from_html(html: str) -> list[str]:
-    urls = set()
+_SEAT_CLASS_RE = re.compile(r'class=["\']([^"\']*\bseat\b[^"\']*)["\']')
+_TAG_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.S | re.I)
 
-    for m in re.findall(r'https?://[^"\']+/select/\d+', html):
-        urls.add(m)
 
-    for m in re.findall(r'["\']([^"\']*/select/\d+)["\']', html):
-        if m.startswith("http"):
-            urls.add(m)
-        elif m.startswith("/"):
-            urls.add("https://entradas.laescaleradejacob.es" + m)
+def count_onebox_stock_html(html: str) -> tuple[int | None, int | None]:
+    """Como count_onebox_stock_playwright (.seat / .seat.available) pero sobre
+    el HTML servido, para selects que no pintan las butacas con JavaScript."""
+    stock = capacidad = 0
+    for m in _SEAT_CLASS_RE.finditer(html):
+        classes = m.group(1).split()
+        if "seat" in classes:
+            capacidad += 1
+            stock += "available" in classes
 
-    for m in re.findall(r'\bselect/(\d+)\b', html):
-        urls.add(f"https://entradas.laescaleradejacob.es/laescaleradejacob/select/{m}")
+    if not capacidad:
+        return None, None
+    return stock, capacidad
 
-    return sorted(urls)
 
+def html_to_text(html: str) -> str:
+    return " ".join(unescape(_TAG_RE.sub(" ", html)).split())
 
-def save_debug_page(page, sala: str, label: str, select_url: str | None = None) -> None:
-    DOCS_DIR.mkdir(exist_ok=True)
 
-    clean_label = slugify(label)
-    debug_html = DOCS_DIR / f"debug_onebox_{slugify(sala)}_{clean_label}.html"
-    debug_txt = DOCS_DIR / f"debug_onebox_{slugify(sala)}_{clean_label}.txt"
+def _find_key(data, names: tuple[str, ...]):
+    """Primer valor (en profundidad) de alguna de las claves dadas."""
+    if isinstance(data, dict):
+        for name in names:
+            if data.get(name) not in (None, ""):
+                return data[name]
+        children = data.values()
+    elif isinstance(data, list):
+        children = data
+    else:
+        return None
+
+    for child in children:
+        found = _find_key(child, names)
+        if found is not None:
+            return found
+    return None
 
-    html = page.content()
-    debug_html.write_text(html, "utf-8")
 
+def _json_int(value) -> int | None:
+    if isinstance(value, bool):
+        return None
+    return safe_int(value, None) if value is not None else None
+
+
+def parse_onebox_session_json(data) -> tuple[str, str, int | None, int | None] | None:
+    """(fecha_iso, hora, stock, capacidad) de la respuesta de un endpoint de
+    sesión. No hay un esquema fijo: se buscan los nombres de campo habituales."""
+    start = _find_key(data, ("startDate", "start_date", "start", "date"))
+    if not isinstance(start, str):
+        return None
     try:
-        body_text = page.locator("body").inner_text(timeout=10000)
-    except Exception:
-        body_text = ""
-
-    debug_txt.write_text(
-        "SALA:\n"
-        + sala
-        + "\n\nSELECT URL:\n"
-        + str(select_url or "")
-        + "\n\nPAGE URL:\n"
-        + page.url
-        + "\n\nBODY:\n"
-        + body_text[:15000]
-        + "\n\nHTML_HEAD:\n"
-        + html[:8000],
-        "utf-8",
-    )
+        inicio = datetime.fromisoformat(start.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if inicio.tzinfo:
+        inicio = inicio.astimezone(TZ)
+
+    capacidad = _json_int(_find_key(data, ("capacity", "totalSeats", "total")))
+    stock = _json_int(_find_key(data, ("available", "availableSeats", "stock")))
+    sold = _json_int(_find_key(data, ("sold", "soldSeats")))
+    if stock is None and capacidad is not None and sold is not None:
+        stock = max(0, capacidad - sold)
+
+    return inicio.strftime("%Y-%m-%d"), inicio.strftime("%H:%M"), stock, capacidad
+
+
+ONEBOX_BASE_URL = "https://entradas.laescaleradejacob.es/"
+# Distancia máxima (en caracteres de HTML) entre una select y su fecha.
+SELECT_DATE_NEAR_CHARS = 400
+# Una URL entre comillas no es más larga que esto.
+MAX_URL_CHARS = 2048
+
+_SP = r"(?:\s|&nbsp;|&#160;)"
+_MESES_RE = (
+    r"(?:enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre"
+    r"|ene|feb|mar|abr|may|jun|jul|ago|sept|sep|oct|nov|dic)"
+)
+# Las fechas que entiende parse_onebox_date, tal como aparecen en el HTML.
+_DATE_HTML_RE = re.compile(
+    # El lookahead deja descartar casi todas las posiciones de un vistazo.
+    r"(?=[lmjvsd\d])"
+    rf"(?:\b(?:lun|mar|mi(?:[eé]|&eacute;)|jue|vie|s(?:[aá]|&aacute;)b|dom)\.?,?{_SP}+\d{{1,2}}{_SP}+{_MESES_RE}{_SP}+\d{{4}}{_SP}*-{_SP}*\d{{1,2}}:\d{{2}}"
+    rf"|\b(?:lunes|martes|mi(?:[eé]|&eacute;)rcoles|jueves|viernes|s(?:[aá]|&aacute;)bado|domingo)\.?,?{_SP}+\d{{1,2}}{_SP}+de{_SP}+{_MESES_RE}{_SP}+de{_SP}+\d{{4}}[^<]{{0,40}}?\d{{1,2}}:\d{{2}}"
+    r"|\b\d{1,2}[/-]\d{1,2}[/-]\d{4}[^<\d]{0,20}\d{1,2}:\d{2})",
+    re.IGNORECASE,
+)
+# Empieza por un literal: re salta directamente de una select a la siguiente.
+_SELECT_PATH_RE = re.compile(r"(select\\?/\d+)(?:[?#][^\"'\s<>]*)?(?=[\"'])")
+_BASE_HREF_RE = re.compile(r"<base\s[^>]*?href=[\"']([^\"']+)[\"']", re.IGNORECASE)
+_URL_STOP_RE = re.compile(r"[\"'\s<>]")
+_URL_ATTR_RE = re.compile(r"(?:href|src)\s*=\s*$", re.IGNORECASE)
+
+
+def _quoted_url_start(html: str, pos: int) -> int | None:
+    """Inicio de la cadena entre comillas que contiene html[pos:] (la que
+    cierra la comilla que sigue a la select) o None si no es una URL."""
+    q = html[_SELECT_PATH_RE.match(html, pos).end()]
+    start = html.rfind(q, max(0, pos - MAX_URL_CHARS), pos)
+    if start < 0 or _URL_STOP_RE.search(html, start + 1, pos):
+        return None
+    # "select/1" relativa o ".../select/1": nunca "myselect/1".
+    if start + 1 != pos and html[pos - 1] not in "/\\":
+        return None
+    # Absoluta o desde la raíz vale en cualquier sitio. Una relativa solo en
+    # href/src, donde el navegador la resuelve contra la página: en un
+    # literal de script no se sabe contra qué (en .../events/56108 daría
+    # .../events/select/1, que no existe).
+    if not html.startswith(("http://", "https://", "/", "\\/"), start + 1):
+        if not _URL_ATTR_RE.search(html[max(0, start - 16):start]):
+            return None
+    return start + 1
+
+
+class _DateIndex:
+    """Fechas del HTML buscadas solo alrededor de las selects y una sola vez
+    aunque las ventanas de selects vecinas se solapen."""
+
+    def __init__(self, html: str):
+        self.html = html
+        self.starts: list[int] = []
+        self.dates: list[tuple[int, int, tuple[str, str]]] = []
+        self.scanned_to = 0
+
+    def _scan(self, lo: int, hi: int) -> None:
+        # Un poco de solape por si una fecha quedó cortada en el borde.
+        lo = max(lo, self.scanned_to - 80)
+        if lo >= hi:
+            return
+        for m in _DATE_HTML_RE.finditer(self.html, lo, hi):
+            if self.starts and m.start() <= self.starts[-1]:
+                continue
+            parsed = parse_onebox_date(unescape(m.group()))
+            if parsed:
+                self.starts.append(m.start())
+                self.dates.append((m.start(), m.end(), parsed))
+        self.scanned_to = max(self.scanned_to, hi)
+
+    def nearest(self, start: int, end: int) -> tuple[str, str] | None:
+        lo = max(0, start - SELECT_DATE_NEAR_CHARS)
+        hi = min(len(self.html), end + SELECT_DATE_NEAR_CHARS)
+        self._scan(lo, hi)
+
+        best: tuple[int, tuple[str, str]] | None = None
+        for d_start, d_end, parsed in self.dates[bisect_left(self.starts, lo):bisect_left(self.starts, hi)]:
+            if d_end > hi:
+                continue
+            dist = start - d_end if d_end <= start else d_start - end
+            if best is None or dist < best[0]:
+                best = (dist, parsed)
+        return best[1] if best else None
+
+
+def extract_select_urls_from_html(
+    html: str,
+    base_url: str = ONEBOX_BASE_URL,
+) -> list[tuple[str, tuple[str, str] | None]]:
+    """(url, (fecha_iso, hora) o None) de cada select del HTML, en orden y sin
+    repetir. Una sola pasada buscando "select/<id>" entre comillas (absoluta,
+    desde la raíz o escapada en JSON; relativa solo en href/src); las
+    relativas se resuelven contra <base href> o base_url y cada una se queda
+    con la fecha más cercana, antes o después, a menos de
+    SELECT_DATE_NEAR_CHARS."""
+    i = html.find("<base")
+    if i >= 0 and (m := _BASE_HREF_RE.match(html, i)):
+        base_url = urljoin(base_url, unescape(m.group(1)))
+
+    found: dict[str, tuple[str, str] | None] = {}
+    dates = _DateIndex(html)
+    for m in _SELECT_PATH_RE.finditer(html):
+        start = _quoted_url_start(html, m.start())
+        if start is None:
+            continue
 
-    print(f"DEBUG guardado {debug_txt} y {debug_html}")
+        url = unescape(html[start:m.end(1)].replace("\\/", "/"))
+        if not url.startswith(("https://", "http://")):
+            url = urljoin(base_url, url)
+        if found.get(url) is None:
+            found[url] = dates.nearest(start, m.end())
 
+    return list(found.items())
 
-def get_onebox_select_urls(page, parent_url: str, sala: str) -> list[dict]:
-    if "/select/" in parent_url:
-        return [{"url": parent_url}]
 
-    fallback = ONEBOX_FALLBACK_SELECTS.get(parent_url, [])
+def save_debug_page(page, sala: str, label: str, select_url: str | None = None) -> None:
+    label = f"onebox_{label}"
+    if not debug_capture.should_capture(sala, label):
+        return
+
+    with span("debug.capture", sala=sala, label=label):
+        html = page.content()
 
-    fallback_by_url = {
-        item["url"]: item
-        for item in fallback
-        if isinstance(item, dict) and item.get("url")
+        try:
+            body_text = page.locator("body").inner_text(timeout=10000)
+        except Exception:
+            body_text = ""
+
+        text = (
+            "SALA:\n"
+            + sala
+            + "\n\nSELECT URL:\n"
+            + str(select_url or "")
+            + "\n\nPAGE URL:\n"
+            + page.url
+            + "\n\nBODY:\n"
+            + body_text
+        )
+        path = debug_capture.capture(sala, label, html, text)
+
+    if path:
+        print(f"DEBUG guardado {path}")
+
+
+def goto(page, url: str, timeout_s: float):
+    resp = page.goto(rebase_url(url), wait_until="domcontentloaded", timeout=int(timeout_s * 1000))
+    if resp is not None and resp.status >= 400:
+        raise HTTPStatusError(url, resp.status)
+    return resp
+
+
+# Se evalúa sobre los anchors /select/ de la página padre y devuelve
+# {url, fecha_iso, hora} ya parseados (mismos patrones que parse_onebox_date).
+# Para cada anchor sube hasta el primer contenedor con fecha; la fecha de cada
+# elemento se calcula una vez (textContent, sin forzar layout como innerText)
+# y la comparten todos los anchors que cuelgan de él.
+ONEBOX_SELECTS_JS = """
+els => {
+    const MESES = {
+        ene: "01", enero: "01", feb: "02", febrero: "02", mar: "03", marzo: "03",
+        abr: "04", abril: "04", may: "05", mayo: "05", jun: "06", junio: "06",
+        jul: "07", julio: "07", ago: "08", agosto: "08",
+        sep: "09", sept: "09", septiembre: "09", oct: "10", octubre: "10",
+        nov: "11", noviembre: "11", dic: "12", diciembre: "12",
+    };
+    const PATTERNS = [
+        /(?:lun|mar|mi[eé]|jue|vie|s[aá]b|dom)\\.?,?\\s+(\\d{1,2})\\s+([a-záéíóúñ]+)\\s+(\\d{4})\\s*-\\s*(\\d{1,2}):(\\d{2})/,
+        /(?:lunes|martes|mi[eé]rcoles|jueves|viernes|s[aá]bado|domingo)\\.?,?\\s+(\\d{1,2})\\s+de\\s+([a-záéíóúñ]+)\\s+de\\s+(\\d{4}).*?(\\d{1,2}):(\\d{2})/,
+    ];
+    const NUMERIC = /(\\d{1,2})[\\/-](\\d{1,2})[\\/-](\\d{4}).*?(\\d{1,2}):(\\d{2})/;
+    const pad = s => String(parseInt(s, 10)).padStart(2, "0");
+
+    const parse = text => {
+        text = text.replace(/\\s+/g, " ").toLowerCase();
+        for (const re of PATTERNS) {
+            const m = re.exec(text);
+            if (m) {
+                const mes = MESES[m[2].replace(".", "")];
+                return mes ? { fecha_iso: `${m[3]}-${mes}-${pad(m[1])}`, hora: `${pad(m[4])}:${m[5]}` } : null;
+            }
+        }
+        const m = NUMERIC.exec(text);
+        return m ? { fecha_iso: `${m[3]}-${pad(m[2])}-${pad(m[1])}`, hora: `${pad(m[4])}:${m[5]}` } : null;
+    };
+
+    const dates = new Map();
+    const dateOf = el => {
+        if (!dates.has(el)) dates.set(el, parse(el.textContent || ""));
+        return dates.get(el);
+    };
+
+    const out = new Map();
+    for (const a of els) {
+        const url = a.href;
+        if (!url || (out.has(url) && out.get(url).fecha_iso)) continue;
+
+        let fecha = null;
+        for (let el = a, i = 0; el && i < 10 && !fecha; el = el.parentElement, i++) {
+            fecha = dateOf(el);
+        }
+        out.set(url, fecha ? { url, ...fecha } : { url });
     }
+    return [...out.values()];
+}
+"""
+
+
+def get_onebox_select_urls(page, parent_url: str, sala: str) -> list[dict]:
+    if "/select/" in parent_url:
+        return [{"url": parent_url}]
 
     try:
         page.wait_for_load_state("networkidle", timeout=15000)
     except Exception:
         pass
 
-    for delay in [3000, 6000, 9000]:
+    for attempt, delay in enumerate([3000, 6000, 9000]):
+        if attempt:
+            add_retry()
         page.wait_for_timeout(delay)
 
         try:
-            items = page.eval_on_selector_all(
-                "a[href*='/select/']",
-                """
-                els => els.map(a => {
-                    let txt = [];
-                    let el = a;
-
-                    for (let i = 0; i < 10 && el; i++, el = el.parentElement) {
-                        txt.push(el.innerText || "");
-                    }
-
-                    return {
-                        url: a.href,
-                        text: txt.join("\\n")
-                    };
-                })
-                """
-            )
+            items = page.eval_on_selector_all("a[href*='/select/']", ONEBOX_SELECTS_JS)
         except Exception:
             items = []
 
-        out = []
-
-        for item in items:
-            h = item.get("url")
-            txt = item.get("text") or ""
-
-            if not h:
-                continue
-
-            data = fallback_by_url.get(h, {"url": h})
-
-            fechas = extract_onebox_dates_from_text(txt)
-
-            if fechas:
-                parsed = parse_onebox_date(fechas[0])
-
-                if parsed:
-                    fecha_iso, hora = parsed
-
-                    data = {
-                        **data,
-                        "fecha_iso": fecha_iso,
-                        "hora": hora,
-                    }
-
-            out.append(data)
+        out = [{**item, "url": unrebase_url(item["url"])} for item in items if item.get("url")]
 
         if out:
             return out
 
     html = page.content()
 
-    html_urls = extract_select_urls_from_html(html)
-
-    if html_urls:
-        out = []
-
-        for h in html_urls:
-            out.append(
-                fallback_by_url.get(h, {"url": h})
-            )
+    html_items = [
+        {"url": unrebase_url(h), **({"fecha_iso": fecha[0], "hora": fecha[1]} if fecha else {})}
+        for h, fecha in extract_select_urls_from_html(html, page.url)
+    ]
 
-        return out
+    if html_items:
+        return html_items
 
     print(f"⚠️ Onebox sin /select/ para {sala}")
 
@@ -456,214 +695,471 @@ def get_onebox_select_urls(page, parent_url: str, sala: str) -> list[dict]:
         parent_url,
     )
 
-    if fallback:
-        print(f"⚠️ Usando fallback: {len(fallback)} URLs")
-        return fallback
-
     return []
 
 
-def fetch_functions_onebox(url: str, sala: str) -> list[dict]:
-    out: list[dict] = []
+def fetch_functions_onebox(
+    url: str,
+    sala: str,
+    timeout: float = 45,
+    settings: dict | None = None,
+) -> list[Function]:
+    """Va directo a las selects de la caché de descubrimiento, primero por
+    HTTP y a la vez; el navegador solo se abre para las que no se resuelven
+    así y para redescubrir desde la página padre (cada discovery_ttl_hours,
+    tras un 404 o si no quedan funciones)."""
+    settings = settings or {}
+    ttl = timedelta(hours=float(settings.get("discovery_ttl_hours", DISCOVERY_TTL.total_seconds() / 3600)))
+
+    out: list[Function] = []
     seen: set[tuple[str, str]] = set()
     cache = load_onebox_cache()
-    cache_changed = False
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-dev-shm-usage"],
-        )
+    cache_updates: dict[str, dict] = {}
 
-        page = browser.new_page(
-            user_agent=UA["User-Agent"],
-            viewport={"width": 1440, "height": 1100},
-            locale="es-ES",
-            timezone_id="Europe/Madrid",
-        )
+    select_items = DISCOVERY.selects(url)
+    refresh = DISCOVERY.needs_refresh(url, ttl=ttl)
+    pending = select_items
 
+    def add_http(resolved: dict[str, Function]) -> None:
+        for select_url, f in resolved.items():
+            DISCOVERY.mark_ok(url, select_url, f.fecha_iso, f.hora)
+            if (f.fecha_iso, f.hora) in seen:
+                continue
+            seen.add((f.fecha_iso, f.hora))
+            cache_updates[f"{f.fecha_iso}|{f.hora}|{select_url}"] = {
+                "stock": f.stock,
+                "capacidad": f.capacidad,
+                "vendidas_dt": f.vendidas,
+                "updated_at": datetime.now(TZ).isoformat(),
+            }
+            out.append(f)
+
+    if select_items:
+        print(f"Onebox {sala} URLs en caché: {len(select_items)}")
+        if DISCOVERY.http_probe(url):
+            resolved, gone = _probe_onebox_selects_http(url, sala, select_items, settings)
+            add_http(resolved)
+            refresh = refresh or bool(gone)
+            pending = [item for item in pending if item["url"] not in resolved and item["url"] not in gone]
+            print(f"Onebox {sala} resueltas por HTTP: {len(resolved)}/{len(select_items)}")
+
+    if pending or refresh:
+        # Lo ya resuelto por HTTP no se pierde si el navegador falla.
         try:
-            page.goto(url, wait_until="domcontentloaded", timeout=45000)
+            with onebox_page() as page:
+                if pending:
+                    funcs, gone = _fetch_onebox_selects(page, url, sala, pending, timeout, seen, cache, cache_updates)
+                    out.extend(funcs)
+                    refresh = refresh or gone
+
+                if refresh:
+                    discovered = discover_onebox_selects(page, url, sala, timeout)
+                    DISCOVERY.update_discovered(url, discovered)
+
+                    known = {item["url"] for item in select_items}
+                    new_items = [item for item in discovered if item["url"] not in known]
+                    if new_items:
+                        print(f"Onebox {sala} URLs nuevas: {len(new_items)}")
+                        resolved, _ = _probe_onebox_selects_http(url, sala, new_items, settings)
+                        add_http(resolved)
+                        new_items = [item for item in new_items if item["url"] not in resolved]
+                        funcs, _ = _fetch_onebox_selects(page, url, sala, new_items, timeout, seen, cache, cache_updates)
+                        out.extend(funcs)
         except Exception as e:
-            print(f"ERROR Onebox página padre {url}: {e}")
-            browser.close()
-            return []
+            print(f"ERROR Onebox navegador {sala}: {e}")
 
-        select_items = get_onebox_select_urls(page, url, sala)
-        print(f"Onebox {sala} URLs detectadas: {len(select_items)}")
+    if cache_updates:
+        save_onebox_cache(cache_updates)
+    DISCOVERY.save()
 
-        for select_item in select_items:
-            select_url = select_item["url"]
-            select_id = select_url.rstrip("/").split("/")[-1]
+    return sorted(out, key=lambda f: f.inicio)
 
-            try:
-                page.goto(select_url, wait_until="domcontentloaded", timeout=45000)
 
-                try:
-                    page.wait_for_selector(".seat, .available", timeout=15000)
-                except Exception:
-                    page.wait_for_timeout(5000)
+def discover_onebox_selects(page, url: str, sala: str, timeout: float) -> list[dict]:
+    try:
+        with span("onebox.goto", kind="parent", url=url):
+            POLICY.call(lambda t: goto(page, url, t), url, timeout)
+    except Exception as e:
+        print(f"ERROR Onebox página padre {url}: {e}")
+        return []
+
+    with span("onebox.discover", sala=sala) as sp:
+        items = get_onebox_select_urls(page, url, sala)
+        sp.attrs["urls"] = len(items)
+    print(f"Onebox {sala} URLs detectadas: {len(items)}")
+    return items
+
+
+def _fetch_onebox_selects(
+    page,
+    parent_url: str,
+    sala: str,
+    select_items: list[dict],
+    timeout: float,
+    seen: set[tuple[str, str]],
+    cache: dict,
+    cache_updates: dict[str, dict],
+) -> tuple[list[Function], bool]:
+    """Funciones de las selects dadas y si alguna ya no existe (404)."""
+    out: list[Function] = []
+    gone = False
+
+    for select_item in select_items:
+        select_url = select_item["url"]
+        try:
+            with span("onebox.select", url=select_url):
+                f = _fetch_onebox_select(page, sala, select_item, timeout, seen, cache, cache_updates)
+        except HTTPStatusError as e:
+            print(f"⚠️ Onebox {sala}: {e}; se redescubrirá la página padre")
+            DISCOVERY.mark_gone(parent_url, select_url)
+            gone = True
+            continue
 
-                body_text = page.locator("body").inner_text(timeout=15000)
-                date_texts = extract_onebox_dates_from_text(body_text)
-
-                if date_texts:
-                    parsed = parse_onebox_date(date_texts[0])
-                    if not parsed:
-                        print(f"DEBUG Onebox fecha no parseable: {date_texts[0]}")
-                        save_debug_page(page, sala, f"select_{select_id}_fecha_no_parseable", select_url)
-                        continue
-                    fecha_iso, hora = parsed
-                else:
-                    fecha_iso = select_item.get("fecha_iso")
-                    hora = select_item.get("hora")
-
-                    if not fecha_iso or not hora:
-                        print(f"DEBUG Onebox sin fecha visible y sin fallback: {select_url}")
-                        save_debug_page(page, sala, f"select_{select_id}_sin_fecha", select_url)
-                        continue
-
-                key = (fecha_iso, hora)
-                if key in seen:
-                    continue
-
-                seen.add(key)
-
-                stock, capacidad = count_onebox_stock_playwright(page)
-                cache_key = f"{fecha_iso}|{hora}|{select_url}"
-
-                if stock is not None and capacidad is not None:
-                    vendidas = max(0, capacidad - stock)
-                    cache[cache_key] = {
-                        "stock": stock,
-                        "capacidad": capacidad,
-                        "vendidas_dt": vendidas,
-                        "updated_at": datetime.now(TZ).isoformat(),
-                    }
-                    cache_changed = True
-                else:
-                    old = cache.get(cache_key)
-                    if old:
-                        stock = old.get("stock")
-                        capacidad = old.get("capacidad")
-                        vendidas = old.get("vendidas_dt")
-                        print(f"↩ Usando cache Onebox para {fecha_iso} {hora}: stock={stock}, cap={capacidad}")
-                    else:
-                        vendidas = None
-                        print(f"⚠️ Sin stock Onebox ni cache para {fecha_iso} {hora}")
-                        save_debug_page(page, sala, f"select_{select_id}_sin_stock", select_url)
-
-                fecha_dt = datetime.strptime(fecha_iso, "%Y-%m-%d")
-                fecha_label = fecha_dt.strftime("%d %b %Y")
-
-                out.append({
-                    "fecha_label": fecha_label,
-                    "fecha_iso": fecha_iso,
-                    "hora": hora,
-                    "vendidas_dt": vendidas,
-                    "capacidad": capacidad,
-                    "stock": stock,
-                    "buy_url": select_url,
-                    "source": "onebox",
-                })
+        if f:
+            DISCOVERY.mark_ok(parent_url, select_url, f.fecha_iso, f.hora)
+            out.append(f)
 
-            except Exception as e:
-                print(f"ERROR Onebox select {select_url}: {e}")
+    return out, gone
 
-        browser.close()
 
-    if cache_changed:
-        save_onebox_cache(cache)
+def _fetch_onebox_select(
+    page,
+    sala: str,
+    select_item: dict,
+    timeout: float,
+    seen: set[tuple[str, str]],
+    cache: dict,
+    cache_updates: dict[str, dict],
+) -> Function | None:
+    select_url = select_item["url"]
+    select_id = select_url.rstrip("/").split("/")[-1]
+    priority = priority_for(select_item.get("fecha_iso"))
 
-    return sorted(out, key=lambda f: (f["fecha_iso"], f["hora"]))
+    try:
+        with span("onebox.goto", kind="select", priority=priority):
+            POLICY.call(lambda t: goto(page, select_url, t), select_url, timeout, priority)
 
+        with span("onebox.wait_seats") as sp:
+            try:
+                # Sin reintento: si no hay mapa se cuentan igual los selectores.
+                POLICY.call(
+                    lambda t: page.wait_for_selector(".seat, .available", timeout=int(t * 1000)),
+                    select_url,
+                    SEATS_TIMEOUT_S,
+                    priority,
+                    attempts=1,
+                    key="#seats",
+                    record_timeouts=False,
+                )
+            except Exception:
+                sp.attrs["timeout"] = True
+                if POLICY.may_retry(priority):
+                    page.wait_for_timeout(5000)
 
-def build_payload(eventos: dict[str, list[dict]]) -> dict:
-    now = datetime.now(TZ)
-    out: dict[str, dict] = {}
+        body_text = page.locator("body").inner_text(timeout=15000)
+        date_texts = extract_onebox_dates_from_text(body_text)
 
-    headers = [
-        "Fecha",
-        "Hora",
-        "Vendidas",
-        "FechaISO",
-        "Capacidad",
-        "Stock",
-        "BuyUrl",
-        "Source",
-    ]
+        if date_texts:
+            parsed = parse_onebox_date(date_texts[0])
+            if not parsed:
+                print(f"DEBUG Onebox fecha no parseable: {date_texts[0]}")
+                save_debug_page(page, sala, f"select_{select_id}_fecha_no_parseable", select_url)
+                return None
+            fecha_iso, hora = parsed
+        else:
+            fecha_iso = select_item.get("fecha_iso")
+            hora = select_item.get("hora")
 
-    for sala, funcs in eventos.items():
-        proximas: list[dict] = []
+            if not fecha_iso or not hora:
+                print(f"DEBUG Onebox sin fecha visible y sin fallback: {select_url}")
+                save_debug_page(page, sala, f"select_{select_id}_sin_fecha", select_url)
+                return None
+
+        key = (fecha_iso, hora)
+        if key in seen:
+            return None
 
-        for f in funcs:
-            f["hora"] = normalize_hhmm(f.get("hora"))
+        seen.add(key)
+
+        with span("onebox.count_stock"):
+            stock, capacidad = count_onebox_stock_playwright(page)
+        cache_key = f"{fecha_iso}|{hora}|{select_url}"
+
+        if stock is not None and capacidad is not None:
+            vendidas = max(0, capacidad - stock)
+            cache_updates[cache_key] = {
+                "stock": stock,
+                "capacidad": capacidad,
+                "vendidas_dt": vendidas,
+                "updated_at": datetime.now(TZ).isoformat(),
+            }
+        else:
+            old = cache.get(cache_key)
+            if old:
+                stock = old.get("stock")
+                capacidad = old.get("capacidad")
+                vendidas = old.get("vendidas_dt")
+                add_cache_hit()
+                print(f"↩ Usando cache Onebox para {fecha_iso} {hora}: stock={stock}, cap={capacidad}")
+            else:
+                vendidas = None
+                print(f"⚠️ Sin stock Onebox ni cache para {fecha_iso} {hora}")
+                save_debug_page(page, sala, f"select_{select_id}_sin_stock", select_url)
+
+        return Function.create(fecha_iso, hora, vendidas, capacidad, stock, Source.ONEBOX, select_url)
+
+    except BudgetExhausted as e:
+        print(f"⏭ Onebox {sala}: {e}")
+        return None
+    except HTTPStatusError as e:
+        if e.status in (404, 410):
+            raise
+        print(f"ERROR Onebox select {select_url}: {e}")
+        return None
+    except Exception as e:
+        print(f"ERROR Onebox select {select_url}: {e}")
+        return None
+
+
+def probe_onebox_select_http(
+    select_item: dict,
+    session_api: list[str],
+) -> Function | None:
+    """Función de una select sin navegador: primero los endpoints JSON de
+    sesión configurados y si no el HTML de la select. None si hace falta el
+    navegador (mapa de butacas pintado con JavaScript, sin fecha...); los
+    404/410 de la select se propagan como HTTPStatusError."""
+    select_url = select_item["url"]
+    select_id = select_url.rstrip("/").split("/")[-1]
+    priority = priority_for(select_item.get("fecha_iso"))
+
+    def get(url: str, timeout_s: float) -> requests.Response:
+        r = http_session().get(rebase_url(url), headers=UA, timeout=timeout_s)
+        count_response_bytes(r)
+        if r.status_code >= 400:
+            raise HTTPStatusError(url, r.status_code)
+        return r
+
+    for template in session_api:
+        api_url = template.format(select_id=select_id)
+        try:
+            r = POLICY.call(lambda t: get(api_url, t), api_url, HTTP_PROBE_TIMEOUT_S, priority, attempts=1)
+            parsed = parse_onebox_session_json(r.json())
+        except BudgetExhausted:
+            raise
+        except Exception:
+            continue
 
+        if parsed and parsed[2] is not None and parsed[3] is not None:
+            fecha_iso, hora, stock, capacidad = parsed
+            return Function.create(fecha_iso, hora, max(0, capacidad - stock), capacidad, stock, Source.ONEBOX, select_url)
+
+    r = POLICY.call(lambda t: get(select_url, t), select_url, HTTP_PROBE_TIMEOUT_S, priority, key="#http")
+    stock, capacidad = count_onebox_stock_html(r.text)
+    if stock is None or capacidad is None:
+        return None
+
+    date_texts = extract_onebox_dates_from_text(html_to_text(r.text))
+    parsed = parse_onebox_date(date_texts[0]) if date_texts else None
+    if parsed:
+        fecha_iso, hora = parsed
+    else:
+        fecha_iso, hora = select_item.get("fecha_iso"), select_item.get("hora")
+
+    return Function.create(fecha_iso, hora, max(0, capacidad - stock), capacidad, stock, Source.ONEBOX, select_url)
+
+
+def _probe_onebox_selects_http(
+    parent_url: str,
+    sala: str,
+    select_items: list[dict],
+    settings: dict,
+) -> tuple[dict[str, Function], set[str]]:
+    """Prueba a la vez por HTTP las selects dadas. Devuelve las funciones
+    resueltas (por URL) y las selects que ya no existen."""
+    session_api = settings.get("session_api") or []
+    if isinstance(session_api, str):
+        session_api = [session_api]
+    workers = max(1, min(len(select_items), int(settings.get("http_concurrency", HTTP_PROBE_CONCURRENCY))))
+
+    resolved: dict[str, Function] = {}
+    gone: set[str] = set()
+    # El span del proveedor y el presupuesto del job (daemon) son por hilo:
+    # los workers siguen con los del hilo que los lanza.
+    parent = RECORDER.current()
+    budget_started = POLICY.job_started()
+
+    def probe(select_item: dict):
+        with (
+            RECORDER.adopt(parent),
+            POLICY.job_budget(budget_started),
+            span("onebox.http_probe", sala=sala, url=select_item["url"]) as sp,
+        ):
             try:
-                ses_dt = datetime.strptime(
-                    f"{f['fecha_iso']} {f['hora']}",
-                    "%Y-%m-%d %H:%M",
-                ).replace(tzinfo=TZ)
-            except Exception:
-                continue
+                f = probe_onebox_select_http(select_item, session_api)
+            except HTTPStatusError as e:
+                if e.status in (404, 410):
+                    return e
+                f = None
+            except BudgetExhausted:
+                f = None
+            except Exception as e:
+                print(f"DEBUG Onebox HTTP {select_item['url']}: {e}")
+                f = None
+            sp.attrs["resolved"] = f is not None
+            return f
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="onebox-http") as pool:
+        for select_item, result in zip(select_items, pool.map(probe, select_items)):
+            if isinstance(result, HTTPStatusError):
+                print(f"⚠️ Onebox {sala}: {result}; se redescubrirá la página padre")
+                DISCOVERY.mark_gone(parent_url, select_item["url"])
+                gone.add(select_item["url"])
+            elif result is not None:
+                resolved[select_item["url"]] = result
+
+    # Si ninguna se pudo leer sin navegador no se vuelve a probar hasta el
+    # próximo redescubrimiento.
+    DISCOVERY.set_http_probe(parent_url, bool(resolved or gone))
+    return resolved, gone
+
+
+def month_groups(funcs: list[Function]) -> list[dict]:
+    """Tramos consecutivos por mes de una lista ya ordenada: el cliente pinta
+    las cabeceras sin volver a parsear fechas."""
+    groups: list[dict] = []
+    for i, f in enumerate(funcs):
+        if not groups or groups[-1]["key"] != f.mes_key:
+            groups.append({"key": f.mes_key, "label": f.mes_label, "start": i, "count": 0})
+        groups[-1]["count"] += 1
+    return groups
+
+
+def build_payload(eventos: dict[str, list[Function]], history: SalesHistory | None = None) -> dict:
+    """Con history, registra las ventas actuales y añade a cada fila las
+    columnas de ANALYTICS_HEADERS."""
+    now = datetime.now(TZ)
+    out: dict[str, dict] = {}
+
+    upcoming = {sala: sorted((f for f in funcs if f.inicio >= now), key=lambda f: f.inicio) for sala, funcs in eventos.items()}
+    headers = HEADERS
+    if history is not None:
+        from analytics import ANALYTICS_HEADERS
+
+        with span("analytics"):
+            history.record(now, {f.key(sala): f for sala, funcs in upcoming.items() for f in funcs})
+            keys = [f.key(sala) for sala, funcs in upcoming.items() for f in funcs]
+            extra = iter(history.analytics_rows(keys, now))
+        headers = HEADERS + ANALYTICS_HEADERS
 
-            if ses_dt >= now:
-                proximas.append(f)
-
-        proximas.sort(key=lambda f: (f["fecha_iso"], f["hora"]))
-
-        rows = [
-            [
-                f.get("fecha_label"),
-                f.get("hora"),
-                f.get("vendidas_dt"),
-                f.get("fecha_iso"),
-                f.get("capacidad"),
-                f.get("stock"),
-                f.get("buy_url"),
-                f.get("source"),
-            ]
-            for f in proximas
-        ]
+    for sala, funcs in eventos.items():
+        proximas = upcoming[sala]
+        rows = [f.to_row() for f in proximas]
+        if history is not None:
+            rows = [row + next(extra) for row in rows]
 
         print(f"[DEBUG] {sala}: total={len(funcs)} próximas={len(proximas)}")
 
         out[sala] = {
             "table": {"headers": headers, "rows": rows},
-            "proximas": {"table": {"headers": headers, "rows": rows}},
+            "proximas": {
+                "table": {"headers": headers, "rows": rows},
+                "months": month_groups(proximas),
+            },
         }
 
     return {
-        "generated_at": datetime.now(TZ).isoformat(),
+        "generated_at": now.isoformat(),
         "eventos": out,
     }
 
 
-if __name__ == "__main__":
-    current: dict[str, list[dict]] = {}
+@register_provider("dinaticket")
+class DinaticketProvider(Provider):
+    capability = HTTP
 
-    for sala, urls in DINATICKET_EVENTS.items():
-        funcs: list[dict] = []
-        for url in urls:
+    def fetch(self, sala: str) -> list[Function]:
+        funcs: list[Function] = []
+        for url in self.salas[sala].get("urls") or []:
             try:
-                funcs.extend(fetch_functions_dinaticket(url))
+                funcs.extend(fetch_functions_dinaticket(url, timeout=self.timeout))
             except Exception as e:
                 print(f"ERROR Dinaticket {sala}: {e}")
+        return funcs
 
-        current[sala] = funcs
-        print(f"Dinaticket {sala}: {len(funcs)} funciones")
 
-    for sala, url in ONEBOX_EVENTS.items():
-        try:
-            funcs = fetch_functions_onebox(url, sala)
-        except Exception as e:
-            print(f"ERROR Onebox {sala}: {e}")
-            funcs = []
+@register_provider("onebox")
+class OneboxProvider(Provider):
+    capability = BROWSER
+    warm_browser = True
+
+    def fetch(self, sala: str) -> list[Function]:
+        entry = self.salas[sala]
+        return fetch_functions_onebox(entry["url"], sala, timeout=self.timeout, settings=self.settings)
 
-        current[sala] = funcs
-        print(f"Onebox {sala}: {len(funcs)} funciones")
 
-    payload = build_payload(current)
+def ordered_by_config(current: dict[str, list[Function]], config: dict) -> dict[str, list[Function]]:
+    # Mantiene el orden de salas de providers.json en las pestañas.
+    return {sala: current[sala] for sala in (config.get("salas") or {}) if sala in current}
+
+
+def _load_published(path: Path = SCHEDULE_PATH) -> dict | None:
+    try:
+        return json.loads(path.read_text("utf-8"))
+    except Exception:
+        return None
 
-    write_html(payload)
+
+def publish(payload: dict) -> None:
+    previous = _load_published()
+    write_html()
     write_schedule_json(payload)
+    change_events.append(change_events.diff_payloads(previous, payload), payload["generated_at"])
+
+
+def run_once() -> None:
+    from analytics import HISTORY
+
+    try:
+        config = load_config()
+        current = ordered_by_config(run_providers(build_providers(config)), config)
+
+        with span("build_payload"):
+            payload = keep_generated_at(build_payload(current, HISTORY))
+
+        publish(payload)
+    finally:
+        POLICY.save()
+        HISTORY.save()
+        finish()
+
+
+def rebuild_html() -> None:
+    """docs/index.html, estáticos y sw.js sin scrapear: la página lee el
+    schedule.json ya publicado, que no se toca."""
+    if not SCHEDULE_PATH.exists():
+        print(f"⚠️ No existe {SCHEDULE_PATH}; la página no tendrá datos")
+    write_html()
+
+
+def main(argv: list[str] | None = None) -> None:
+    import scraper_daemon
+
+    parser = argparse.ArgumentParser(description="Scraper de funciones de las salas")
+    sub = parser.add_subparsers(dest="command")
+    scraper_daemon.add_args(
+        sub.add_parser("daemon", help="proceso continuo con navegador caliente y planificador propio")
+    )
+    sub.add_parser("html", help="regenera docs/index.html y los estáticos sin scrapear")
+    args = parser.parse_args(argv)
+
+    if args.command == "daemon":
+        scraper_daemon.run(args)
+    elif args.command == "html":
+        rebuild_html()
+    else:
+        run_once()
+
+
+if __name__ == "__main__":
+    main()
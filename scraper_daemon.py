@@ -0,0 +1,280 @@
+"""
+Modo daemon del scraper (python scraper_ci.py daemon): un proceso que no
+termina, para un servidor pequeño en vez del cron de Actions que instala
+dependencias y arranca Python y navegadores cada 30 minutos.
+- La sesión HTTP y los Chromium de Onebox (uno por hilo, WarmBrowser) se
+  crean una vez y se reutilizan en cada lectura.
+- Planificador propio por (proveedor, sala): cuanto más cerca está la
+  próxima función, más a menudo se relee (REFRESH_TIERS).
+- docs/schedule.json e index.html solo se reescriben cuando cambian los
+  datos; --on-change ejecuta un comando después de cada publicación (git
+  push, rsync...).
+Kultur sigue lanzando su WebKit en cada lectura (usa Playwright async).
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import queue
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from core import TZ, Function
+from metrics import RECORDER, finish
+from providers import Provider, build_providers, load_config
+from render import SCHEDULE_PATH
+from retry_policy import POLICY
+from scraper_ci import WarmBrowser, build_payload, ordered_by_config, publish
+
+# (próxima función dentro de..., releer cada N segundos): la primera que encaja.
+REFRESH_TIERS = [
+    (timedelta(hours=6), 2 * 60),
+    (timedelta(days=1), 5 * 60),
+    (timedelta(days=3), 15 * 60),
+    (timedelta(days=14), 30 * 60),
+]
+IDLE_REFRESH_S = 2 * 3600
+ERROR_REFRESH_S = 5 * 60
+# Varias salas que terminan seguidas salen en una sola publicación.
+MIN_PUBLISH_INTERVAL_S = 30
+METRICS_EVERY_S = 15 * 60
+
+
+def refresh_interval(funcs: list[Function], now: datetime | None = None) -> float:
+    now = now or datetime.now(TZ)
+    upcoming = [f.inicio for f in funcs if f.inicio >= now]
+    if not upcoming:
+        return IDLE_REFRESH_S
+
+    wait = min(upcoming) - now
+    for horizon, every in REFRESH_TIERS:
+        if wait <= horizon:
+            return every
+    return IDLE_REFRESH_S
+
+
+@dataclass(order=True, slots=True)
+class Job:
+    due: float
+    seq: int
+    provider: Provider = field(compare=False)
+    sala: str = field(compare=False)
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return self.provider.name, self.sala
+
+
+class Daemon:
+    def __init__(self, config: dict, on_change: str | None = None, once: bool = False):
+        # numpy solo se carga al arrancar el daemon, no al importar el módulo.
+        from analytics import HISTORY
+
+        self.config = config
+        self.history = HISTORY
+        self.providers = build_providers(config)
+        self.on_change = on_change
+        self.once = once
+
+        self.results: dict[tuple[str, str], list[Function]] = {}
+        self.heap: list[Job] = []
+        self._seq = itertools.count()
+        self.running: set[tuple[str, str]] = set()
+        self.done: queue.Queue = queue.Queue()
+        self.stop = threading.Event()
+
+        self.published = self._load_published()
+        self.last_publish = 0.0
+        self.dirty = False
+
+        workers = sum(p.concurrency for p in self.providers if not p.warm_browser)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job")
+        self.warm_queues: dict[str, queue.Queue] = {}
+        self.threads: list[threading.Thread] = []
+        for provider in self.providers:
+            if provider.warm_browser:
+                q = self.warm_queues[provider.name] = queue.Queue()
+                self.threads += [
+                    threading.Thread(target=self._warm_worker, args=(q,), name=f"{provider.name}-{i}", daemon=True)
+                    for i in range(provider.concurrency)
+                ]
+
+        now = time.monotonic()
+        for provider in self.providers:
+            for sala in provider.salas:
+                self.schedule(provider, sala, now)
+
+    @staticmethod
+    def _load_published() -> dict | None:
+        try:
+            return json.loads(SCHEDULE_PATH.read_text("utf-8")).get("eventos")
+        except Exception:
+            return None
+
+    def schedule(self, provider: Provider, sala: str, due: float) -> None:
+        heapq.heappush(self.heap, Job(due, next(self._seq), provider, sala))
+
+    def _run(self, job: Job) -> None:
+        # Cada lectura con su presupuesto: las que siguen en marcha no lo pierden.
+        try:
+            with POLICY.job_budget(time.monotonic()):
+                funcs, error = job.provider.run(job.sala), None
+        except Exception as e:
+            funcs, error = None, e
+        self.done.put((job, funcs, error))
+
+    def _warm_worker(self, jobs: queue.Queue) -> None:
+        with contextlib.ExitStack() as stack:
+            try:
+                stack.enter_context(WarmBrowser())
+            except Exception as e:
+                print(f"ERROR navegador: {e}; cada lectura lanzará el suyo")
+
+            while not self.stop.is_set():
+                try:
+                    job = jobs.get(timeout=1)
+                except queue.Empty:
+                    continue
+                self._run(job)
+
+    def _dispatch_due(self) -> None:
+        now = time.monotonic()
+        while self.heap and self.heap[0].due <= now:
+            job = heapq.heappop(self.heap)
+            if job.key in self.running:
+                continue
+            self.running.add(job.key)
+            if job.provider.warm_browser:
+                self.warm_queues[job.provider.name].put(job)
+            else:
+                self.pool.submit(self._run, job)
+
+    def _complete(self, job: Job, funcs: list[Function] | None, error: Exception | None) -> None:
+        self.running.discard(job.key)
+        if error is not None:
+            print(f"ERROR {job.provider.name} {job.sala}: {error}")
+            self.results.setdefault(job.key, [])
+            every = ERROR_REFRESH_S
+        else:
+            self.results[job.key] = funcs
+            self.dirty = True
+            every = refresh_interval(funcs)
+            print(f"{job.provider.name} {job.sala}: {len(funcs)} funciones; siguiente en {every // 60:.0f} min")
+
+        if not self.once:
+            self.schedule(job.provider, job.sala, time.monotonic() + every)
+
+    def _drain(self, timeout: float) -> None:
+        """Recoge las lecturas terminadas; espera como mucho timeout a la primera."""
+        try:
+            item = self.done.get(timeout=timeout)
+            while True:
+                # None solo despierta el bucle (shutdown()).
+                if item is not None:
+                    self._complete(*item)
+                item = self.done.get_nowait()
+        except queue.Empty:
+            pass
+
+    def shutdown(self) -> None:
+        self.stop.set()
+        self.done.put(None)
+
+    def _round_complete(self) -> bool:
+        return all((p.name, sala) in self.results for p in self.providers for sala in p.salas)
+
+    def _maybe_publish(self, force: bool = False) -> None:
+        # Hasta la primera vuelta completa no se publica (faltarían salas).
+        if not self.dirty or not self._round_complete():
+            return
+        if not force and time.monotonic() - self.last_publish < MIN_PUBLISH_INTERVAL_S:
+            return
+
+        current: dict[str, list[Function]] = {}
+        for (_, sala), funcs in self.results.items():
+            current.setdefault(sala, []).extend(funcs)
+        payload = build_payload(ordered_by_config(current, self.config), self.history)
+
+        self.dirty = False
+        self.last_publish = time.monotonic()
+        if payload["eventos"] == self.published:
+            return
+
+        publish(payload)
+        self.published = payload["eventos"]
+        print(f"✔ Publicado {payload['generated_at']}")
+
+        if self.on_change:
+            result = subprocess.run(self.on_change, shell=True)
+            if result.returncode:
+                print(f"⚠️ --on-change terminó con {result.returncode}")
+
+    def _flush_metrics(self, final: bool = False) -> bool:
+        """run_metrics.json y cachés. Solo entre lecturas: con spans abiertos
+        devuelve False y se reintenta en la siguiente vuelta del bucle."""
+        data = RECORDER.to_dict() if final else RECORDER.rotate()
+        if data is None:
+            return False
+        POLICY.save()
+        self.history.save()
+        finish(data=data)
+        return True
+
+    def run(self) -> None:
+        for t in self.threads:
+            t.start()
+
+        next_metrics = time.monotonic() + METRICS_EVERY_S
+        try:
+            while not self.stop.is_set():
+                self._dispatch_due()
+
+                if self.once and not self.heap and not self.running:
+                    break
+
+                next_due = self.heap[0].due if self.heap else time.monotonic() + 60
+                timeout = min(max(0.1, next_due - time.monotonic()), MIN_PUBLISH_INTERVAL_S)
+                self._drain(timeout)
+
+                self._maybe_publish()
+
+                if time.monotonic() >= next_metrics and self._flush_metrics():
+                    next_metrics = time.monotonic() + METRICS_EVERY_S
+        finally:
+            self.stop.set()
+            self._maybe_publish(force=True)
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            for t in self.threads:
+                t.join(timeout=30)
+            self._flush_metrics(final=True)
+
+
+def add_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--on-change", metavar="CMD", help="comando a ejecutar tras cada publicación")
+    parser.add_argument("--once", action="store_true", help="una sola vuelta por todas las salas y salir")
+
+
+def run(args: argparse.Namespace) -> None:
+    daemon = Daemon(load_config(), on_change=args.on_change, once=args.once)
+    if not daemon.providers:
+        print("Sin proveedores activos; nada que hacer.")
+        return
+
+    def stop(signum, frame):
+        print(f"Señal {signum}: terminando…")
+        daemon.shutdown()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    salas = sum(len(p.salas) for p in daemon.providers)
+    print(f"Daemon: {len(daemon.providers)} proveedores, {salas} lecturas planificadas")
+    daemon.run()
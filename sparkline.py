@@ -0,0 +1,139 @@
+"""
+Sparklines en PNG sin dependencias (zlib + struct), para el /trend del bot.
+Una franja por serie, apiladas, con eje de tiempo común: la línea es la
+curva de ventas acumuladas y el área bajo ella va rellena. Sin texto: las
+etiquetas van en el pie de la foto, en el mismo orden que las franjas.
+"""
+from __future__ import annotations
+
+import struct
+import zlib
+
+Color = tuple[int, int, int]
+
+BACKGROUND: Color = (17, 17, 20)
+SEPARATOR: Color = (44, 44, 50)
+# Mismos tonos que los chips del dashboard: con ventas, casi lleno, agotado.
+GREEN: Color = (52, 199, 89)
+GOLD: Color = (255, 204, 0)
+RED: Color = (255, 69, 58)
+GRAY: Color = (142, 142, 147)
+
+
+def _blend(c: Color, bg: Color, alpha: float) -> Color:
+    return tuple(round(a * alpha + b * (1 - alpha)) for a, b in zip(c, bg))
+
+
+def color_for(vendidas: int | None, capacidad: int | None) -> Color:
+    if not vendidas:
+        return GRAY
+    if capacidad and vendidas >= capacidad:
+        return RED
+    if capacidad and capacidad - vendidas <= 3:
+        return GOLD
+    return GREEN
+
+
+class Canvas:
+    def __init__(self, width: int, height: int, bg: Color = BACKGROUND):
+        self.width = width
+        self.height = height
+        self.rows = [bytearray(bytes(bg) * width) for _ in range(height)]
+
+    def set(self, x: int, y: int, c: Color) -> None:
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = 3 * x
+            self.rows[y][i:i + 3] = bytes(c)
+
+    def hline(self, y: int, x0: int, x1: int, c: Color) -> None:
+        if 0 <= y < self.height:
+            x0, x1 = max(0, x0), min(self.width, x1)
+            if x1 > x0:
+                self.rows[y][3 * x0:3 * x1] = bytes(c) * (x1 - x0)
+
+    def vline(self, x: int, y0: int, y1: int, c: Color) -> None:
+        for y in range(max(0, y0), min(self.height, y1)):
+            self.set(x, y, c)
+
+    def line(self, x0: int, y0: int, x1: int, y1: int, c: Color) -> None:
+        # Bresenham, con un píxel extra debajo para que se vea a 1x.
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+        err = dx + dy
+        while True:
+            self.set(x0, y0, c)
+            self.set(x0, y0 + 1, c)
+            if x0 == x1 and y0 == y1:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    def png(self) -> bytes:
+        raw = b"".join(b"\x00" + bytes(row) for row in self.rows)
+
+        def chunk(tag: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+        ihdr = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(raw, 9)) + chunk(b"IEND", b"")
+
+
+def _step_points(points: list[tuple[float, float]], t0: float, t1: float, x0: int, x1: int) -> list[tuple[int, float]]:
+    """Escalonada: las ventas se mantienen hasta el siguiente cambio."""
+    span = (t1 - t0) or 1.0
+    out: list[tuple[int, float]] = []
+    prev = None
+    for t, v in points:
+        x = x0 + round((min(max(t, t0), t1) - t0) / span * (x1 - x0))
+        if prev is not None:
+            out.append((x, prev))
+        out.append((x, v))
+        prev = v
+    if prev is not None:
+        out.append((x1, prev))
+    return out
+
+
+def render(
+    series: list[list[tuple[float, float]]],
+    maxima: list[float | None],
+    colors: list[Color],
+    width: int = 480,
+    row_height: int = 34,
+    pad: int = 5,
+) -> bytes:
+    """series[i]: [(instante, vendidas acumuladas), ...] ordenados; maxima[i]
+    fija el techo de la franja (la capacidad) o None para usar el máximo."""
+    height = max(1, len(series)) * row_height
+    canvas = Canvas(width, height)
+
+    times = [t for s in series for t, _ in s]
+    t0, t1 = (min(times), max(times)) if times else (0.0, 1.0)
+
+    for i, (points, top, color) in enumerate(zip(series, maxima, colors)):
+        y_top, y_bottom = i * row_height + pad, (i + 1) * row_height - pad
+        if i:
+            canvas.hline(i * row_height, 0, width, SEPARATOR)
+        if not points:
+            continue
+
+        top = top or max(v for _, v in points) or 1
+        fill = _blend(color, BACKGROUND, 0.25)
+
+        def y_of(v: float) -> int:
+            return y_bottom - round(min(v, top) / top * (y_bottom - y_top))
+
+        steps = _step_points(points, t0, t1, pad, width - pad)
+        for (xa, va), (xb, vb) in zip(steps, steps[1:]):
+            ya, yb = y_of(va), y_of(vb)
+            if xb > xa:
+                for x in range(xa, xb):
+                    canvas.vline(x, ya + 1, y_bottom + 1, fill)
+            canvas.line(xa, ya, xb, yb, color)
+
+    return canvas.png()
@@ -1,7 +1,68 @@
-// Service Worker desactivado — sin cache
-self.addEventListener('install', () => self.skipWaiting());
-self.addEventListener('activate', e => e.waitUntil(
-  caches.keys().then(keys => Promise.all(keys.map(k => caches.delete(k))))
+// Shell cache-first (estáticos con hash + index.html) y schedule.json
+// network-first con copia de respaldo. render.py inyecta el manifiesto.
+const PRECACHE = {{PRECACHE_MANIFEST}};
+const SHELL_CACHE = `shell-${PRECACHE.version}`;
+const DATA_CACHE = "data-v1";
+const DATA_PATH = "schedule.json";
+
+self.addEventListener("install", e => e.waitUntil(
+  caches.open(SHELL_CACHE)
+    .then(cache => cache.addAll(PRECACHE.files))
+    .then(() => self.skipWaiting())
+));
+
+self.addEventListener("activate", e => e.waitUntil(
+  caches.keys()
+    .then(keys => Promise.all(
+      keys
+        .filter(k => k !== SHELL_CACHE && k !== DATA_CACHE)
+        .map(k => caches.delete(k))
+    ))
     .then(() => self.clients.claim())
 ));
-self.addEventListener('fetch', e => e.respondWith(fetch(e.request)));
+
+self.addEventListener("message", e => {
+  if (e.data && e.data.type === "SKIP_WAITING") self.skipWaiting();
+});
+
+function networkFirst(request) {
+  return fetch(request)
+    .then(resp => {
+      if (resp.ok) {
+        const copy = resp.clone();
+        caches.open(DATA_CACHE).then(cache => cache.put(DATA_PATH, copy));
+      }
+      return resp;
+    })
+    .catch(() => caches.open(DATA_CACHE)
+      .then(cache => cache.match(DATA_PATH))
+      .then(hit => hit || Response.error()));
+}
+
+function cacheFirst(request) {
+  return caches.match(request).then(hit => hit || fetch(request));
+}
+
+self.addEventListener("fetch", e => {
+  const req = e.request;
+  if (req.method !== "GET") return;
+
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (url.pathname.endsWith("/" + DATA_PATH)) {
+    e.respondWith(networkFirst(req));
+    return;
+  }
+
+  const scope = new URL(self.registration.scope).pathname;
+  if (req.mode === "navigate" && (url.pathname === scope || url.pathname === scope + "index.html")) {
+    e.respondWith(
+      caches.match("index.html", { cacheName: SHELL_CACHE })
+        .then(hit => hit || fetch(req))
+    );
+    return;
+  }
+
+  e.respondWith(cacheFirst(req));
+});